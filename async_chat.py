@@ -0,0 +1,166 @@
+import asyncio
+from ollama import AsyncClient
+from chat import ContextWindow, DEFAULT_SYSTEM_PROMPT
+from db import DEFAULT_SESSION, DEFAULT_HISTORY_LIMIT, utc_now
+from streaming import StreamPipeline
+
+
+async def run_blocking(func, *args):
+    """
+    Runs a blocking call in the default executor.
+
+    Args:
+        func (callable): The blocking function.
+        *args: Positional arguments for `func`.
+
+    Returns:
+        The return value of `func`.
+    """
+    return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+
+class AsyncChat:
+    """
+    Asyncio counterpart to Chat for serving many sessions on one event loop.
+
+    Generation streams through an `ollama.AsyncClient`, and the blocking
+    pymongo calls run in the default executor, so a turn never blocks the
+    event loop. The Mongo instance and client can be shared by every session
+    in the process; each AsyncChat holds only its own per-session state.
+    """
+
+    def __init__(self, model, mongo, session=DEFAULT_SESSION, client=None, system_prompt=DEFAULT_SYSTEM_PROMPT,
+                 context_length=4096, reserve_tokens=1024, sinks=None):
+        """
+        Initializes the AsyncChat class.
+
+        Use `AsyncChat.create` to also load the session's history.
+
+        Args:
+            model (str): The name of the AI model used for generating responses.
+            mongo (Mongo): The Mongo instance used for history storage, possibly shared.
+            session (str): The conversation session key. Defaults to "default".
+            client (AsyncClient, optional): The Ollama client, possibly shared. Defaults to a new AsyncClient.
+            system_prompt (str): The system prompt pinned at the start of every request.
+            context_length (int): The model's context length in tokens. Defaults to 4096.
+            reserve_tokens (int): Tokens kept free for the model's response. Defaults to 1024.
+            sinks (list, optional): Sinks that receive response chunks. Defaults to none.
+
+        Attributes:
+            model (str): Stores the AI model name.
+            session (str): Stores the conversation session key.
+            mongo_client (Mongo): The Mongo instance used for history storage.
+            client (AsyncClient): The Ollama client used for generation.
+            context (ContextWindow): Assembles the token-budgeted context sent to the model.
+            pipeline (StreamPipeline): Fans streamed response chunks out to the sinks.
+            history (list): List of dictionaries representing the chat history.
+        """
+        self.model = model
+        self.session = session
+        self.mongo_client = mongo
+        self.client = client or AsyncClient()
+        self.context = ContextWindow(system_prompt, context_length, reserve_tokens)
+        self.pipeline = StreamPipeline(sinks)
+        self.history = self.context.messages
+        self._turn_lock = asyncio.Lock()
+
+    @classmethod
+    async def create(cls, model, mongo, session=DEFAULT_SESSION, history_limit=DEFAULT_HISTORY_LIMIT, **kwargs):
+        """
+        Creates an AsyncChat and loads the session's recent history.
+
+        Args:
+            model (str): The name of the AI model used for generating responses.
+            mongo (Mongo): The Mongo instance used for history storage.
+            session (str): The conversation session key. Defaults to "default".
+            history_limit (int): The number of recent messages loaded. Defaults to 200.
+            **kwargs: Passed through to the AsyncChat constructor.
+
+        Returns:
+            AsyncChat: The initialized chat.
+        """
+        self = cls(model, mongo, session=session, **kwargs)
+        await self.load_history(history_limit)
+        return self
+
+    async def load_history(self, limit=DEFAULT_HISTORY_LIMIT):
+        """
+        Loads the session's recent history without blocking the event loop.
+
+        Args:
+            limit (int): The number of recent messages loaded. Defaults to 200.
+        """
+        try:
+            messages = await run_blocking(self.mongo_client.get_history, self.model, self.session, limit)
+            self.context.extend({"role": m.get("role"), "content": m.get("content")} for m in messages)
+        except Exception as e:
+            print(f"Error loading chat history: {e}")
+
+    async def process_question(self, question):
+        """
+        Processes the user's question, yielding the response as it is generated.
+
+        Turns in the same session are serialized; different sessions run
+        concurrently. The exchange is saved once the stream is exhausted.
+        A caller that stops iterating early, e.g. because its client went
+        away, must `await` the generator's `aclose()` to end the turn and
+        let the session's next turn start; the unfinished exchange is not saved.
+
+        Args:
+            question (str): The user's input question.
+
+        Yields:
+            str: Each chunk of the model's response.
+        """
+        async with self._turn_lock:
+            user_input = self._message("user", question)
+            self.context.append({"role": "user", "content": question})
+
+            parts = []
+            text = ""
+            self.pipeline.start()
+            try:
+                responses = await self.client.chat(model=self.model, messages=self.context.select(), stream=True)
+                async for response in responses:
+                    chunk = response.get("message", {}).get("content", "")
+                    if not chunk:
+                        continue
+                    parts.append(chunk)
+                    self.pipeline.send(chunk)
+                    yield chunk
+            finally:
+                text = "".join(parts)
+                self.pipeline.end(text)
+
+            full_response = text.strip() or "Unexpected response format."
+            self.context.append({"role": "assistant", "content": full_response})
+            await self._save(user_input, self._message("assistant", full_response))
+
+    async def ask(self, question):
+        """
+        Processes the user's question and returns the full response.
+
+        Args:
+            question (str): The user's input question.
+
+        Returns:
+            str: The cleaned response generated by the AI model.
+        """
+        chunks = self.process_question(question)
+        try:
+            parts = [chunk async for chunk in chunks]
+        finally:
+            await chunks.aclose()
+        return "".join(parts).strip() or "Unexpected response format."
+
+    def _message(self, role, content):
+        """Build the document stored for a message."""
+        return {"role": role, "content": content, "model": self.model,
+                "session": self.session, "timestamp": utc_now()}
+
+    async def _save(self, user_input, model_res):
+        """Save an exchange in the default executor."""
+        try:
+            await run_blocking(self.mongo_client.save_into_db, user_input, model_res)
+        except Exception as e:
+            print(f"Error saving chat history: {e}")
@@ -0,0 +1,236 @@
+import argparse
+import csv
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import ollama
+from chat import DEFAULT_SYSTEM_PROMPT
+from host_pool import OllamaHostPool
+
+
+def read_prompts(path, prompt_field="prompt", id_field="id"):
+    """
+    Streams prompts from a JSONL or CSV file, one at a time.
+
+    The format is chosen by the file extension (.csv, otherwise JSONL).
+    Items without an id are numbered by their position in the file, so
+    the ids stay the same when a run is resumed on the same file.
+
+    Args:
+        path (str): The prompt file.
+        prompt_field (str): The field or column holding the prompt. Defaults to "prompt".
+        id_field (str): The field or column holding the item id. Defaults to "id".
+
+    Yields:
+        dict: Items with 'id' and 'prompt' keys, in file order.
+
+    Raises:
+        ValueError: If a line is not valid JSON or an item has no prompt.
+    """
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        if path.lower().endswith(".csv"):
+            rows = csv.DictReader(f)
+        else:
+            rows = (json.loads(line) if line.strip() else None for line in f)
+
+        for number, row in enumerate(rows, start=1):
+            if row is None:
+                continue
+            prompt = row.get(prompt_field)
+            if not prompt:
+                raise ValueError(f"Item {number} of {path} has no '{prompt_field}' field")
+            item_id = row.get(id_field)
+            yield {"id": str(item_id) if item_id not in (None, "") else str(number), "prompt": prompt}
+
+
+def completed_ids(path):
+    """
+    Returns the ids that already have a successful result in an output file.
+
+    A truncated last line, left by an interrupted run, is not valid JSON and
+    is ignored, so that item is run again.
+
+    Args:
+        path (str): The JSONL results file.
+
+    Returns:
+        set: The ids of items that need not be run again.
+    """
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(result, dict) and not result.get("error"):
+                done.add(result.get("id"))
+    return done
+
+
+def _ends_with_newline(path):
+    """Return True if the file is empty or its last byte is a newline."""
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        if f.tell() == 0:
+            return True
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
+
+
+class BatchRunner:
+    """
+    Runs a file of prompts against a model and writes the results as JSONL.
+
+    Prompts are read lazily and at most `concurrency` requests are in
+    flight; only a bounded window of items is held in memory, so input
+    size does not matter. Each item is an independent single-turn chat
+    with the system prompt. Results are appended to the output file as
+    they finish, so completion order may differ from input order, and a
+    run that is interrupted can be resumed: items with a successful result
+    are skipped, and failed ones are tried again.
+    """
+
+    def __init__(self, model, client=None, concurrency=4, system_prompt=DEFAULT_SYSTEM_PROMPT, options=None,
+                 keep_alive=None):
+        """
+        Initializes the BatchRunner class.
+
+        Args:
+            model (str): The name of the AI model to run the prompts against.
+            client (optional): The Ollama client, e.g. an OllamaHostPool. Defaults to a new ollama.Client.
+            concurrency (int): The maximum requests in flight. Match Ollama's OLLAMA_NUM_PARALLEL
+                               (times the number of hosts). Defaults to 4.
+            system_prompt (str): The system prompt sent with every item.
+            options (dict, optional): Generation options passed to the model, e.g. {"temperature": 0}.
+            keep_alive (int or str, optional): How long Ollama keeps the model loaded after each request.
+        """
+        self.model = model
+        self.client = client if client is not None else ollama.Client()
+        self.concurrency = concurrency
+        self.system_prompt = system_prompt
+        self.options = options
+        self.keep_alive = keep_alive
+        self._write_lock = threading.Lock()
+
+    def run(self, input_path, output_path, resume=True, prompt_field="prompt", id_field="id", progress_every=100):
+        """
+        Runs every prompt in a file and appends the results to the output file.
+
+        Args:
+            input_path (str): The JSONL or CSV prompt file.
+            output_path (str): The JSONL results file.
+            resume (bool): If True, skip items already completed in the output file;
+                           otherwise the output file is overwritten. Defaults to True.
+            prompt_field (str): The field or column holding the prompt. Defaults to "prompt".
+            id_field (str): The field or column holding the item id. Defaults to "id".
+            progress_every (int): Print progress after this many results; 0 disables it. Defaults to 100.
+
+        Returns:
+            dict: Counts of 'completed', 'failed' and 'skipped' items, and the run's 'seconds'.
+        """
+        done = completed_ids(output_path) if resume else set()
+        counts = {"completed": 0, "failed": 0, "skipped": 0}
+        slots = threading.BoundedSemaphore(self.concurrency * 2)
+        started = time.perf_counter()
+
+        def finished(future):
+            slots.release()
+            result = future.result()
+            with self._write_lock:
+                output.write(json.dumps(result, ensure_ascii=False) + "\n")
+                output.flush()
+                counts["failed" if result["error"] else "completed"] += 1
+                total = counts["completed"] + counts["failed"]
+                if progress_every and total % progress_every == 0:
+                    elapsed = time.perf_counter() - started
+                    print(f"{total} items done ({counts['failed']} failed), {total / elapsed:.1f} items/s")
+
+        with open(output_path, "a" if resume else "w", encoding="utf-8") as output, \
+                ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="batch") as executor:
+            if resume and not _ends_with_newline(output_path):
+                # Finish a line cut off by an interrupted run so the next result starts on its own line
+                output.write("\n")
+            for item in read_prompts(input_path, prompt_field, id_field):
+                if item["id"] in done:
+                    counts["skipped"] += 1
+                    continue
+                # Keep a small window of submitted items instead of queueing the whole file
+                slots.acquire()
+                executor.submit(self.run_item, item).add_done_callback(finished)
+
+        counts["seconds"] = time.perf_counter() - started
+        return counts
+
+    def run_item(self, item):
+        """
+        Runs one prompt, streaming the response to time it.
+
+        Args:
+            item (dict): An item with 'id' and 'prompt' keys.
+
+        Returns:
+            dict: The result: 'id', 'model', 'response', 'error' (None on success),
+                  'ttft_ms', 'duration_ms', and the server's 'prompt_eval_count' and 'eval_count'.
+        """
+        messages = [{"role": "system", "content": self.system_prompt}, {"role": "user", "content": item["prompt"]}]
+        result = {"id": item["id"], "model": self.model, "response": None, "error": None, "ttft_ms": None,
+                  "duration_ms": None, "prompt_eval_count": None, "eval_count": None}
+        chunks = []
+        began = time.perf_counter()
+        try:
+            for part in self.client.chat(model=self.model, messages=messages, options=self.options,
+                                         keep_alive=self.keep_alive, stream=True):
+                content = part.get("message", {}).get("content", "")
+                if content:
+                    if result["ttft_ms"] is None:
+                        result["ttft_ms"] = round((time.perf_counter() - began) * 1000, 3)
+                    chunks.append(content)
+                if part.get("done"):
+                    result["prompt_eval_count"] = part.get("prompt_eval_count")
+                    result["eval_count"] = part.get("eval_count")
+            result["response"] = "".join(chunks).strip()
+        except Exception as e:
+            result["error"] = f"{type(e).__name__}: {e}"
+        result["duration_ms"] = round((time.perf_counter() - began) * 1000, 3)
+        return result
+
+
+if __name__ == "__main__":
+    # Demo Usage:
+    # python batch_runner.py prompts.jsonl -m llama3.2 -o results.jsonl -c 8
+    parser = argparse.ArgumentParser(description="Run a JSONL/CSV prompt file against an Ollama model")
+    parser.add_argument("input", type=str, help="JSONL or CSV file of prompts")
+    parser.add_argument("-m", "--model", type=str, help="Model to run the prompts against", required=True)
+    parser.add_argument("-o", "--output", type=str, help="JSONL results file", default="results.jsonl")
+    parser.add_argument("-c", "--concurrency", type=int, help="Maximum requests in flight", default=4)
+    parser.add_argument("--prompt_field", type=str, help="Field or column holding the prompt", default="prompt")
+    parser.add_argument("--id_field", type=str, help="Field or column holding the item id", default="id")
+    parser.add_argument("--system", type=str, help="System prompt sent with every item", default=DEFAULT_SYSTEM_PROMPT)
+    parser.add_argument("--temperature", type=float, help="Sampling temperature", default=None)
+    parser.add_argument("--num_ctx", type=int, help="Context length passed to the model", default=None)
+    parser.add_argument("--ollama-hosts", type=str, nargs="+", default=None, help="Route requests across these Ollama servers")
+    parser.add_argument("--no_resume", action="store_true", help="Overwrite the output file instead of resuming")
+    args = parser.parse_args()
+
+    options = {key: value for key, value in (("temperature", args.temperature), ("num_ctx", args.num_ctx))
+               if value is not None}
+    client = OllamaHostPool(args.ollama_hosts) if args.ollama_hosts else None
+    runner = BatchRunner(args.model, client=client, concurrency=args.concurrency, system_prompt=args.system,
+                         options=options or None, keep_alive=-1)
+    try:
+        summary = runner.run(args.input, args.output, resume=not args.no_resume,
+                             prompt_field=args.prompt_field, id_field=args.id_field)
+    except (OSError, ValueError) as e:
+        print(f"Batch run failed: {e}")
+        sys.exit(1)
+    except KeyboardInterrupt:
+        print(f"\nInterrupted; run again to resume from {args.output}.")
+        sys.exit(130)
+    print(f"Completed {summary['completed']}, failed {summary['failed']}, skipped {summary['skipped']} "
+          f"in {summary['seconds']:.1f}s.")
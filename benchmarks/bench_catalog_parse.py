@@ -0,0 +1,61 @@
+"""
+Benchmark the single-pass catalog parser against the original regex parser.
+
+Usage:
+    python benchmarks/bench_catalog_parse.py [--models 2000] [--repeat 20] [--html library.html]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ollama_model import parse_catalog, parse_catalog_regex
+
+
+def synthetic_library(count):
+    """Build a library page resembling ollama.com/library with `count` models."""
+    blocks = []
+    for i in range(count):
+        sizes = "".join(f'<span x-test-size class="rounded-md px-2">{s}b</span>' for s in (1, 7, 70))
+        blocks.append(
+            f'<li x-test-model class="flex"><a href="/library/model-{i}" class="group w-full">'
+            f'<div class="flex flex-col"><h2 class="truncate"><div x-test-model-title title="model-{i}">'
+            f'<span>model-{i}</span></div></h2><p class="max-w-lg">A model that does things, number {i}.</p>'
+            f'<div class="flex flex-wrap">{sizes}<span x-test-capability>tools</span></div>'
+            f'<p class="my-1"><span x-test-pull-count>1.2M</span> Pulls</p></div></a></li>'
+        )
+    return "<html><body><ul>" + "\n".join(blocks) + "</ul></body></html>"
+
+
+def timed(func, html, repeat):
+    """Return the best wall time of `repeat` runs, in milliseconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(html)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Catalog parser benchmark")
+    parser.add_argument("--models", type=int, default=2000, help="Models in the synthetic page")
+    parser.add_argument("--repeat", type=int, default=20, help="Runs per parser")
+    parser.add_argument("--html", type=str, help="Parse a saved library page instead of a synthetic one")
+    args = parser.parse_args()
+
+    if args.html:
+        with open(args.html, "r", encoding="utf-8") as f:
+            html = f.read()
+    else:
+        html = synthetic_library(args.models)
+
+    assert parse_catalog(html) == parse_catalog_regex(html), "Parsers disagree"
+
+    regex_ms = timed(parse_catalog_regex, html, args.repeat)
+    single_ms = timed(parse_catalog, html, args.repeat)
+    print(f"page size: {len(html) / 1024:.0f} KiB, models: {len(parse_catalog(html))}")
+    print(f"regex (multi-pass): {regex_ms:8.2f} ms")
+    print(f"single-pass:        {single_ms:8.2f} ms  ({regex_ms / single_ms:.1f}x)")
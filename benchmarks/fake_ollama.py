@@ -0,0 +1,227 @@
+"""
+A stand-in Ollama server that streams tokens at a configurable rate.
+
+Implements the parts of the Ollama HTTP API the benchmarks use:
+/api/chat and /api/generate (streamed or not), /api/tags and /api/ps.
+Like Ollama, /api/chat keeps the last conversation per model as a prompt
+cache and reports in prompt_eval_count only the estimated tokens after the
+prefix it shares with that conversation. Timings are recorded with time.perf_counter, which reads a system-wide
+clock, so a benchmark in another process can compare them with its own.
+
+Extra endpoints:
+    POST /_config  {"tokens_per_second": 50, "tokens": 20}   change the stream shape;
+                   {"fail_after": 5} drops the connection after 5 tokens
+    GET  /_stats                                              timings of each request
+    POST /_reset                                              clear the timings
+
+Usage:
+    python benchmarks/fake_ollama.py [--port 11435] [--rate 50] [--tokens 20]
+"""
+import argparse
+import json
+import socket
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeOllamaServer(ThreadingHTTPServer):
+    """
+    An HTTP server emitting `tokens` tokens per response at `tokens_per_second`.
+
+    Set `tokens_per_second` to 0 to stream as fast as possible.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, port=0, tokens_per_second=50.0, tokens=20, host="127.0.0.1"):
+        """
+        Initializes the FakeOllamaServer class.
+
+        Args:
+            port (int): The port to listen on; 0 picks a free port. Defaults to 0.
+            tokens_per_second (float): The token rate of each response. Defaults to 50.
+            tokens (int): The number of tokens in each response. Defaults to 20.
+            host (str): The interface to bind. Defaults to 127.0.0.1.
+
+        Attributes:
+            stats (list): Per request: 'received', 'first_token' and 'done' perf_counter times.
+            loaded (set): Models that have served a request, reported by /api/ps.
+            fail_after (int or None): Drop streamed responses after this many tokens.
+            cached (dict): Per model, the messages of the last chat, standing in for the KV cache.
+        """
+        super().__init__((host, port), FakeOllamaHandler)
+        self.tokens_per_second = tokens_per_second
+        self.tokens = tokens
+        self.stats = []
+        self.loaded = set()
+        self.fail_after = None
+        self.cached = {}
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        """str: The base URL of the server."""
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """
+        Serves requests on a daemon thread and returns immediately.
+        """
+        threading.Thread(target=self.serve_forever, name="fake-ollama", daemon=True).start()
+
+    def stop(self):
+        """
+        Stops serving and closes the socket.
+        """
+        self.shutdown()
+        self.server_close()
+
+    def record(self, timing):
+        """Store the timings of one request."""
+        with self._lock:
+            self.stats.append(timing)
+
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    """Handles one connection to a FakeOllamaServer."""
+
+    protocol_version = "HTTP/1.1"
+    # Like the real server, send each token immediately rather than waiting to coalesce
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path == "/api/tags":
+            self._send_json({"models": [{"name": "fake:latest", "model": "fake:latest", "digest": "0" * 64,
+                                         "size": 0, "details": {"family": "fake"}}]})
+        elif self.path == "/api/ps":
+            self._send_json({"models": [{"name": name, "model": name} for name in sorted(self.server.loaded)]})
+        elif self.path == "/_stats":
+            self._send_json({"requests": self.server.stats})
+        else:
+            self._send_json({"error": "not found"}, status=404)
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_POST(self):
+        received = time.perf_counter()
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+
+        if self.path in ("/api/chat", "/api/generate"):
+            self._generate(body, received, chat=self.path == "/api/chat")
+        elif self.path == "/_config":
+            self.server.tokens_per_second = float(body.get("tokens_per_second", self.server.tokens_per_second))
+            self.server.tokens = int(body.get("tokens", self.server.tokens))
+            self.server.fail_after = body.get("fail_after", self.server.fail_after)
+            self._send_json({})
+        elif self.path == "/_reset":
+            self.server.stats.clear()
+            self._send_json({})
+        else:
+            self._send_json({"error": "not found"}, status=404)
+
+    def _generate(self, body, received, chat):
+        """Stream (or return) a response of the configured length and rate."""
+        model = body.get("model", "fake")
+        self.server.loaded.add(model)
+        rate = self.server.tokens_per_second
+        count = self.server.tokens
+        delay = 1.0 / rate if rate > 0 else 0.0
+        words = [f"tok{i} " for i in range(count)]
+        timing = {"received": received, "first_token": None, "done": None}
+        evaluated = self._evaluate_prompt(model, body.get("messages", [])) if chat else 1
+
+        def message(text, done):
+            chunk = {"model": model, "created_at": "2024-01-01T00:00:00Z", "done": done}
+            if chat:
+                chunk["message"] = {"role": "assistant", "content": text}
+            else:
+                chunk["response"] = text
+            if done:
+                chunk.update({"done_reason": "stop", "prompt_eval_count": evaluated, "eval_count": count})
+            return chunk
+
+        if not body.get("stream", True):
+            time.sleep(delay * count)
+            timing["first_token"] = timing["done"] = time.perf_counter()
+            self.server.record(timing)
+            self._send_json(message("".join(words), True))
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        start = time.perf_counter()
+        for i, word in enumerate(words):
+            # Pace against the start time so sleep overshoot does not accumulate
+            wait = start + (i + 1) * delay - time.perf_counter()
+            if wait > 0:
+                time.sleep(wait)
+            if i == self.server.fail_after:
+                # Simulate the server dying mid-stream
+                self.close_connection = True
+                self.connection.shutdown(socket.SHUT_RDWR)
+                return
+            self._write_chunk(message(word, False))
+            if timing["first_token"] is None:
+                timing["first_token"] = time.perf_counter()
+        self._write_chunk(message("", True))
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+        timing["done"] = time.perf_counter()
+        self.server.record(timing)
+
+    def _evaluate_prompt(self, model, messages):
+        """Return the estimated tokens of `messages` past the cached prefix, and cache the new chat."""
+        conversation = [(m.get("role"), (m.get("content") or "").strip()) for m in messages]
+        cached = self.server.cached.get(model, [])
+        shared = 0
+        while shared < min(len(cached), len(conversation)) and cached[shared] == conversation[shared]:
+            shared += 1
+        response = "".join(f"tok{i} " for i in range(self.server.tokens)).strip()
+        self.server.cached[model] = conversation + [("assistant", response)]
+        return sum(len(content) // 4 + 4 for _, content in conversation[shared:])
+
+    def _write_chunk(self, payload):
+        """Write one NDJSON line as an HTTP chunk."""
+        line = json.dumps(payload).encode() + b"\n"
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+        self.wfile.flush()
+
+    def _send_json(self, payload, status=200):
+        """Write a complete JSON response."""
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stand-in Ollama server for benchmarks")
+    parser.add_argument("--port", type=int, default=11435, help="Port to listen on (0 for any free port)")
+    parser.add_argument("--rate", type=float, default=50.0, help="Tokens per second (0 for unthrottled)")
+    parser.add_argument("--tokens", type=int, default=20, help="Tokens per response")
+    args = parser.parse_args()
+
+    server = FakeOllamaServer(args.port, args.rate, args.tokens)
+    # The first line of output is the URL, so a parent process can read the chosen port
+    print(server.url, flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        sys.exit(0)
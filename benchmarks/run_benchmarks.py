@@ -0,0 +1,302 @@
+"""
+Benchmark the chat, history and catalog search paths against local stand-ins.
+
+Ollama is replaced by benchmarks/fake_ollama.py, which runs in a separate
+process so its work does not compete with the client for the GIL. MongoDB is
+replaced by mongomock, or a real server if --mongo-url is given.
+
+Reported metrics (all lower is better):
+    ttft_overhead_ms_*       client-side time to first token, i.e. time to
+                             first chunk minus the server's own time to first token
+    token_cpu_us             client CPU time per streamed token
+    token_wall_us            wall time per token with an unthrottled server
+    prompt_eval_tokens       prompt tokens the server evaluated per turn, i.e. not
+                             reused from its prompt cache
+    history_load_ms_<n>      Mongo.get_history with n messages in the collection
+    search_us_<n>            OllamaModel.get_suggestions with n models in the catalog
+    calibration_ms           a fixed pure-Python workload, measuring the machine itself
+
+The suite runs `--rounds` times and each metric is the median over the
+rounds. Timing metrics are compared after scaling the baseline by the
+change in calibration_ms, so a machine that is busier or slower than the
+one the baseline was recorded on does not flag every metric. A metric is
+flagged only when its change exceeds the tolerance plus the spread seen
+between rounds, in this run and in the baseline.
+
+Usage:
+    python benchmarks/run_benchmarks.py --save benchmarks/baseline.json
+    python benchmarks/run_benchmarks.py --compare benchmarks/baseline.json [--tolerance 0.25]
+
+Requires: pip install -r benchmarks/requirements.txt
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import requests
+
+
+def start_fake_ollama(rate, tokens):
+    """Start fake_ollama.py on a free port and return (process, url)."""
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, "benchmarks", "fake_ollama.py"), "--port", "0",
+         "--rate", str(rate), "--tokens", str(tokens)],
+        stdout=subprocess.PIPE, text=True,
+    )
+    url = process.stdout.readline().strip()
+    return process, url
+
+
+def mongo_client(url):
+    """Return a MongoClient for `url`, or a shared in-memory one if url is None."""
+    if url:
+        from pymongo import MongoClient
+        return MongoClient(url)
+    import mongomock
+    return mongomock.MongoClient()
+
+
+def percentile(values, fraction):
+    """Return the value at `fraction` of the sorted values."""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def calibrate(repeat):
+    """Time a fixed workload of JSON encoding and sorting, like the client's own hot paths."""
+    data = [{"role": "user" if i % 2 else "assistant", "content": f"message {i} " * 8} for i in range(2000)]
+    times = []
+    for _ in range(repeat):
+        began = time.perf_counter()
+        json.loads(json.dumps(data))
+        sorted(str(i) for i in range(20000))
+        times.append((time.perf_counter() - began) * 1000)
+    return {"calibration_ms": statistics.median(times)}
+
+
+def bench_chat(url, client, requests_count, rate, tokens):
+    """Measure time-to-first-token and per-token overhead of Chat.process_question."""
+    import db
+    from chat import Chat
+    from streaming import CallbackSink
+
+    # Chat opens its own client; hand it the benchmark's instead
+    db.MongoClient = lambda *args, **kwargs: client
+    client.drop_database("BENCH")
+
+    first_chunk = []
+    sink = CallbackSink(lambda chunk: first_chunk.append(time.perf_counter()) if not first_chunk else None)
+    chat = Chat("fake", "unused", "BENCH", "chat_history", sinks=[sink])
+
+    control = requests.Session()
+    control.post(f"{url}/_config", json={"tokens_per_second": rate, "tokens": tokens})
+    control.post(f"{url}/_reset")
+    chat.process_question("warm up the connection")
+    control.post(f"{url}/_reset")
+
+    starts, firsts, evaluated = [], [], []
+    for i in range(requests_count):
+        first_chunk.clear()
+        starts.append(time.perf_counter())
+        chat.process_question(f"question {i}")
+        firsts.append(first_chunk[0])
+        evaluated.append(chat.prompt_stats["prompt_eval_count"])
+    server = control.get(f"{url}/_stats").json()["requests"]
+    overheads = [
+        ((first - start) - (timing["first_token"] - timing["received"])) * 1000
+        for start, first, timing in zip(starts, firsts, server)
+    ]
+
+    # Per-token cost: an unthrottled server and a long response
+    long_tokens = 2000
+    control.post(f"{url}/_config", json={"tokens_per_second": 0, "tokens": long_tokens})
+    cpu, wall = [], []
+    for _ in range(3):
+        cpu_start, wall_start = time.process_time(), time.perf_counter()
+        chat.process_question("a long answer please")
+        cpu.append(time.process_time() - cpu_start)
+        wall.append(time.perf_counter() - wall_start)
+    control.post(f"{url}/_config", json={"tokens_per_second": rate, "tokens": tokens})
+    chat.mongo_client.flush()
+
+    return {
+        "ttft_overhead_ms_p50": statistics.median(overheads),
+        "ttft_overhead_ms_p95": percentile(overheads, 0.95),
+        "token_cpu_us": statistics.median(cpu) / long_tokens * 1e6,
+        "token_wall_us": statistics.median(wall) / long_tokens * 1e6,
+        "prompt_eval_tokens": statistics.mean(evaluated),
+    }
+
+
+def bench_history(client, sizes, repeat):
+    """Measure Mongo.get_history as the collection grows."""
+    from db import Mongo
+
+    results = {}
+    mongo = Mongo("unused", "BENCH", "history_bench", client=client)
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    inserted = 0
+    for size in sizes:
+        # Grow the collection to `size` messages; one in ten belongs to the session that is loaded
+        documents = []
+        for i in range(inserted, size):
+            session = "target" if i % 10 == 0 else f"other-{i % 97}"
+            role = "user" if i % 2 == 0 else "assistant"
+            documents.append({"model": "fake", "session": session, "role": role,
+                              "content": f"message {i} " * 8, "timestamp": start + timedelta(seconds=i)})
+        if documents:
+            mongo.append_messages(documents)
+        inserted = size
+
+        times = []
+        for _ in range(repeat):
+            began = time.perf_counter()
+            mongo.get_history(model="fake", session="target")
+            times.append((time.perf_counter() - began) * 1000)
+        results[f"history_load_ms_{size}"] = statistics.median(times)
+    client.drop_database("BENCH")
+    return results
+
+
+def synthetic_catalog(count):
+    """Return a catalog of `count` models shaped like OllamaModel.models."""
+    families = ["llama", "mistral", "qwen", "gemma", "phi", "deepseek", "codellama", "nomic-embed", "llava", "granite"]
+    sizes = ["1b", "3b", "7b", "13b", "70b"]
+    return {f"{families[i % len(families)]}{i // len(families)}": sizes[: 1 + i % len(sizes)] for i in range(count)}
+
+
+def bench_search(sizes, repeat):
+    """Measure OllamaModel.get_suggestions as the catalog grows."""
+    from ollama_model import OllamaModel
+
+    queries = ["ll", "llama3", "mistrl", "qwen2:7b", "embed", "deepsek", "phi", "gem"]
+    results = {}
+    for size in sizes:
+        builds = []
+        for _ in range(3):
+            model = OllamaModel(cache_path=os.devnull)
+            model.models = synthetic_catalog(size)
+            model.model_names = list(model.models)
+            began = time.perf_counter()
+            model.get_suggestions("warm")
+            builds.append((time.perf_counter() - began) * 1000)
+        results[f"search_build_ms_{size}"] = statistics.median(builds)
+
+        times = []
+        for _ in range(repeat):
+            for query in queries:
+                began = time.perf_counter()
+                model.get_suggestions(query)
+                times.append((time.perf_counter() - began) * 1e6)
+        results[f"search_us_{size}"] = statistics.median(times)
+    return results
+
+
+def summarize(rounds):
+    """Return the median of each metric over the rounds, and its spread as a fraction of the median."""
+    results, spread = {}, {}
+    for name in rounds[0]:
+        values = [round_results[name] for round_results in rounds]
+        results[name] = statistics.median(values)
+        spread[name] = (max(values) - min(values)) / results[name] if results[name] > 0 else 0.0
+    return results, spread
+
+
+def is_timing(name):
+    """Whether a metric is a duration, which scales with the speed of the machine."""
+    return "_ms" in name or "_us" in name
+
+
+def compare(results, spread, baseline, tolerance):
+    """Print each metric against the baseline and return the regressed metric names."""
+    base_results, base_spread = baseline["results"], baseline.get("spread", {})
+    calibration, base_calibration = results.get("calibration_ms"), base_results.get("calibration_ms")
+    scale = calibration / base_calibration if calibration and base_calibration else 1.0
+    print(f"\nThis machine ran the calibration workload at {scale:.2f}x the baseline's time; "
+          f"timing baselines are scaled to match.")
+
+    regressions = []
+    print(f"\n{'metric':32} {'baseline':>12} {'current':>12} {'change':>8} {'allowed':>8}")
+    for name, value in results.items():
+        base = base_results.get(name)
+        if base is None or base <= 0:
+            print(f"{name:32} {'-':>12} {value:12.3f}")
+            continue
+        if is_timing(name) and name != "calibration_ms":
+            base *= scale
+        change = value / base - 1
+        allowed = tolerance + spread.get(name, 0.0) + base_spread.get(name, 0.0)
+        flag = "  REGRESSION" if change > allowed else ""
+        print(f"{name:32} {base:12.3f} {value:12.3f} {change:+8.1%} {allowed:8.0%}{flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="OllamaGenie benchmark suite")
+    parser.add_argument("--rate", type=float, default=50.0, help="Fake server tokens per second")
+    parser.add_argument("--tokens", type=int, default=20, help="Tokens per response for the TTFT runs")
+    parser.add_argument("--requests", type=int, default=30, help="Questions asked for the TTFT runs")
+    parser.add_argument("--history-sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--catalog-sizes", type=int, nargs="+", default=[200, 2000, 20000])
+    parser.add_argument("--repeat", type=int, default=20, help="Repetitions per history/search measurement")
+    parser.add_argument("--rounds", type=int, default=3, help="Runs of the whole suite; each metric is the median")
+    parser.add_argument("--mongo-url", type=str, default=None, help="Use a real MongoDB instead of mongomock")
+    parser.add_argument("--save", type=str, help="Write the results to this JSON file")
+    parser.add_argument("--compare", type=str, help="Compare against a saved JSON baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="Allowed slowdown, on top of the spread between rounds, before a metric is flagged")
+    args = parser.parse_args()
+
+    server, ollama_url = start_fake_ollama(args.rate, args.tokens)
+    # The ollama package reads OLLAMA_HOST when it is first imported
+    os.environ["OLLAMA_HOST"] = ollama_url
+    client = mongo_client(args.mongo_url)
+    try:
+        rounds = []
+        for number in range(args.rounds):
+            print(f"Round {number + 1} of {args.rounds}...", flush=True)
+            round_results = calibrate(args.repeat)
+            round_results.update(bench_chat(ollama_url, client, args.requests, args.rate, args.tokens))
+            round_results.update(bench_history(client, sorted(args.history_sizes), args.repeat))
+            round_results.update(bench_search(sorted(args.catalog_sizes), args.repeat))
+            rounds.append(round_results)
+    finally:
+        server.terminate()
+        server.wait()
+    results, spread = summarize(rounds)
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressed = compare(results, spread, baseline, args.tolerance)
+    else:
+        for name, value in results.items():
+            print(f"{name:32} {value:12.3f}")
+        regressed = []
+
+    if args.save:
+        report = {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "mongo": "mongodb" if args.mongo_url else "mongomock",
+            "rounds": args.rounds,
+            "results": results,
+            "spread": spread,
+        }
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved results to {args.save}")
+
+    sys.exit(1 if regressed else 0)
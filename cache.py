@@ -0,0 +1,286 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from datetime import timedelta
+from pymongo.errors import PyMongoError
+from db import utc_now
+
+
+def cache_key(model, messages, options=None):
+    """
+    Computes the cache key for a generation request.
+
+    Args:
+        model (str): The name of the AI model.
+        messages (list): The assembled message list sent to the model.
+        options (dict, optional): The generation options.
+
+    Returns:
+        str: A SHA-256 hex digest of the model, options and messages.
+    """
+    payload = [model, options or {}, [[m.get("role"), m.get("content")] for m in messages]]
+    encoded = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class LRUCache:
+    """
+    A thread-safe in-memory least-recently-used cache.
+    """
+
+    def __init__(self, max_entries=1024):
+        """
+        Initializes the LRUCache class.
+
+        Args:
+            max_entries (int): The maximum number of entries kept. Defaults to 1024.
+        """
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Returns the value for a key and marks it most recently used.
+
+        Args:
+            key (str): The cache key.
+
+        Returns:
+            The cached value, or None when absent.
+        """
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        """
+        Stores a value, evicting the least recently used entry when full.
+
+        Args:
+            key (str): The cache key.
+            value: The value to store.
+        """
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class MongoCacheStore:
+    """
+    A persistent cache tier stored in a MongoDB collection.
+
+    Entries expire through a TTL index on 'created_at'. Because MongoDB
+    removes expired documents periodically rather than instantly, lookups
+    also filter on age.
+    """
+
+    def __init__(self, collection, ttl_seconds=7 * 24 * 3600):
+        """
+        Initializes the MongoCacheStore class.
+
+        Args:
+            collection (Collection): The MongoDB collection holding cached responses.
+            ttl_seconds (int): Seconds before an entry expires. Defaults to one week.
+        """
+        self.collection = collection
+        self.ttl = timedelta(seconds=ttl_seconds)
+        try:
+            self.collection.create_index("created_at", expireAfterSeconds=ttl_seconds, name="created_at_ttl")
+        except PyMongoError as e:
+            print(f"Error creating response cache index: {e}")
+
+    def get(self, key):
+        """
+        Returns a cached response if present and not expired.
+
+        Args:
+            key (str): The cache key.
+
+        Returns:
+            str or None: The cached response.
+        """
+        document = self.collection.find_one({"_id": key, "created_at": {"$gt": utc_now() - self.ttl}},
+                                            {"response": 1})
+        return document["response"] if document else None
+
+    def set(self, key, response):
+        """
+        Stores a response, replacing any previous entry for the key.
+
+        Args:
+            key (str): The cache key.
+            response (str): The response text.
+        """
+        self.collection.replace_one({"_id": key}, {"response": response, "created_at": utc_now()}, upsert=True)
+
+
+class _Flight:
+    """
+    A generation in progress, shared by every request for the same key.
+
+    The leader publishes chunks as they arrive; followers iterate the same
+    chunks, waiting for new ones until the leader finishes.
+    """
+
+    def __init__(self):
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self._condition = threading.Condition()
+
+    def publish(self, chunk):
+        with self._condition:
+            self.chunks.append(chunk)
+            self._condition.notify_all()
+
+    def finish(self, error=None):
+        with self._condition:
+            self.done = True
+            self.error = error
+            self._condition.notify_all()
+
+    def __iter__(self):
+        index = 0
+        while True:
+            with self._condition:
+                while index == len(self.chunks) and not self.done:
+                    self._condition.wait()
+                pending = self.chunks[index:]
+                done, error = self.done, self.error
+            yield from pending
+            index += len(pending)
+            if done and index == len(self.chunks):
+                if error is not None:
+                    raise error
+                return
+
+
+class ResponseCache:
+    """
+    Caches complete model responses by exact request, with single-flight generation.
+
+    Lookups check an in-memory LRU tier, then an optional persistent tier,
+    promoting persistent hits into memory. Concurrent misses for the same key
+    share one generation: the first caller produces the response and the
+    others stream the same chunks as they are generated.
+
+    Attributes:
+        hits (int): The number of lookups answered from the cache.
+        misses (int): The number of lookups that required a generation.
+    """
+
+    def __init__(self, max_entries=1024, persistent=None):
+        """
+        Initializes the ResponseCache class.
+
+        Args:
+            max_entries (int): The maximum entries in the in-memory tier. Defaults to 1024.
+            persistent (MongoCacheStore, optional): The persistent tier. Defaults to none.
+        """
+        self.memory = LRUCache(max_entries)
+        self.persistent = persistent
+        self.hits = 0
+        self.misses = 0
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Returns a cached response from the fastest tier that has it.
+
+        Args:
+            key (str): The cache key.
+
+        Returns:
+            str or None: The cached response.
+        """
+        response = self.memory.get(key)
+        if response is None and self.persistent is not None:
+            try:
+                response = self.persistent.get(key)
+            except PyMongoError as e:
+                print(f"Error reading response cache: {e}")
+            if response is not None:
+                self.memory.set(key, response)
+        return response
+
+    def set(self, key, response):
+        """
+        Stores a response in every tier.
+
+        Args:
+            key (str): The cache key.
+            response (str): The response text.
+        """
+        self.memory.set(key, response)
+        if self.persistent is not None:
+            try:
+                self.persistent.set(key, response)
+            except PyMongoError as e:
+                print(f"Error writing response cache: {e}")
+
+    def stream(self, key, produce):
+        """
+        Streams the response for a key from the cache or a shared generation.
+
+        Args:
+            key (str): The cache key.
+            produce (callable): Returns an iterable of response chunks; called
+                                only when this caller leads a new generation.
+
+        Yields:
+            str: The response chunks. A cached response is replayed as one chunk.
+        """
+        response = self.get(key)
+        if response is not None:
+            self.hits += 1
+            yield response
+            return
+
+        with self._lock:
+            flight = self._flights.get(key)
+            # A generation may have finished since the lookup above.
+            response = self.memory.get(key) if flight is None else None
+            leader = flight is None and response is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if response is not None:
+            self.hits += 1
+            yield response
+            return
+
+        if not leader:
+            self.hits += 1
+            yield from flight
+            return
+
+        self.misses += 1
+        parts = []
+        try:
+            for chunk in produce():
+                parts.append(chunk)
+                flight.publish(chunk)
+                yield chunk
+        except Exception as e:
+            flight.finish(e)
+            raise
+        except BaseException:
+            flight.finish(RuntimeError("The shared generation was cancelled."))
+            raise
+        else:
+            flight.finish()
+            if parts:
+                self.set(key, "".join(parts))
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
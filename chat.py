@@ -1,7 +1,213 @@
 # chat_history.py
 
-from db import Mongo
+from bisect import bisect_left
+from db import Mongo, DEFAULT_SESSION, DEFAULT_HISTORY_LIMIT, utc_now
 from ollama import chat
+from cache import cache_key
+from host_pool import prefix_digests, shared_prefix_length
+from streaming import StreamPipeline, TerminalSink
+from tracing import tracer
+
+DEFAULT_SYSTEM_PROMPT = "You are a helpful assistant."
+CHARS_PER_TOKEN = 4
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def estimate_tokens(text):
+    """
+    Estimates the number of tokens in a piece of text.
+
+    Uses a characters-per-token heuristic, which is close enough for
+    budgeting without shipping a tokenizer for every model.
+
+    Args:
+        text (str): The text to measure.
+
+    Returns:
+        int: The estimated token count.
+    """
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+class ContextWindow:
+    """
+    Assembles the message list sent to the model within a token budget.
+
+    The system prompt is always pinned at the start of the context, followed
+    by the most recent messages that fit in the budget. Token counts are
+    computed once per message when it is appended and kept alongside it, so
+    assembling the context on each turn does not re-measure the history.
+
+    The selected messages only change by appending until the budget is
+    exceeded; the oldest messages are then dropped in one chunk that frees
+    `trim_fraction` of the budget. Consecutive turns therefore share the same
+    prompt prefix, which Ollama can reuse from its KV cache instead of
+    evaluating the whole conversation again.
+    """
+
+    def __init__(self, system_prompt=DEFAULT_SYSTEM_PROMPT, context_length=4096, reserve_tokens=1024,
+                 trim_fraction=0.25, memory_fraction=0.25):
+        """
+        Initializes the ContextWindow class.
+
+        Args:
+            system_prompt (str): The pinned system prompt.
+            context_length (int): The model's context length in tokens. Defaults to 4096.
+            reserve_tokens (int): Tokens kept free for the model's response. Defaults to 1024.
+            trim_fraction (float): The share of the budget freed each time old messages
+                                   are dropped. Defaults to 0.25.
+            memory_fraction (float): The largest share of the budget recalled messages
+                                     may take. Defaults to 0.25.
+
+        Attributes:
+            system_message (dict): The pinned system prompt message.
+            messages (list): Every message appended to the window, oldest first.
+            token_counts (list): The cached token count of each message in `messages`.
+            budget (int): Tokens available for history after the system prompt and reserve.
+        """
+        self.system_message = {"role": "system", "content": system_prompt}
+        self.messages = []
+        self.token_counts = []
+        self._cumulative = [0]
+        self._start = 0
+        self.trim_fraction = trim_fraction
+        self.memory_fraction = memory_fraction
+        self.set_context_length(context_length, reserve_tokens)
+
+    def set_context_length(self, context_length, reserve_tokens=1024):
+        """
+        Recomputes the history budget for a model's context length.
+
+        Args:
+            context_length (int): The model's context length in tokens.
+            reserve_tokens (int): Tokens kept free for the model's response.
+        """
+        self.context_length = context_length
+        self.reserve_tokens = reserve_tokens
+        pinned = self.count_tokens(self.system_message)
+        self.budget = max(context_length - reserve_tokens - pinned, 0)
+
+    @staticmethod
+    def count_tokens(message):
+        """
+        Estimates the tokens a single message occupies in the prompt.
+
+        Args:
+            message (dict): A message with 'role' and 'content' keys.
+
+        Returns:
+            int: The estimated token count, including per-message overhead.
+        """
+        return estimate_tokens(message.get("content") or "") + MESSAGE_OVERHEAD_TOKENS
+
+    def append(self, message):
+        """
+        Appends a message and caches its token count.
+
+        Args:
+            message (dict): A message with 'role' and 'content' keys.
+        """
+        tokens = self.count_tokens(message)
+        self.messages.append(message)
+        self.token_counts.append(tokens)
+        self._cumulative.append(self._cumulative[-1] + tokens)
+
+    def extend(self, messages):
+        """
+        Appends several messages in order.
+
+        Args:
+            messages (iterable): Messages with 'role' and 'content' keys.
+        """
+        for message in messages:
+            self.append(message)
+
+    @staticmethod
+    def truncate(message, tokens):
+        """
+        Shortens a message to fit in a number of tokens, keeping its end.
+
+        The end of a long message usually holds the actual question, e.g.
+        after a pasted document.
+
+        Args:
+            message (dict): A message with 'role' and 'content' keys.
+            tokens (int): The tokens the message may occupy, including overhead.
+
+        Returns:
+            dict: A copy of the message whose content fits in `tokens`.
+        """
+        marker = "[...] "
+        chars = max(tokens - MESSAGE_OVERHEAD_TOKENS, 0) * CHARS_PER_TOKEN - len(marker)
+        content = message.get("content") or ""
+        return {**message, "content": marker + content[-chars:] if chars > 0 else ""}
+
+    def select(self, recalled=None):
+        """
+        Selects the messages to send to the model on this turn.
+
+        The latest message is always included, truncated if it alone exceeds
+        the budget; older messages fill what is left.
+
+        Args:
+            recalled (list, optional): Relevant older messages retrieved from
+                                       long-term memory, most relevant first. They are
+                                       merged into one system message placed just before
+                                       the latest message, limited to `memory_fraction`
+                                       of the budget and to what the latest message leaves.
+
+        Returns:
+            list: The system message followed by the most recent messages
+                  whose combined token count fits in the budget, starting
+                  where the previous turn's selection started if they still fit.
+        """
+        if not self.messages:
+            return [self.system_message]
+
+        latest = self.messages[-1]
+        if self.token_counts[-1] > self.budget:
+            latest = self.truncate(latest, self.budget)
+        budget = self.budget - self.count_tokens(latest)
+
+        memory_message = self._memory_message(recalled, min(int(self.budget * self.memory_fraction), budget))
+        if memory_message:
+            budget -= self.count_tokens(memory_message)
+
+        # Older history is messages[:end]; keep the start of the previous turn while it still fits
+        end = len(self.messages) - 1
+        total = self._cumulative[end]
+        self._start = min(self._start, end)
+        if total - self._cumulative[self._start] > budget:
+            # First index whose suffix of older history leaves trim_fraction of the budget free
+            target = budget - int(budget * self.trim_fraction)
+            self._start = bisect_left(self._cumulative, total - target, 0, end)
+        selected = [self.system_message] + self.messages[self._start:end]
+        if memory_message:
+            selected.append(memory_message)
+        selected.append(latest)
+        return selected
+
+    def _memory_message(self, recalled, tokens):
+        """Merge recalled messages into one system message of at most `tokens`, or None."""
+        if not recalled:
+            return None
+        header = "Relevant earlier conversation:"
+        content = header
+        for m in recalled:
+            line = f"\n{m['role']}: {m['content']}"
+            if estimate_tokens(content + line) + MESSAGE_OVERHEAD_TOKENS > tokens:
+                if content == header:
+                    # Even the most relevant message is too long: keep what fits of it
+                    content = self.truncate({"content": content + line}, tokens)["content"]
+                break
+            content += line
+        if content == header or estimate_tokens(content) + MESSAGE_OVERHEAD_TOKENS > tokens:
+            return None
+        return {"role": "system", "content": content}
+
+    def __len__(self):
+        return len(self.messages)
+
 
 class Chat(Mongo):
     """
@@ -12,7 +218,10 @@ class Chat(Mongo):
     and retrieve it. It also integrates with an external chat API.
     """
 
-    def __init__(self, model, mongo_client_url, database, collection):
+    def __init__(self, model, mongo_client_url, database, collection, session=DEFAULT_SESSION,
+                 system_prompt=DEFAULT_SYSTEM_PROMPT, context_length=4096, reserve_tokens=1024,
+                 history_limit=DEFAULT_HISTORY_LIMIT, write_behind=True, sinks=None, options=None, cache=None,
+                 semantic_cache=None, memory=None, keep_alive=None, client=None, scheduler=None, priority=0):
         """
         Initializes the Chat class.
 
@@ -21,50 +230,148 @@ class Chat(Mongo):
             mongo_client_url (str): The URL for the MongoDB client.
             database (str): The name of the database to connect to.
             collection (str): The name of the collection to use.
+            session (str): The conversation session key. Defaults to "default".
+            system_prompt (str): The system prompt pinned at the start of every request.
+            context_length (int): The model's context length in tokens. Defaults to 4096.
+            reserve_tokens (int): Tokens kept free for the model's response. Defaults to 1024.
+            history_limit (int): The number of recent messages loaded at startup. Defaults to 200.
+            write_behind (bool): If True, messages are saved in the background. Defaults to True.
+            sinks (list, optional): Sinks that receive response chunks. Defaults to a TerminalSink.
+            options (dict, optional): Generation options passed to the model, e.g. {"temperature": 0}.
+            cache (ResponseCache, optional): Caches responses by exact request. Defaults to none.
+            semantic_cache (SemanticCache, optional): Answers paraphrased questions from cache. Defaults to none.
+            memory (LongTermMemory, optional): Recalls relevant older messages into the context. Defaults to none.
+            keep_alive (int or str, optional): How long Ollama keeps the model loaded after each request.
+            client (optional): The Ollama client, e.g. an OllamaHostPool spreading requests over
+                               several servers. Defaults to the module-level client.
+            scheduler (ModelScheduler, optional): Queues generation behind other sessions' requests
+                                                  to limit model swaps. Defaults to none.
+            priority (int): This session's priority in the scheduler; higher is served first. Defaults to 0.
 
         Attributes:
             model (str): Stores the AI model name.
+            session (str): Stores the conversation session key.
             user_input (dict or None): Stores the last user input message.
             model_response (dict or None): Stores the last model-generated response.
             mongo_client (Mongo): Instance of the Mongo class for database operations.
+            context (ContextWindow): Assembles the token-budgeted context sent to the model.
+            pipeline (StreamPipeline): Fans streamed response chunks out to the sinks.
+            options (dict or None): Generation options passed to the model.
+            cache (ResponseCache or None): The response cache consulted before generating.
+            semantic_cache (SemanticCache or None): The similarity cache consulted after an exact miss.
+            memory (LongTermMemory or None): Indexes saved messages and recalls relevant ones.
+            keep_alive (int or str or None): The keep-alive sent with each request.
+            client (object or None): The Ollama client used for generation, if not the default.
+            scheduler (ModelScheduler or None): Admits this session's generation requests.
+            priority (int): This session's priority in the scheduler.
+            prompt_stats (dict or None): Prompt reuse on the last generated turn: the server's
+                                         'prompt_eval_count', the 'reused_messages' shared with
+                                         the previous turn's prompt and response, and the
+                                         'reused_tokens' the server did not evaluate.
             history (list): List of dictionaries representing the chat history.
+            oldest_timestamp (datetime or None): Timestamp of the oldest loaded message, used for paging.
         """
         self.model = model
+        self.session = session
+        self.oldest_timestamp = None
         self.user_input = None
         self.model_response = None
+        self.context = ContextWindow(system_prompt, context_length, reserve_tokens)
+        self.history = self.context.messages
+        self.pipeline = StreamPipeline([TerminalSink()] if sinks is None else sinks)
+        self.options = options
+        self.cache = cache
+        self.semantic_cache = semantic_cache
+        self.memory = memory
+        self.keep_alive = keep_alive
+        self.client = client
+        self.scheduler = scheduler
+        self.priority = priority
+        self.prompt_stats = None
+        self._last_conversation = []
 
         try:
-            self.mongo_client = Mongo(mongo_client_url, database, collection)
-            self.history = self.mongo_client.get_history(model=self.model)
-
-            if len(self.history) == 0:
-                self.history.append({"role": "assistant", "content": "You are a helpful assistant."})
+            self.mongo_client = Mongo(mongo_client_url, database, collection, write_behind=write_behind)
+            if self.memory is not None:
+                self.mongo_client.add_save_listener(self.memory.add_messages)
+            with tracer.span("history_load", model=self.model, session=self.session) as span:
+                messages = self.mongo_client.get_history(model=self.model, session=self.session, limit=history_limit)
+                span.set(messages=len(messages))
+            if messages:
+                self.oldest_timestamp = messages[0].get("timestamp")
+            # Only role and content go to the model; stored timestamps stay in the database
+            self.context.extend({"role": m.get("role"), "content": m.get("content")} for m in messages)
 
         except Exception as e:
             print(f"Error initializing ChatHistory: {e}")
-            self.history = [{"role": "assistant", "content": "You are a helpful assistant."}]
 
     def process_question(self, question):
         """
         Processes the user's question and returns a response.
 
+        The response is streamed to the registered sinks as it is generated.
+
         Args:
             question (str): The user's input question.
 
         Returns:
             str: The cleaned response generated by the AI model.
         """
+        stream = self.stream_question(question)
+        while True:
+            try:
+                next(stream)
+            except StopIteration as stop:
+                return stop.value
+
+    def stream_question(self, question):
+        """
+        Processes the user's question, yielding the response as it is generated.
+
+        Every chunk is also passed to the registered sinks. The response is
+        added to the chat history once the stream is exhausted.
+
+        Args:
+            question (str): The user's input question.
+
+        Yields:
+            str: Each chunk of the model's response.
+
+        Returns:
+            str: The cleaned response, as the generator's return value.
+        """
         self.add_user_message(question)
 
-        # print(self.get_history())
+        with tracer.span("context") as span:
+            messages = self.get_context()
+            if self.memory is not None:
+                with tracer.span("recall"):
+                    recalled = self.memory.recall(self.model, question, self.session,
+                                                  exclude=[m["content"] for m in messages])
+                messages = self.get_context(recalled)
+            span.set(messages=len(messages))
 
-        full_response = ""
+        # The layers that had to produce the response; a layer missing here was answered from cache
+        produced = []
 
-        for response in chat(model=self.model, messages=self.get_history(), stream=True):
-            chunk = response.get("message", {}).get("content", "")
-            chunk = chunk.replace("", "").replace("", "")  # <-- Clean it here
-            print(chunk, end="", flush=True)
-            full_response += chunk
+        def from_model():
+            produced.append("model")
+            return self.generate(messages)
+
+        produce = from_model
+        if self.semantic_cache is not None:
+            def produce():
+                produced.append("semantic")
+                return self.semantic_cache.stream(self.model, question, from_model)
+        if self.cache is not None:
+            chunks = self.cache.stream(cache_key(self.model, messages, self.options), produce)
+        else:
+            chunks = produce()
+        full_response = yield from self.pipeline.stream(chunks)
+        if self.cache is not None:
+            tracer.cache_result("exact", hit=not produced)
+        if "semantic" in produced:
+            tracer.cache_result("semantic", hit="model" not in produced)
 
         # Clean the final response
         if full_response:
@@ -75,6 +382,89 @@ class Chat(Mongo):
         self.add_bot_response(cleaned_response)
         return cleaned_response
 
+    def generate(self, messages):
+        """
+        Streams a response from the model for an assembled message list.
+
+        Args:
+            messages (list): The messages to send to the model.
+
+        Yields:
+            str: Each chunk of the model's response.
+
+        Raises:
+            SchedulerOverloaded: If the scheduler rejected or shed the request.
+        """
+        if self.scheduler is not None:
+            with tracer.span("queue"):
+                self.scheduler.acquire(self.model, self.priority)
+        try:
+            yield from self._generate(messages)
+        finally:
+            if self.scheduler is not None:
+                self.scheduler.release(self.model)
+
+    def _generate(self, messages):
+        """Stream a response from the model, recording generation metrics."""
+        with tracer.span("generation", model=self.model) as span:
+            tokens = 0
+            first_token_at = None
+            chunks = []
+            evaluated = None
+            send = self.client.chat if self.client is not None else chat
+            for response in send(model=self.model, messages=messages, options=self.options,
+                                 keep_alive=self.keep_alive, stream=True):
+                content = response.get("message", {}).get("content", "")
+                if content:
+                    if first_token_at is None:
+                        first_token_at = span.elapsed()
+                        tracer.record("ttft", first_token_at, model=self.model)
+                    tokens += 1
+                if response.get("done") and response.get("eval_duration"):
+                    # Prefer the server's own count and timing when it reports them
+                    tracer.observe_rate(response["eval_count"], response["eval_duration"] / 1e9, self.model)
+                    tokens = 0
+                if response.get("done"):
+                    evaluated = response.get("prompt_eval_count")
+                chunks.append(content)
+                yield content
+            if tokens and first_token_at is not None:
+                tracer.observe_rate(tokens, span.elapsed() - first_token_at, self.model)
+            span.set(prompt_messages=len(messages))
+            self._record_prompt_reuse(messages, "".join(chunks), evaluated, span)
+
+    def _record_prompt_reuse(self, messages, response, evaluated, span):
+        """
+        Measure how much of the prompt the server took from its KV cache.
+
+        Ollama reports in `prompt_eval_count` only the prompt tokens it had
+        to evaluate, so the rest of the estimated prompt was reused. When the
+        server omits the count, the reuse is estimated instead from the
+        leading messages this prompt shares with the previous turn's prompt
+        and response, which Ollama holds in its KV cache after that turn.
+        """
+        digests = prefix_digests(messages)
+        reused = shared_prefix_length(digests, self._last_conversation)
+        if evaluated is not None:
+            prompt_tokens = sum(ContextWindow.count_tokens(message) for message in messages)
+            reused_tokens = max(prompt_tokens - evaluated, 0)
+        else:
+            reused_tokens = sum(ContextWindow.count_tokens(message) for message in messages[:reused])
+        self._last_conversation = prefix_digests(messages + [{"role": "assistant", "content": response}])
+        self.prompt_stats = {"prompt_eval_count": evaluated, "reused_messages": reused,
+                             "reused_tokens": reused_tokens}
+        span.set(prompt_eval_count=evaluated, prompt_messages_reused=reused, prompt_tokens_reused=reused_tokens)
+        tracer.prompt_reuse(evaluated, reused_tokens, self.model)
+
+    def add_sink(self, sink):
+        """
+        Registers a sink that receives response chunks as they stream.
+
+        Args:
+            sink (StreamSink): The sink to register, e.g. a TerminalSink or CallbackSink.
+        """
+        self.pipeline.add_sink(sink)
+
     def add_user_message(self, message):
         """
         Adds a user message to chat history.
@@ -83,8 +473,9 @@ class Chat(Mongo):
             message (str): The user's input message.
         """
         try:
-            self.history.append({"role": "user", "content": message})
-            self.user_input = {"role": "user", "content": message, "model": self.model}
+            self.context.append({"role": "user", "content": message})
+            self.user_input = {"role": "user", "content": message, "model": self.model,
+                               "session": self.session, "timestamp": utc_now()}
 
             # self.mongo_client.save_into_db({"role": "user", "content": message, "model": self.model})
 
@@ -99,10 +490,12 @@ class Chat(Mongo):
             response (str): The AI model's generated response.
         """
         try:
-            self.history.append({"role": "assistant", "content": response})
-            self.model_response = {"role": "assistant", "content": response, "model": self.model}
+            self.context.append({"role": "assistant", "content": response})
+            self.model_response = {"role": "assistant", "content": response, "model": self.model,
+                                   "session": self.session, "timestamp": utc_now()}
 
-            self.mongo_client.save_into_db(user_input=self.user_input, model_res=self.model_response)
+            with tracer.span("db_write"):
+                self.mongo_client.save_into_db(user_input=self.user_input, model_res=self.model_response)
 
         except Exception as e:
             print(f"Error adding bot response: {e}")
@@ -120,4 +513,43 @@ class Chat(Mongo):
             return self.history
         except Exception as e:
             print(f"Error retrieving chat history: {e}")
-            return []
\ No newline at end of file
+            return []
+
+    def get_context(self, recalled=None):
+        """
+        Returns the messages to send to the model on this turn.
+
+        Args:
+            recalled (list, optional): Relevant older messages to merge into the context.
+
+        Returns:
+            list: The pinned system prompt followed by the most recent
+                  messages that fit in the context window's token budget.
+        """
+        return self.context.select(recalled)
+
+    def get_older_history(self, limit=DEFAULT_HISTORY_LIMIT):
+        """
+        Fetches the page of messages preceding those already loaded.
+
+        Older messages are not added to the context window; they are returned
+        for display and the paging position moves back with each call.
+
+        Args:
+            limit (int): The maximum number of messages to fetch.
+
+        Returns:
+            list: Older messages in chronological order, or an empty list when
+                  the start of the session has been reached.
+        """
+        try:
+            if self.oldest_timestamp is None:
+                return []
+            pages = self.mongo_client.iter_older_history(self.model, self.oldest_timestamp,
+                                                         session=self.session, page_size=limit)
+            page = next(pages, [])
+            self.oldest_timestamp = page[0].get("timestamp") if page else None
+            return page
+        except Exception as e:
+            print(f"Error retrieving older chat history: {e}")
+            return []
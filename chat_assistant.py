@@ -1,89 +1,121 @@
+import argparse
 import subprocess
 import sys
 import time
 import os
-import tempfile
-import sounddevice as sd
-import speech_recognition as sr
-import soundfile as sf
+from concurrent.futures import ThreadPoolExecutor
 import keyboard
-from gtts import gTTS
 from ollama_model import OllamaModel  # Import the updated OllamaModel class
 from chat import Chat
+from host_pool import OllamaHostPool
+from keep_alive import ModelKeepAlive
+from model_registry import ModelRegistry
+from microphone import MicrophoneStream
+from stt import GoogleRecognizer, VoskRecognizer
+from tts import SpeechPipeline
+from tracing import tracer
 
 class SpeechHandler:
     """
     Handles text-to-speech and speech-to-text conversion.
     """
 
-    def speak(self, text):
+    def __init__(self, backend=None, recognizer=None, interrupt_key="space"):
         """
-        Converts text to speech and plays it with spacebar interrupt support.
+        Initializes the SpeechHandler class.
 
         Args:
-            text (str): The text to be converted to speech.
+            backend (TTSBackend, optional): The speech synthesizer. Defaults to gTTS.
+            recognizer (SpeechRecognizer, optional): The speech recognizer. Defaults to Google.
+            interrupt_key (str): The hotkey that stops playback. Defaults to "space".
+
+        Attributes:
+            pipeline (SpeechPipeline): Speaks text sentence by sentence. Register it as a
+                                       sink on a Chat to speak responses while they stream.
+            microphone (MicrophoneStream): The long-lived capture stream, opened on first listen.
         """
-        try:
-            # Generate temporary MP3 file
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".mp3") as temp_audio:
-                tts = gTTS(text=text, lang="en")
-                temp_audio_path = temp_audio.name
-                tts.save(temp_audio_path)
+        self.pipeline = SpeechPipeline(backend)
+        self.microphone = MicrophoneStream()
+        self.recognizer = recognizer or GoogleRecognizer(self.microphone.samplerate)
+        self.interrupt_key = interrupt_key
+        self._hotkey = None
 
-            # Read audio data
-            data, samplerate = sf.read(temp_audio_path)
-
-            # Start playback in a separate thread
-            self.is_playing = True
+    def enable_interrupt(self):
+        """
+        Registers the hotkey that stops playback, so speech can be cut off at any time.
+        """
+        if self._hotkey is None:
+            self._hotkey = keyboard.add_hotkey(self.interrupt_key, self.interrupt)
 
-            def play_audio():
-                sd.play(data, samplerate)
-                sd.wait()  # Wait until playback finishes
-                self.is_playing = False
+    def interrupt(self):
+        """
+        Stops playback and discards queued speech.
+        """
+        if self.pipeline.is_speaking():
+            print("\nPlayback interrupted by user.")
+            self.pipeline.stop()
 
-            import threading  # Use threading for non-blocking playback
-            playback_thread = threading.Thread(target=play_audio)
-            playback_thread.start()
+    def speak(self, text):
+        """
+        Converts text to speech and plays it with spacebar interrupt support.
 
-            # Listen for spacebar interrupt
-            while self.is_playing:
-                if keyboard.is_pressed("space"):
-                    print("\nPlayback interrupted by user.")
-                    sd.stop()  # Stop playback immediately
-                    self.is_playing = False
-                    break
+        Args:
+            text (str): The text to be converted to speech.
+        """
+        self.pipeline.say(text)
+        self.wait()
 
-        except Exception as e:
-            print(f"Speech generation error: {e}")
+    def wait(self):
+        """
+        Blocks until queued speech has finished playing or been interrupted.
+        """
+        self.pipeline.wait()
 
-    def listen(self):
+    def listen(self, on_partial=None):
         """
         Converts speech to text.
 
+        Audio is passed to the recognizer frame by frame while the user speaks,
+        so streaming backends have the transcript ready as soon as they stop.
+
+        Args:
+            on_partial (callable, optional): Called with each partial transcript.
+
         Returns:
             str or None: The recognized text if successful, otherwise None.
         """
-        recognizer = sr.Recognizer()
-        mic = sr.Microphone()
-
-        with mic as source:
-            print("\nListening... (Speak now)")
-            recognizer.adjust_for_ambient_noise(source, duration=1)
-
-            try:
-                audio = recognizer.listen(source, timeout=10, phrase_time_limit=5)
-                text = recognizer.recognize_google(audio).lower().strip()
-                print(f"You said: {text}")
-                return text
-            except sr.WaitTimeoutError:
-                print("Timeout! No speech detected.")
-                return None
-            except sr.UnknownValueError:
-                print("Sorry, I couldn't understand.")
-                return None
-            except sr.RequestError as e:
-                print(f"Speech recognition service error: {e}")
-                return None
+        print("\nListening... (Speak now)")
+        heard = []
+
+        def frames():
+            for frame in self.microphone.utterance(timeout=10):
+                heard.append(True)
+                yield frame
+            speech_ended.append(time.perf_counter())
+
+        def show_partial(text):
+            print(f"\r\033[K... {text}", end="", flush=True)
+            if on_partial:
+                on_partial(text)
+
+        speech_ended = []
+        with tracer.span("listen") as span:
+            text = self.recognizer.transcribe(frames(), show_partial)
+            if speech_ended:
+                # Time from the end of speech to the final transcript
+                tracer.record("recognize", time.perf_counter() - speech_ended[0])
+            span.set(heard=bool(heard), recognized=bool(text))
+        print("\r\033[K", end="")
+        if not heard:
+            print("Timeout! No speech detected.")
+            return None
+        if not text:
+            print("Sorry, I couldn't understand.")
+            return None
+
+        text = text.lower().strip()
+        print(f"You said: {text}")
+        return text
 
 
 class Chatbot:
@@ -117,7 +149,8 @@ class ChatAssistant:
     Handles user queries and AI chatbot interactions.
     """
 
-    def __init__(self, mongo_client_url="mongodb://localhost:27017/", database="AI_MODEL", collection="chat_history"):
+    def __init__(self, mongo_client_url="mongodb://localhost:27017/", database="AI_MODEL", collection="chat_history",
+                 num_ctx=4096, keep_alive=600, idle_timeout=900, vosk_model=None, ollama_hosts=None):
         """
         Initialize ChatAssistant with model selection, input mode, and components.
 
@@ -125,9 +158,21 @@ class ChatAssistant:
             mongo_client_url (str): The MongoDB connection URL. Defaults to localhost.
             database (str): The name of the MongoDB database. Defaults to "AI_MODEL".
             collection (str): The name of the MongoDB collection. Defaults to "chat_history".
+            num_ctx (int): The largest context window requested from Ollama. The model's own
+                           context length is used when smaller. Defaults to 4096.
+            keep_alive (int): Seconds Ollama keeps the model loaded after each request. Defaults to 600.
+            idle_timeout (int): Seconds without a question before the model is released. Defaults to 900.
+            vosk_model (str, optional): A Vosk model directory. If given, speech is recognized
+                                        offline with Vosk instead of Google.
+            ollama_hosts (list, optional): Several Ollama server URLs. If given, questions are
+                                           routed across them by an OllamaHostPool.
         """
-        # Initialize model selection
-        self.ollama_model = OllamaModel()
+        # Spread requests over several servers if more than one was given
+        self.client = OllamaHostPool(ollama_hosts) if ollama_hosts else None
+
+        # Initialize model selection, listing the models of the pool's hosts when there is one
+        registry = ModelRegistry(host=self.client.host_for()) if self.client else None
+        self.ollama_model = OllamaModel(registry=registry)
         self.model = self.ollama_model.model_selection()
 
         if not self.model:  # If no model is selected
@@ -137,16 +182,34 @@ class ChatAssistant:
                 print("No model selected. Exiting...")
                 sys.exit(1)
 
+        # Look up the context length and load the model in the background while the user chooses an
+        # input mode; the load uses the options the chat will send, so Ollama does not reload for the
+        # first question
+        lookup = ThreadPoolExecutor(max_workers=1, thread_name_prefix="context-length")
+        context_length = lookup.submit(
+            lambda: min(self.ollama_model.registry.context_length(self.model, default=num_ctx), num_ctx))
+        lookup.shutdown(wait=False)
+        self.keep_alive = ModelKeepAlive(self.model, keep_alive, idle_timeout, client=self.client)
+        self.keep_alive.warm_up(options=lambda: {"num_ctx": context_length.result()})
+
         # Initialize input mode
         while True:
             self.input_mode = input("Choose input mode: '1' for typing, '2' for speaking: ").strip()
             if self.input_mode in ["1", "2"]:
                 break
             print("Invalid choice. Please enter '1' or '2'.")
+        context_length = context_length.result()
 
         # Initialize speech handler and chat components
-        self.speech_handler = SpeechHandler()
-        self.chat = Chat(self.model, mongo_client_url, database, collection)
+        recognizer = VoskRecognizer(vosk_model) if vosk_model else None
+        self.speech_handler = SpeechHandler(recognizer=recognizer)
+        self.chat = Chat(self.model, mongo_client_url, database, collection,
+                         context_length=context_length, options={"num_ctx": context_length},
+                         keep_alive=keep_alive, client=self.client)
+        if self.input_mode == "2":
+            # Speak each sentence as soon as it has been generated
+            self.chat.add_sink(self.speech_handler.pipeline)
+            self.speech_handler.enable_interrupt()
         self.chatbot = Chatbot(self.chat)
 
     def welcome_user(self):
@@ -168,12 +231,24 @@ class ChatAssistant:
             print("No model selected. Exiting...")
             return
 
+        self.keep_alive.start()
+        try:
+            self._loop()
+        finally:
+            self.keep_alive.stop(release=True)
+            self.speech_handler.microphone.close()
+
+    def _loop(self):
+        """
+        Reads questions and answers them until the user exits.
+        """
         while True:
-            # Prompt user for input based on input mode
+            # Prompt user for input based on input mode; partial transcripts
+            # mark the session active so the model stays loaded while the user speaks
             user_input = (
                 input("\nAsk me anything (or type 'exit' to quit): ")
                 if self.input_mode == "1"
-                else self.speech_handler.listen()
+                else self.speech_handler.listen(on_partial=lambda _: self.keep_alive.touch())
             )
 
             # Skip empty inputs
@@ -186,13 +261,28 @@ class ChatAssistant:
                 break
 
             # Process user input and generate response
-            response = self.chatbot.ask(user_input)
+            with tracer.span("turn", model=self.model, mode="voice" if self.input_mode == "2" else "text"):
+                self.keep_alive.touch()
+                self.chatbot.ask(user_input)
 
-            # Speak the response if input mode is speech
-            if self.input_mode == "2":
-                self.speech_handler.speak(response)
+                # Let the spoken response finish before listening again
+                if self.input_mode == "2":
+                    with tracer.span("speak"):
+                        self.speech_handler.wait()
 
 
 if __name__ == "__main__":
-    assistant = ChatAssistant()
+    # Demo Usage:
+    # python chat_assistant.py --trace --trace-log turns.jsonl --metrics-port 9464
+    parser = argparse.ArgumentParser(description="OllamaGenie chat assistant")
+    parser.add_argument("--trace", action="store_true", help="Record per-stage latency spans")
+    parser.add_argument("--trace-log", type=str, default=None, help="Append JSON span logs to this file ('-' for stderr)")
+    parser.add_argument("--metrics-port", type=int, default=None, help="Serve Prometheus metrics on this port")
+    parser.add_argument("--vosk-model", type=str, default=None, help="Recognize speech offline with this Vosk model")
+    parser.add_argument("--ollama-hosts", type=str, nargs="+", default=None, help="Route requests across these Ollama servers")
+    args = parser.parse_args()
+
+    if args.trace:
+        tracer.enable(log_path=args.trace_log, metrics_port=args.metrics_port)
+    assistant = ChatAssistant(vosk_model=args.vosk_model, ollama_hosts=args.ollama_hosts)
     assistant.run()
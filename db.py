@@ -1,14 +1,233 @@
-from pymongo import MongoClient
+import atexit
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+from itertools import islice
+import bson
+from bson import ObjectId, json_util
+from pymongo import MongoClient, ASCENDING, DESCENDING, ReturnDocument
+from pymongo.errors import PyMongoError
+
+DEFAULT_SESSION = "default"
+DEFAULT_HISTORY_LIMIT = 200
+DEFAULT_BUCKET_MESSAGES = 100
+DEFAULT_BUCKET_BYTES = 256 * 1024
+
+# Queue markers asking the writer thread to write immediately, or to write and exit.
+_FLUSH = object()
+_STOP = object()
+BUCKET_INDEX = [("model", ASCENDING), ("session", ASCENDING), ("first", DESCENDING)]
+
+
+def journal_path_for(database, collection):
+    """
+    Returns the default write-behind journal file for a collection.
+
+    Args:
+        database (str): The database name.
+        collection (str): The collection name.
+
+    Returns:
+        str: A file name in the working directory, unique to the collection.
+    """
+    return f"{database}.{collection}.journal"
+
+
+def utc_now():
+    """
+    Returns the current time as a timezone-aware UTC datetime.
+
+    Returns:
+        datetime: The current UTC time.
+    """
+    return datetime.now(timezone.utc)
+
+
+class WriteBehindQueue:
+    """
+    Persists chat messages in the background, batching them into bulk inserts.
+
+    Messages are queued by `put` and written by a worker thread in one call
+    to `write` once `batch_size` messages are pending or `flush_interval`
+    seconds have passed. When the database is unavailable the batch is
+    appended to a local journal file, which is replayed ahead of new
+    messages on the next successful write. Pending messages are flushed
+    when the interpreter exits.
+
+    Before replaying, the writer renames the journal to a name of its own, so
+    two queues sharing a journal never replay or delete the same messages.
+    Journal lines that cannot be parsed are reported and skipped, and an
+    unexpected error loses at most its batch: the writer thread keeps running.
+    """
+
+    def __init__(self, write, journal_path, batch_size=64, flush_interval=1.0):
+        """
+        Initializes the WriteBehindQueue class and starts the writer thread.
+
+        Args:
+            write (callable): Stores a list of documents. Called as `write(documents, skip_existing=True)`
+                              when replaying the journal, whose documents may already be stored.
+            journal_path (str): The append-only file used while the database is unavailable,
+                                e.g. from `journal_path_for`.
+            batch_size (int): The number of pending messages that triggers a write. Defaults to 64.
+            flush_interval (float): The maximum seconds a message waits before being written. Defaults to 1.0.
+        """
+        self.write = write
+        self.journal_path = journal_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._pending = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="mongo-write-behind", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def put(self, *documents):
+        """
+        Queues documents for insertion.
+
+        Args:
+            *documents (dict): The documents to insert, in order.
+        """
+        for document in documents:
+            self._pending.put(document)
+
+    def flush(self):
+        """
+        Writes every pending document now, blocking until done.
+        """
+        if self._thread.is_alive():
+            self._pending.put(_FLUSH)
+            self._pending.join()
+
+    def close(self):
+        """
+        Flushes pending documents and stops the writer thread.
+        """
+        if self._thread.is_alive():
+            self._pending.put(_STOP)
+            self._thread.join()
+        atexit.unregister(self.close)
+
+    def _run(self):
+        """Writer loop: gather a batch by size, time or flush request, then write it."""
+        stopping = False
+        while not stopping:
+            batch, markers = [], 0
+            deadline = None
+            while len(batch) < self.batch_size:
+                timeout = None if deadline is None else deadline - time.monotonic()
+                if timeout is not None and timeout <= 0:
+                    break
+                try:
+                    item = self._pending.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is _FLUSH or item is _STOP:
+                    markers += 1
+                    stopping = item is _STOP
+                    break
+                batch.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+
+            try:
+                self._write(batch)
+            except Exception as e:
+                print(f"Error writing {len(batch)} messages: {e}")
+            finally:
+                for _ in range(len(batch) + markers):
+                    self._pending.task_done()
+
+    def _write(self, batch):
+        """Replay the journal, then insert `batch`; journal it on failure."""
+        try:
+            self._replay_journal()
+            if batch:
+                self._insert(batch)
+        except PyMongoError as e:
+            if batch:
+                print(f"Database unavailable, journaling {len(batch)} messages: {e}")
+                self._append_journal(batch)
+
+    def _insert(self, documents, replay=False):
+        """
+        Store documents.
+
+        Every document carries an '_id' assigned before it was queued, so a
+        batch that was journaled after a partial write is safe to replay.
+        """
+        if replay:
+            self.write(documents, skip_existing=True)
+        else:
+            self.write(documents)
+
+    def _append_journal(self, documents):
+        """Append documents to the journal file, one JSON line each."""
+        with open(self.journal_path, "a", encoding="utf-8") as f:
+            for document in documents:
+                f.write(json_util.dumps(document) + "\n")
+
+    def _replay_journal(self):
+        """Insert journaled documents and remove the journal once they are stored."""
+        if not os.path.exists(self.journal_path):
+            return
+        # Claim the journal first; another queue appending meanwhile starts a new one
+        claimed = f"{self.journal_path}.{os.getpid()}-{threading.get_ident()}.replay"
+        try:
+            os.replace(self.journal_path, claimed)
+        except OSError:
+            # Claimed by another queue, or still open in it; try again on the next write
+            return
+
+        documents = []
+        with open(claimed, "r", encoding="utf-8") as f:
+            for number, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    documents.append(json_util.loads(line))
+                except ValueError as e:
+                    print(f"Skipping unreadable line {number} of {self.journal_path}: {e}")
+        try:
+            if documents:
+                self._insert(documents, replay=True)
+                print(f"Replayed {len(documents)} journaled messages.")
+        except PyMongoError:
+            # Put them back for the next attempt
+            self._append_journal(documents)
+            os.remove(claimed)
+            raise
+        except Exception as e:
+            # Not a database outage, so retrying would fail the same way; set the journal aside
+            failed = f"{self.journal_path}.failed"
+            os.replace(claimed, failed)
+            print(f"Could not replay journaled messages, kept them in {failed}: {e}")
+        else:
+            os.remove(claimed)
+
 
 class Mongo:
     """
     A class to handle MongoDB operations for chat history storage and retrieval.
 
-    This class provides methods to save user input and model responses into 
-    a MongoDB collection and retrieve chat history based on the AI model.
+    Messages are stored in bucket documents, one series per (model, session),
+    each holding up to `bucket_messages` messages or `bucket_bytes` bytes:
+
+        {"model": ..., "session": ..., "first": datetime, "last": datetime,
+         "count": int, "bytes": int, "full": bool,
+         "messages": [{"_id": ..., "role": ..., "content": ..., "timestamp": ...}, ...]}
+
+    An exchange is appended to the session's open bucket with one `$push`
+    update, and a history read fetches a few buckets instead of one document
+    per message. Collections in the older one-document-per-message layout are
+    converted by migrate_history.py.
     """
 
-    def __init__(self, client_url="mongodb://localhost:27017/", database="AI_MODEL", collection="chat_history"):
+    def __init__(self, client_url="mongodb://localhost:27017/", database="AI_MODEL", collection="chat_history",
+                 write_behind=False, journal_path=None, client=None,
+                 bucket_messages=DEFAULT_BUCKET_MESSAGES, bucket_bytes=DEFAULT_BUCKET_BYTES):
         """
         Initializes the Mongo class and sets up the MongoDB connection.
 
@@ -16,15 +235,43 @@ class Mongo:
             client_url (str): The MongoDB connection URL. Defaults to "mongodb://localhost:27017/".
             database (str): The name of the database to connect to. Defaults to "AI_MODEL".
             collection (str): The name of the collection to use. Defaults to "chat_history".
+            write_behind (bool): If True, saves are queued and written in the background. Defaults to False.
+            journal_path (str, optional): The local journal used by the write-behind queue while the
+                                          database is down. Defaults to "<database>.<collection>.journal".
+            client (MongoClient, optional): An existing client to share; `client_url` is ignored when given.
+            bucket_messages (int): The maximum messages per bucket. Defaults to 100.
+            bucket_bytes (int): The maximum encoded size of a bucket's messages. Defaults to 256 KiB.
 
         Attributes:
             client (MongoClient): The MongoDB client instance.
             database (Database): The connected MongoDB database instance.
             collection (Collection): The MongoDB collection instance for chat history.
+            writer (WriteBehindQueue or None): The background writer, when write-behind is enabled.
+            save_listeners (list): Callables notified with each saved exchange.
         """
-        self.client = MongoClient(client_url)
+        self.client = client if client is not None else MongoClient(client_url)
         self.database = self.client[database]
         self.collection = self.database[collection]
+        self.bucket_messages = bucket_messages
+        self.bucket_bytes = bucket_bytes
+        journal_path = journal_path or journal_path_for(database, collection)
+        self.writer = WriteBehindQueue(self.append_messages, journal_path) if write_behind else None
+        self.save_listeners = []
+        self._legacy_checked = False
+        self.ensure_indexes()
+
+    def ensure_indexes(self):
+        """
+        Creates the compound (model, session, first) index used to find a session's buckets.
+
+        Index creation is idempotent, so this is safe to call on every startup.
+        A failure is reported but not raised, so messages can still be journaled
+        while the database is unavailable.
+        """
+        try:
+            self.collection.create_index(BUCKET_INDEX, name="model_session_first")
+        except PyMongoError as e:
+            print(f"Error creating history index: {e}")
 
     def save_into_db(self, user_input, model_res):
         """
@@ -32,23 +279,178 @@ class Mongo:
 
         Args:
             user_input (dict): A dictionary containing the user's input message.
-                               Example: {"role": "user", "content": "...", "model": "..."}
+                               Example: {"role": "user", "content": "...", "model": "...",
+                                         "session": "...", "timestamp": datetime}
             model_res (dict): A dictionary containing the model's response message.
-                              Example: {"role": "assistant", "content": "...", "model": "..."}
+                              Example: {"role": "assistant", "content": "...", "model": "...",
+                                        "session": "...", "timestamp": datetime}
+        """
+        # Ids are assigned up front so a journaled exchange is recognized if it is replayed
+        user_input.setdefault("_id", ObjectId())
+        model_res.setdefault("_id", ObjectId())
+        if self.writer:
+            self.writer.put(user_input, model_res)
+        else:
+            self.append_messages([user_input, model_res])
+
+        for listener in self.save_listeners:
+            try:
+                listener([user_input, model_res])
+            except Exception as e:
+                print(f"Error notifying save listener: {e}")
+
+    def append_messages(self, documents, skip_existing=False):
+        """
+        Appends message documents to their sessions' buckets, in order.
+
+        Args:
+            documents (list): Message documents with 'model', 'session', 'role',
+                              'content' and 'timestamp' keys.
+            skip_existing (bool): If True, leave out messages whose '_id' is already
+                                  stored, so a repeated write is harmless. Defaults to False.
+        """
+        groups = {}
+        for document in documents:
+            document.setdefault("_id", ObjectId())
+            key = (document.get("model"), document.get("session") or DEFAULT_SESSION)
+            groups.setdefault(key, []).append(document)
+
+        for (model, session), messages in groups.items():
+            if skip_existing:
+                stored = self._stored_ids(model, session, [m["_id"] for m in messages])
+                messages = [m for m in messages if m["_id"] not in stored]
+            for start in range(0, len(messages), self.bucket_messages):
+                self._push(model, session, messages[start:start + self.bucket_messages])
+
+    def add_save_listener(self, listener):
+        """
+        Registers a callable notified with every exchange passed to `save_into_db`.
+
+        Args:
+            listener (callable): Called with a list of the saved message documents.
+        """
+        self.save_listeners.append(listener)
+
+    def flush(self):
+        """
+        Writes any messages still queued by the write-behind queue.
         """
-        self.collection.insert_one(user_input)
-        self.collection.insert_one(model_res)
+        if self.writer:
+            self.writer.flush()
 
-    def get_history(self, model):
+    def history_cursor(self, model, session=DEFAULT_SESSION, before=None, limit=DEFAULT_HISTORY_LIMIT):
         """
-        Retrieves chat history for a specific AI model from the MongoDB collection.
+        Returns an iterator over a session's messages, newest first.
+
+        Buckets are read newest first through the (model, session, first)
+        index, with a batch size that fetches `limit` messages in one round trip.
+
+        Args:
+            model (str): The name of the AI model whose chat history is to be retrieved.
+            session (str): The session key. Defaults to "default".
+            before (datetime, optional): Only return messages older than this timestamp.
+            limit (int): The maximum number of messages to return.
+
+        Returns:
+            iterator: Dictionaries with 'role', 'content' and 'timestamp' keys.
+        """
+        query = {"model": model, "session": session}
+        if before is not None:
+            query["first"] = {"$lt": before}
+
+        projection = {"_id": 0, "messages.role": 1, "messages.content": 1, "messages.timestamp": 1}
+        buckets = self.collection.find(query, projection).sort("first", DESCENDING)
+        buckets = buckets.batch_size(limit // self.bucket_messages + 2)
+
+        def messages():
+            for bucket in buckets:
+                for message in reversed(bucket.get("messages", [])):
+                    if before is None or message["timestamp"] < before:
+                        yield message
+
+        return islice(messages(), limit)
+
+    def get_history(self, model, session=DEFAULT_SESSION, limit=DEFAULT_HISTORY_LIMIT):
+        """
+        Retrieves the most recent chat history for a specific AI model and session.
 
         Args:
             model (str): The name of the AI model whose chat history is to be retrieved.
+            session (str): The session key. Defaults to "default".
+            limit (int): The maximum number of messages to return. Defaults to 200.
 
         Returns:
-            list: A list of dictionaries representing the chat history,
+            list: A list of dictionaries representing the chat history in chronological order,
                   excluding '_id' and 'model' fields from the results.
-                  Example: [{"role": "user", "content": "..."}, {"role": "assistant", "content": "..."}]
+                  Example: [{"role": "user", "content": "...", "timestamp": datetime}, ...]
+        """
+        messages = list(self.history_cursor(model, session, limit=limit))
+        if not messages:
+            self._check_legacy(model)
+        messages.reverse()
+        return messages
+
+    def iter_older_history(self, model, before, session=DEFAULT_SESSION, page_size=DEFAULT_HISTORY_LIMIT):
         """
-        return list(self.collection.find({"model": model}, {"_id": 0 , "model": 0}))
\ No newline at end of file
+        Pages backwards through a session's history on demand.
+
+        Args:
+            model (str): The name of the AI model whose chat history is to be retrieved.
+            before (datetime): Start paging from messages older than this timestamp.
+            session (str): The session key. Defaults to "default".
+            page_size (int): The number of messages fetched per page.
+
+        Yields:
+            list: Pages of messages in chronological order, each older than the previous one.
+        """
+        while before is not None:
+            page = list(self.history_cursor(model, session, before=before, limit=page_size))
+            if not page:
+                return
+            page.reverse()
+            yield page
+            before = page[0].get("timestamp")
+
+    def _push(self, model, session, documents):
+        """Append messages to the session's open bucket, starting a new one if they do not fit."""
+        entries = [{"_id": d["_id"], "role": d.get("role"), "content": d.get("content"),
+                    "timestamp": d.get("timestamp")} for d in documents]
+        size = sum(len(bson.encode(entry)) for entry in entries)
+        bucket = self.collection.find_one_and_update(
+            {"model": model, "session": session, "full": {"$ne": True},
+             "count": {"$lte": self.bucket_messages - len(entries)},
+             "bytes": {"$lte": self.bucket_bytes - size}},
+            {"$push": {"messages": {"$each": entries}},
+             "$inc": {"count": len(entries), "bytes": size},
+             "$min": {"first": entries[0]["timestamp"]},
+             "$max": {"last": entries[-1]["timestamp"]}},
+            projection={"count": 1},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        if bucket["count"] == len(entries):
+            # A new bucket was started: close the previous one so later, smaller writes cannot land in it
+            self.collection.update_many(
+                {"model": model, "session": session, "full": {"$ne": True}, "_id": {"$ne": bucket["_id"]}},
+                {"$set": {"full": True}},
+            )
+
+    def _stored_ids(self, model, session, ids):
+        """Return which of `ids` are already stored in the session's buckets."""
+        stored = set()
+        for bucket in self.collection.find({"model": model, "session": session, "messages._id": {"$in": ids}},
+                                           {"_id": 0, "messages._id": 1}):
+            stored.update(message["_id"] for message in bucket.get("messages", []))
+        return stored
+
+    def _check_legacy(self, model):
+        """Point to the migration tool if the collection still has one document per message."""
+        if self._legacy_checked:
+            return
+        self._legacy_checked = True
+        try:
+            if self.collection.find_one({"model": model, "role": {"$exists": True}}, {"_id": 1}):
+                print(f"'{self.collection.name}' holds messages in the old one-document-per-message layout. "
+                      f"Run 'python migrate_history.py' to convert them.")
+        except PyMongoError:
+            pass
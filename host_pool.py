@@ -0,0 +1,366 @@
+import hashlib
+import threading
+import httpx
+import ollama
+import requests
+from pull_manager import resolve_host
+
+# Errors that mean a host could not serve the request, so another host should be tried
+_HOST_ERRORS = (httpx.TransportError, ConnectionError)
+
+
+def prefix_digests(messages):
+    """
+    Returns a running digest of a message list, one per message.
+
+    The digest at position i covers messages[:i + 1], so two lists share
+    their first n messages exactly when their first n digests are equal.
+
+    Args:
+        messages (list): Messages with 'role' and 'content' keys.
+
+    Returns:
+        list: The digests, as bytes.
+    """
+    running = hashlib.sha1()
+    digests = []
+    for message in messages:
+        # Surrounding whitespace is ignored because Chat stores responses stripped
+        running.update(f"{message.get('role')}\0{(message.get('content') or '').strip()}\0".encode())
+        digests.append(running.digest())
+    return digests
+
+
+def shared_prefix_length(a, b):
+    """
+    Returns how many leading messages two `prefix_digests` lists share.
+
+    Args:
+        a (list): The digests of one message list.
+        b (list): The digests of another.
+
+    Returns:
+        int: The number of leading messages the lists have in common.
+    """
+    low, high = 0, min(len(a), len(b))
+    while low < high:
+        middle = (low + high + 1) // 2
+        if a[middle - 1] == b[middle - 1]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+def _affinity(warm_length):
+    """Return the warm length that counts for routing; a shared system prompt alone does not."""
+    return warm_length if warm_length > 1 else 0
+
+
+class OllamaEndpoint:
+    """
+    One Ollama server in a pool, with its health and load.
+
+    Attributes:
+        host (str): The base URL of the server.
+        client (ollama.Client): The client bound to this server.
+        healthy (bool): Whether the last health check or request succeeded.
+        in_flight (int): Requests currently being served.
+        resident (set): Models the server reported as loaded in memory.
+        prefixes (dict): Per model, the `prefix_digests` of the conversations the
+                         server most likely still holds in its prompt cache.
+    """
+
+    def __init__(self, host, timeout=None, slots=4):
+        self.host = resolve_host(host)
+        self.client = ollama.Client(host=self.host, timeout=timeout)
+        self.healthy = True
+        self.in_flight = 0
+        self.resident = set()
+        self.slots = slots
+        self.prefixes = {}
+
+    def warm_length(self, model, digests):
+        """
+        Returns how many leading messages of a prompt are likely cached on this server.
+
+        Args:
+            model (str): The model the prompt is for.
+            digests (list): The prompt's `prefix_digests`.
+
+        Returns:
+            int: The number of leading messages the server has already evaluated.
+        """
+        return max((shared_prefix_length(digests, cached) for cached in self.prefixes.get(model, ())), default=0)
+
+    def remember(self, model, digests):
+        """
+        Records a conversation the server has just evaluated.
+
+        An entry continued by the conversation is replaced; otherwise the
+        least recently used entry is evicted once `slots` are taken, as
+        Ollama does rather than truncate a cache slot holding a longer prefix.
+
+        Args:
+            model (str): The model that served the conversation.
+            digests (list): The `prefix_digests` of the prompt followed by its response.
+        """
+        cached = self.prefixes.setdefault(model, [])
+        continued = [i for i, entry in enumerate(cached) if shared_prefix_length(digests, entry) == len(entry)]
+        if continued:
+            del cached[continued[0]]
+        elif len(cached) >= self.slots:
+            del cached[0]
+        cached.append(digests)
+
+    def __repr__(self):
+        return f"OllamaEndpoint({self.host!r}, healthy={self.healthy}, in_flight={self.in_flight})"
+
+
+class OllamaHostPool:
+    """
+    Routes Ollama requests across several servers.
+
+    A background thread polls each server's `/api/ps` to learn whether it is
+    up and which models it has loaded. Each request goes to the healthy
+    server with the fewest requests in flight, preferring servers that
+    already have the model resident, so weights are not loaded twice. A
+    chat goes first to the server that last evaluated the longest leading
+    part of its messages, so that prefix is reused from the KV cache
+    rather than evaluated again. If a server fails, it is marked unhealthy
+    and the request is retried on the next one; a stream that fails partway
+    is continued on the next server from the text generated so far, and
+    text that server repeats from the start of the answer is not yielded
+    again.
+
+    `chat` and `generate` take the same arguments as `ollama.Client`, so a
+    pool can be passed wherever a client is expected.
+    """
+
+    def __init__(self, hosts, health_interval=10.0, timeout=None, session=None, slots=4):
+        """
+        Initializes the OllamaHostPool class, checks every host and starts health checks.
+
+        Args:
+            hosts (list): The Ollama server URLs.
+            health_interval (float): Seconds between health checks. Defaults to 10.
+            timeout (float, optional): The request timeout passed to each client.
+            session (requests.Session, optional): The HTTP session for health checks.
+            slots (int): Conversations each server keeps cached per model; match Ollama's
+                         OLLAMA_NUM_PARALLEL. Defaults to 4.
+
+        Raises:
+            ValueError: If no hosts are given.
+        """
+        if not hosts:
+            raise ValueError("OllamaHostPool needs at least one host")
+        self.endpoints = [OllamaEndpoint(host, timeout, slots) for host in hosts]
+        self.health_interval = health_interval
+        self.session = session or requests.Session()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self.check_health()
+        threading.Thread(target=self._run, name="ollama-health", daemon=True).start()
+
+    def check_health(self):
+        """
+        Checks every host now, updating its health and resident models.
+        """
+        for endpoint in self.endpoints:
+            try:
+                response = self.session.get(f"{endpoint.host}/api/ps", timeout=2)
+                response.raise_for_status()
+                resident = {model.get("name") or model.get("model") for model in response.json().get("models", [])}
+                with self._lock:
+                    endpoint.healthy = True
+                    endpoint.resident = resident
+                    # An unloaded model's KV cache went with it
+                    for model in list(endpoint.prefixes):
+                        if model not in resident and f"{model}:latest" not in resident:
+                            del endpoint.prefixes[model]
+            except (requests.exceptions.RequestException, ValueError):
+                with self._lock:
+                    endpoint.healthy = False
+                    endpoint.resident = set()
+                    endpoint.prefixes = {}
+
+    def candidates(self, model, digests=None):
+        """
+        Returns the hosts to try for a model, best first.
+
+        Healthy hosts come first, and among them those holding the longest
+        prefix of the prompt, then those with the model resident; ties go to
+        the host with the fewest requests in flight. A prefix of one message
+        does not count, since every conversation starts with the same system
+        prompt. Unhealthy hosts are kept at the end as a last resort.
+
+        Args:
+            model (str): The model to be served.
+            digests (list, optional): The prompt's `prefix_digests`.
+
+        Returns:
+            list: OllamaEndpoint objects in preference order.
+        """
+        names = (model, f"{model}:latest")
+        with self._lock:
+            return sorted(self.endpoints, key=lambda e: (not e.healthy,
+                                                         -_affinity(e.warm_length(model, digests)) if digests else 0,
+                                                         not any(n in e.resident for n in names),
+                                                         e.in_flight))
+
+    def host_for(self, model=None):
+        """
+        Returns the URL of the host a request for a model would go to first.
+
+        Useful for metadata requests, such as listing models, that any one host can answer.
+
+        Args:
+            model (str, optional): The model to be served.
+
+        Returns:
+            str: The host's base URL.
+        """
+        return self.candidates(model)[0].host
+
+    def chat(self, model, messages, stream=False, **kwargs):
+        """
+        Sends a chat request to the best available host.
+
+        Args:
+            model (str): The model name.
+            messages (list): The conversation messages.
+            stream (bool): If True, return an iterator of partial responses. Defaults to False.
+            **kwargs: Other arguments for `ollama.Client.chat`, e.g. options or keep_alive.
+
+        Returns:
+            ChatResponse or iterator: The response, or the streamed partial responses.
+
+        Raises:
+            ConnectionError: If every host failed.
+        """
+        if stream:
+            return self._stream_chat(model, messages, kwargs)
+        return self._call(model, lambda client: client.chat(model=model, messages=messages, **kwargs), messages)
+
+    def generate(self, model, prompt="", **kwargs):
+        """
+        Sends a non-streamed generate request to the best available host.
+
+        Args:
+            model (str): The model name.
+            prompt (str): The prompt. An empty prompt just loads the model.
+            **kwargs: Other arguments for `ollama.Client.generate`, e.g. keep_alive.
+
+        Returns:
+            GenerateResponse: The response.
+
+        Raises:
+            ConnectionError: If every host failed.
+        """
+        return self._call(model, lambda client: client.generate(model=model, prompt=prompt, **kwargs))
+
+    def close(self):
+        """
+        Stops the health checks.
+        """
+        self._stopped.set()
+
+    def _call(self, model, request, messages=None):
+        """Run a one-shot request on the best host, failing over to the others."""
+        errors = []
+        digests = prefix_digests(messages) if messages else None
+        for endpoint in self.candidates(model, digests):
+            self._begin(endpoint)
+            try:
+                response = request(endpoint.client)
+                self._succeeded(endpoint, model)
+                if messages:
+                    self._remember(endpoint, model, messages + [response.get("message", {})])
+                return response
+            except _HOST_ERRORS as e:
+                self._failed(endpoint)
+                errors.append(f"{endpoint.host}: {e}")
+            except ollama.ResponseError as e:
+                # e.g. the model is not installed on this host
+                if e.status_code >= 500:
+                    self._failed(endpoint)
+                errors.append(f"{endpoint.host}: {e}")
+            finally:
+                self._end(endpoint)
+        raise ConnectionError("No Ollama host could serve the request: " + "; ".join(errors))
+
+    def _stream_chat(self, model, messages, kwargs):
+        """Stream a chat from the best host, continuing on the next one if it fails."""
+        errors = []
+        generated = []
+        for endpoint in self.candidates(model, prefix_digests(messages)):
+            request = messages
+            echo = "".join(generated)
+            if generated:
+                # Ask the next host to continue the partial answer rather than start over
+                request = messages + [{"role": "assistant", "content": echo}]
+            self._begin(endpoint)
+            try:
+                for part in endpoint.client.chat(model=model, messages=request, stream=True, **kwargs):
+                    content = part.get("message", {}).get("content", "")
+                    if echo and content:
+                        # A host that does not prefill writes the answer again from the start;
+                        # drop what the caller already has until the new text moves past it
+                        if echo.startswith(content):
+                            echo = echo[len(content):]
+                            content = ""
+                        elif content.startswith(echo):
+                            content, echo = content[len(echo):], ""
+                        else:
+                            echo = ""
+                        part["message"]["content"] = content
+                        if not content and not part.get("done"):
+                            continue
+                    generated.append(content)
+                    yield part
+                self._succeeded(endpoint, model)
+                self._remember(endpoint, model, messages + [{"role": "assistant", "content": "".join(generated)}])
+                return
+            except _HOST_ERRORS as e:
+                self._failed(endpoint)
+                errors.append(f"{endpoint.host}: {e}")
+            except ollama.ResponseError as e:
+                if e.status_code >= 500:
+                    self._failed(endpoint)
+                errors.append(f"{endpoint.host}: {e}")
+            finally:
+                self._end(endpoint)
+        raise ConnectionError("No Ollama host could serve the request: " + "; ".join(errors))
+
+    def _begin(self, endpoint):
+        with self._lock:
+            endpoint.in_flight += 1
+
+    def _end(self, endpoint):
+        with self._lock:
+            endpoint.in_flight -= 1
+
+    def _succeeded(self, endpoint, model):
+        """The host served the model, so it is up and has the model loaded."""
+        with self._lock:
+            endpoint.healthy = True
+            endpoint.resident.add(model)
+
+    def _remember(self, endpoint, model, conversation):
+        """Record that the host now holds a conversation in its prompt cache."""
+        digests = prefix_digests(conversation)
+        with self._lock:
+            endpoint.remember(model, digests)
+
+    def _failed(self, endpoint):
+        """Take the host out of rotation until a health check finds it up again."""
+        with self._lock:
+            endpoint.healthy = False
+            endpoint.resident = set()
+            endpoint.prefixes = {}
+        print(f"Ollama host {endpoint.host} failed; routing to the next host.")
+
+    def _run(self):
+        """Health-check loop."""
+        while not self._stopped.wait(self.health_interval):
+            self.check_health()
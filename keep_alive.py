@@ -0,0 +1,186 @@
+import math
+import re
+import threading
+import time
+import ollama
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d*)?|\.\d+)(ns|us|µs|ms|s|m|h)")
+_DURATION_UNITS = {"ns": 1e-9, "us": 1e-6, "µs": 1e-6, "ms": 1e-3, "s": 1, "m": 60, "h": 3600}
+
+
+def parse_keep_alive(value):
+    """
+    Converts an Ollama keep_alive value to seconds.
+
+    Ollama takes a number of seconds or a duration string such as "5m",
+    "1h30m" or "-1"; a negative value keeps the model loaded indefinitely.
+
+    Args:
+        value (int, float or str): The keep_alive value.
+
+    Returns:
+        float: The duration in seconds; math.inf for a negative value.
+
+    Raises:
+        ValueError: If the value is not a number or a duration.
+    """
+    if isinstance(value, bool):
+        raise ValueError(f"Invalid keep_alive: {value!r}")
+    if isinstance(value, (int, float)):
+        seconds = float(value)
+    elif isinstance(value, str):
+        text = value.strip()
+        sign = -1 if text.startswith("-") else 1
+        text = text.lstrip("+-")
+        try:
+            seconds = float(text)
+        except ValueError:
+            parts = _DURATION_PART.findall(text)
+            if not parts or "".join(number + unit for number, unit in parts) != text:
+                raise ValueError(f"Invalid keep_alive: {value!r}")
+            seconds = sum(float(number) * _DURATION_UNITS[unit] for number, unit in parts)
+        seconds *= sign
+    else:
+        raise ValueError(f"Invalid keep_alive: {value!r}")
+    if math.isnan(seconds):
+        raise ValueError(f"Invalid keep_alive: {value!r}")
+    return math.inf if seconds < 0 else seconds
+
+
+class ModelKeepAlive:
+    """
+    Preloads a model and keeps it resident on the Ollama server while a session is active.
+
+    `warm_up` loads the model in the background with an empty prompt, so the
+    load overlaps with whatever the user is doing before the first question.
+    `start` runs a scheduler that refreshes the model's keep-alive while the
+    session has been active within `idle_timeout`, and unloads it once the
+    session goes idle. Call `touch` on every turn. A keep-alive of zero or
+    an indefinite one (negative) needs no refresh; the model is still
+    released once the session goes idle.
+
+    Pass the same `options` the chat sends (at least num_ctx): Ollama reloads
+    a model whose runner options differ, so a warm-up with other options is
+    wasted and a refresh would make the model reload back and forth.
+    """
+
+    def __init__(self, model, keep_alive=600, idle_timeout=900, client=None, options=None):
+        """
+        Initializes the ModelKeepAlive class.
+
+        Args:
+            model (str): The model to keep loaded.
+            keep_alive (int, float or str): How long Ollama keeps the model loaded after each request,
+                                            in seconds or as a duration such as "10m"; negative
+                                            keeps it loaded indefinitely. Defaults to 600.
+            idle_timeout (int): Seconds without a turn before the model is released. Defaults to 900.
+            client (ollama.Client, optional): The client to use. Defaults to the module-level client.
+            options (dict, optional): The model options the chat requests with, e.g. {"num_ctx": 4096}.
+
+        Attributes:
+            ready (threading.Event): Set once the warm-up load has finished.
+
+        Raises:
+            ValueError: If `keep_alive` is not a number or a duration.
+        """
+        self.model = model
+        self.keep_alive = keep_alive
+        self.keep_alive_seconds = parse_keep_alive(keep_alive)
+        self.idle_timeout = idle_timeout
+        self.client = client or ollama
+        self.options = options
+        self.ready = threading.Event()
+        self._last_activity = time.monotonic()
+        self._resident = False
+        self._stopped = threading.Event()
+        self._scheduler = None
+
+    def warm_up(self, options=None):
+        """
+        Loads the model in a background thread and returns immediately.
+
+        Args:
+            options (callable, optional): Returns the model options to load with. It is called on the
+                                          background thread, so a lookup it needs, such as the model's
+                                          context length, does not delay the caller.
+        """
+        def load():
+            if options is not None:
+                try:
+                    self.options = options()
+                except Exception as e:
+                    print(f"Could not look up options for {self.model}: {e}")
+            self._load()
+
+        threading.Thread(target=load, name="model-warm-up", daemon=True).start()
+
+    def wait_until_ready(self, timeout=None):
+        """
+        Blocks until the warm-up load finishes.
+
+        Args:
+            timeout (float, optional): The maximum seconds to wait.
+
+        Returns:
+            bool: True if the model finished loading.
+        """
+        return self.ready.wait(timeout)
+
+    def touch(self):
+        """
+        Records session activity, so the scheduler keeps the model resident.
+        """
+        self._last_activity = time.monotonic()
+
+    def start(self):
+        """
+        Starts the scheduler that refreshes or releases the model.
+        """
+        if self._scheduler is None:
+            self._scheduler = threading.Thread(target=self._run, name="model-keep-alive", daemon=True)
+            self._scheduler.start()
+
+    def stop(self, release=True):
+        """
+        Stops the scheduler.
+
+        Args:
+            release (bool): If True, unload the model from the server now if loaded. Defaults to True.
+        """
+        self._stopped.set()
+        if release and self._resident:
+            self.release()
+
+    def release(self):
+        """
+        Asks the server to unload the model.
+        """
+        try:
+            self.client.generate(model=self.model, prompt="", keep_alive=0, options=self.options)
+            self._resident = False
+            self.ready.clear()
+        except Exception as e:
+            print(f"Could not release {self.model}: {e}")
+
+    def _load(self):
+        """Load the model with an empty prompt and the configured keep-alive."""
+        try:
+            self.client.generate(model=self.model, prompt="", keep_alive=self.keep_alive, options=self.options)
+            self._resident = True
+        except Exception as e:
+            print(f"Could not preload {self.model}: {e}")
+        finally:
+            self.ready.set()
+
+    def _run(self):
+        """Scheduler loop: refresh residency while active, release when idle."""
+        refresh = 0 < self.keep_alive_seconds < math.inf
+        # Refresh well before the server's keep-alive would expire; otherwise only watch for idleness
+        interval = max(self.keep_alive_seconds / 2 if refresh else self.idle_timeout / 4, 1)
+        while not self._stopped.wait(interval):
+            idle = time.monotonic() - self._last_activity
+            if idle < self.idle_timeout:
+                if refresh:
+                    self._load()
+            elif self._resident:
+                self.release()
@@ -0,0 +1,144 @@
+import queue
+import threading
+import numpy as np
+from db import DEFAULT_SESSION
+from vector_store import VectorIndex, embed
+
+
+def conversation(model, session):
+    """Return the index group holding one model's messages in one session."""
+    return f"{model}\n{session}"
+
+
+class LongTermMemory:
+    """
+    Retrieves the stored messages most relevant to a new question.
+
+    Messages are embedded incrementally as they are saved (register
+    `add_messages` as a Mongo save listener) on a background thread, in
+    batches, and stored as (by default) float16 vectors in a memory-mapped VectorIndex,
+    grouped by model and session. `recall` embeds the question and returns
+    the top-k past messages of the same model and session above a
+    similarity threshold, scoring only that conversation's vectors.
+    """
+
+    def __init__(self, embedding_model="nomic-embed-text", path=None, capacity=100000, k=4, min_score=0.5,
+                 batch_size=32, client=None, dtype=np.float16):
+        """
+        Initializes the LongTermMemory class and starts the indexing thread.
+
+        Args:
+            embedding_model (str): The Ollama embedding model. Defaults to "nomic-embed-text".
+            path (str, optional): The file prefix used to persist the index.
+            capacity (int): The maximum number of indexed messages. Defaults to 100000.
+            k (int): The number of messages recalled per question. Defaults to 4.
+            min_score (float): The minimum cosine similarity for a recalled message. Defaults to 0.5.
+            batch_size (int): The maximum messages embedded per request. Defaults to 32.
+            client (ollama.Client, optional): The client used for embeddings.
+            dtype (numpy.dtype): The storage type of the vectors. float16 halves the index size;
+                                 float32 avoids widening on every search, which is faster when
+                                 one conversation holds most of the index. Defaults to float16.
+        """
+        self.embedding_model = embedding_model
+        self.k = k
+        self.min_score = min_score
+        self.batch_size = batch_size
+        self.client = client
+        self.index = VectorIndex(capacity, path, dtype=dtype)
+        self._pending = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="memory-indexer", daemon=True)
+        self._thread.start()
+
+    def add_messages(self, messages):
+        """
+        Queues saved messages for embedding.
+
+        Args:
+            messages (list): Message documents with 'role', 'content', 'model' and 'session' keys.
+        """
+        for message in messages:
+            if message.get("content"):
+                self._pending.put(message)
+
+    def backfill(self, collection, model, batch_size=500):
+        """
+        Indexes messages already stored for a model, e.g. on first use.
+
+        Args:
+            collection (Collection): The chat history collection, in the bucketed layout.
+            model (str): The model whose messages are indexed.
+            batch_size (int): The number of documents fetched per round trip.
+        """
+        cursor = collection.aggregate([
+            {"$match": {"model": model}},
+            {"$unwind": "$messages"},
+            {"$project": {"_id": 0, "role": "$messages.role", "content": "$messages.content",
+                          "model": 1, "session": 1}},
+        ], batchSize=batch_size)
+        self.add_messages(cursor)
+
+    def recall(self, model, question, session=DEFAULT_SESSION, exclude=()):
+        """
+        Returns the past messages most relevant to a question.
+
+        Args:
+            model (str): Only messages from conversations with this model are recalled.
+            question (str): The user's question.
+            session (str): Only messages from this session are recalled, so one user's
+                           conversation never reaches another's prompt. Defaults to "default".
+            exclude (iterable): Message contents to skip, e.g. those already in the context.
+
+        Returns:
+            list: Up to `k` messages with 'role' and 'content' keys, most relevant first.
+        """
+        if not len(self.index):
+            return []
+        try:
+            vector = embed([question], self.embedding_model, self.client)[0]
+        except Exception as e:
+            print(f"Error embedding question, skipping memory recall: {e}")
+            return []
+
+        exclude = set(exclude)
+        recalled = []
+        # Ask for enough results that the excluded ones cannot crowd out k others
+        matches = self.index.search(vector, k=self.k + len(exclude), group=conversation(model, session))
+        for _, score, payload in matches:
+            if score < self.min_score or len(recalled) == self.k:
+                break
+            if payload["content"] not in exclude:
+                recalled.append({"role": payload["role"], "content": payload["content"]})
+        return recalled
+
+    def flush(self):
+        """
+        Blocks until every queued message has been indexed.
+        """
+        self._pending.join()
+
+    def save(self):
+        """
+        Persists the index to disk when a path was given.
+        """
+        self.index.save()
+
+    def _run(self):
+        """Indexing loop: embed queued messages in batches."""
+        while True:
+            batch = [self._pending.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._pending.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                vectors = embed([m["content"] for m in batch], self.embedding_model, self.client)
+                for message, vector in zip(batch, vectors):
+                    session = message.get("session") or DEFAULT_SESSION
+                    self.index.add(vector, {"role": message["role"], "content": message["content"],
+                                            "model": message.get("model"), "session": session},
+                                   group=conversation(message.get("model"), session))
+            except Exception as e:
+                print(f"Error indexing {len(batch)} messages: {e}")
+            for _ in batch:
+                self._pending.task_done()
@@ -0,0 +1,274 @@
+import threading
+import time
+from collections import deque
+import numpy as np
+
+
+def frame_energy(frame):
+    """
+    Returns the RMS energy of a frame of 16-bit PCM audio.
+
+    Args:
+        frame (bytes): Little-endian 16-bit mono samples.
+
+    Returns:
+        float: The root-mean-square sample value.
+    """
+    samples = np.frombuffer(frame, dtype=np.int16).astype(np.float32)
+    return float(np.sqrt(np.mean(samples * samples))) if len(samples) else 0.0
+
+
+class EnergyVAD:
+    """
+    Energy-based voice-activity detector with an adaptive noise floor.
+
+    The noise floor is measured once by `calibrate` and then tracked with an
+    exponential moving average of frames classified as silence, so it follows
+    slow changes in background noise without a fresh calibration per turn.
+    """
+
+    def __init__(self, ratio=3.0, min_energy=200.0, adapt_rate=0.05):
+        """
+        Initializes the EnergyVAD class.
+
+        Args:
+            ratio (float): How far above the noise floor a frame must be to count as speech. Defaults to 3.0.
+            min_energy (float): The minimum RMS energy of speech. Defaults to 200.
+            adapt_rate (float): The weight of each silent frame in the noise floor. Defaults to 0.05.
+        """
+        self.ratio = ratio
+        self.min_energy = min_energy
+        self.adapt_rate = adapt_rate
+        self.noise_floor = min_energy / ratio
+
+    def calibrate(self, frames):
+        """
+        Sets the noise floor from frames of background noise.
+
+        Args:
+            frames (list): Frames recorded while nobody is speaking.
+        """
+        if frames:
+            self.noise_floor = float(np.median([frame_energy(frame) for frame in frames]))
+
+    def is_speech(self, frame):
+        """
+        Classifies a frame, adapting the noise floor when it is silence.
+
+        Args:
+            frame (bytes): 16-bit PCM samples.
+
+        Returns:
+            bool: True if the frame contains speech.
+        """
+        energy = frame_energy(frame)
+        if energy > max(self.noise_floor * self.ratio, self.min_energy):
+            return True
+        self.noise_floor += self.adapt_rate * (energy - self.noise_floor)
+        return False
+
+
+class Endpointer:
+    """
+    Cuts one utterance out of a stream of audio frames.
+
+    An utterance starts after `start_ms` of consecutive speech and ends after
+    `silence_ms` of trailing silence or at `max_phrase_seconds`. Frames from
+    just before the start are kept in a ring buffer and included, so the
+    first syllable is not clipped.
+    """
+
+    def __init__(self, vad=None, frame_ms=30, start_ms=90, silence_ms=600, preroll_ms=300,
+                 max_phrase_seconds=15):
+        """
+        Initializes the Endpointer class.
+
+        Args:
+            vad (EnergyVAD, optional): The voice-activity detector. Defaults to a new EnergyVAD.
+            frame_ms (int): The duration of each frame in milliseconds. Defaults to 30.
+            start_ms (int): Speech needed to start an utterance. Defaults to 90.
+            silence_ms (int): Silence that ends an utterance. Defaults to 600.
+            preroll_ms (int): Audio kept from before the start. Defaults to 300.
+            max_phrase_seconds (float): The longest utterance. Defaults to 15.
+        """
+        self.vad = vad or EnergyVAD()
+        self.start_frames = max(1, start_ms // frame_ms)
+        self.silence_frames = max(1, silence_ms // frame_ms)
+        self.preroll_frames = max(self.start_frames, preroll_ms // frame_ms)
+        self.max_frames = int(max_phrase_seconds * 1000 // frame_ms)
+
+    def utterance(self, read, timeout=10):
+        """
+        Yields the frames of the next utterance as they arrive.
+
+        Args:
+            read (callable): Returns the next frame, waiting at most the given seconds,
+                             or None if no frame arrived in time or the source is exhausted.
+            timeout (float): Seconds to wait for speech to start. Defaults to 10.
+
+        Yields:
+            bytes: The utterance's frames, starting with the pre-roll. Nothing is
+                   yielded if no speech starts within the timeout.
+        """
+        preroll = deque(maxlen=self.preroll_frames)
+        deadline = time.monotonic() + timeout
+        voiced = 0
+        while voiced < self.start_frames:
+            remaining = deadline - time.monotonic()
+            frame = read(remaining) if remaining > 0 else None
+            if frame is None:
+                return
+            preroll.append(frame)
+            voiced = voiced + 1 if self.vad.is_speech(frame) else 0
+
+        yield from preroll
+        count, silent = len(preroll), 0
+        while count < self.max_frames and silent < self.silence_frames:
+            frame = read(1.0)
+            if frame is None:
+                return
+            yield frame
+            count += 1
+            silent = 0 if self.vad.is_speech(frame) else silent + 1
+
+
+class FrameRingBuffer:
+    """
+    A bounded, thread-safe buffer of audio frames that drops the oldest when full.
+    """
+
+    def __init__(self, max_frames):
+        """
+        Initializes the FrameRingBuffer class.
+
+        Args:
+            max_frames (int): The number of frames kept.
+        """
+        self._frames = deque(maxlen=max_frames)
+        self._available = threading.Condition()
+
+    def put(self, frame):
+        """
+        Appends a frame, overwriting the oldest if the buffer is full.
+
+        Args:
+            frame (bytes): The frame.
+        """
+        with self._available:
+            self._frames.append(frame)
+            self._available.notify()
+
+    def get(self, timeout=None):
+        """
+        Removes and returns the oldest frame.
+
+        Args:
+            timeout (float, optional): The maximum seconds to wait for a frame.
+
+        Returns:
+            bytes or None: The frame, or None if none arrived in time.
+        """
+        with self._available:
+            if not self._available.wait_for(lambda: self._frames, timeout):
+                return None
+            return self._frames.popleft()
+
+    def clear(self):
+        """
+        Discards every buffered frame.
+        """
+        with self._available:
+            self._frames.clear()
+
+
+class MicrophoneStream:
+    """
+    Keeps one microphone input stream open and returns utterances from it.
+
+    The sounddevice callback writes fixed-size frames into a ring buffer.
+    The noise floor is calibrated once when the stream opens and then adapts
+    on every silent frame, and voice-activity detection ends each utterance
+    as soon as the speaker stops.
+    """
+
+    def __init__(self, samplerate=16000, frame_ms=30, calibration_seconds=0.5, buffer_seconds=10,
+                 endpointer=None):
+        """
+        Initializes the MicrophoneStream class. The stream opens on first use.
+
+        Args:
+            samplerate (int): The capture sample rate. Defaults to 16000.
+            frame_ms (int): The duration of each frame in milliseconds. Defaults to 30.
+            calibration_seconds (float): Background noise measured when the stream opens. Defaults to 0.5.
+            buffer_seconds (float): Audio held if the consumer falls behind. Defaults to 10.
+            endpointer (Endpointer, optional): Decides where utterances start and end.
+                                               Defaults to an Endpointer with the same frame size.
+        """
+        self.samplerate = samplerate
+        self.frame_ms = frame_ms
+        self.frame_size = samplerate * frame_ms // 1000
+        self.calibration_seconds = calibration_seconds
+        self.endpointer = endpointer or Endpointer(frame_ms=frame_ms)
+        self.buffer = FrameRingBuffer(int(buffer_seconds * 1000 // frame_ms))
+        self._stream = None
+
+    def start(self):
+        """
+        Opens the input stream and calibrates the noise floor, if not already open.
+        """
+        if self._stream is not None:
+            return
+        import sounddevice as sd
+
+        self._stream = sd.RawInputStream(samplerate=self.samplerate, blocksize=self.frame_size,
+                                         channels=1, dtype="int16", callback=self._callback)
+        self._stream.start()
+
+        frames = []
+        for _ in range(int(self.calibration_seconds * 1000 // self.frame_ms)):
+            frame = self.buffer.get(timeout=1.0)
+            if frame is None:
+                break
+            frames.append(frame)
+        self.endpointer.vad.calibrate(frames)
+
+    def utterance(self, timeout=10):
+        """
+        Yields the frames of the next utterance as they are captured.
+
+        Audio captured before the call (e.g. while the assistant was speaking) is discarded.
+
+        Args:
+            timeout (float): Seconds to wait for speech to start. Defaults to 10.
+
+        Yields:
+            bytes: 16-bit mono PCM frames.
+        """
+        self.start()
+        self.buffer.clear()
+        yield from self.endpointer.utterance(self.buffer.get, timeout)
+
+    def listen(self, timeout=10):
+        """
+        Records the next utterance.
+
+        Args:
+            timeout (float): Seconds to wait for speech to start. Defaults to 10.
+
+        Returns:
+            bytes or None: 16-bit mono PCM audio, or None if nobody spoke in time.
+        """
+        audio = b"".join(self.utterance(timeout))
+        return audio or None
+
+    def close(self):
+        """
+        Closes the input stream.
+        """
+        if self._stream is not None:
+            self._stream.close()
+            self._stream = None
+
+    def _callback(self, indata, frames, time_info, status):
+        """Copy each captured block into the ring buffer."""
+        self.buffer.put(bytes(indata))
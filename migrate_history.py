@@ -0,0 +1,151 @@
+import argparse
+import sys
+import time
+from datetime import timedelta
+import bson
+from bson import ObjectId
+from pymongo import MongoClient, ASCENDING
+from pymongo.errors import PyMongoError
+from db import Mongo, DEFAULT_SESSION, DEFAULT_BUCKET_MESSAGES, DEFAULT_BUCKET_BYTES
+
+
+def build_buckets(messages, bucket_messages=DEFAULT_BUCKET_MESSAGES, bucket_bytes=DEFAULT_BUCKET_BYTES):
+    """
+    Groups per-message documents into bucket documents.
+
+    Args:
+        messages (iterable): Message documents sorted by model, session, timestamp and '_id'.
+        bucket_messages (int): The maximum messages per bucket. Defaults to 100.
+        bucket_bytes (int): The maximum encoded size of a bucket's messages. Defaults to 256 KiB.
+
+    Yields:
+        dict: Bucket documents in the layout read by Mongo. The last bucket of
+              each session is left open so new messages are appended to it.
+    """
+    bucket = None
+    previous = None
+    for message in messages:
+        key = (message.get("model"), message.get("session") or DEFAULT_SESSION)
+        timestamp = message.get("timestamp")
+        if timestamp is None and isinstance(message["_id"], ObjectId):
+            # Messages saved before timestamps existed: the id records the second they were inserted,
+            # nudged past the previous message so paging by timestamp does not skip ties
+            timestamp = message["_id"].generation_time
+            if previous is not None and previous[0] == key and timestamp <= previous[1]:
+                timestamp = previous[1] + timedelta(milliseconds=1)
+        previous = (key, timestamp)
+        entry = {"_id": message["_id"], "role": message.get("role"), "content": message.get("content"),
+                 "timestamp": timestamp}
+        size = len(bson.encode(entry))
+
+        if bucket is not None and (bucket["model"], bucket["session"]) != key:
+            yield bucket
+            bucket = None
+        elif bucket is not None and (bucket["count"] >= bucket_messages or bucket["bytes"] + size > bucket_bytes):
+            bucket["full"] = True
+            yield bucket
+            bucket = None
+
+        if bucket is None:
+            bucket = {"model": key[0], "session": key[1], "first": entry["timestamp"], "last": entry["timestamp"],
+                      "count": 0, "bytes": 0, "full": False, "messages": []}
+        bucket["messages"].append(entry)
+        bucket["count"] += 1
+        bucket["bytes"] += size
+        bucket["last"] = entry["timestamp"]
+
+    if bucket is not None:
+        yield bucket
+
+
+def migrate(client_url="mongodb://localhost:27017/", database="AI_MODEL", collection="chat_history",
+            bucket_messages=DEFAULT_BUCKET_MESSAGES, bucket_bytes=DEFAULT_BUCKET_BYTES, batch_size=500, swap=True):
+    """
+    Converts a one-document-per-message collection into bucket documents.
+
+    Buckets are written to '<collection>_buckets'. With `swap`, the original
+    collection is then renamed to '<collection>_messages' and the buckets take
+    its name, so the application picks them up without configuration changes.
+    Messages without a timestamp get the creation time of their ObjectId.
+
+    The migration refuses to run on a collection that already holds buckets,
+    or when '<collection>_messages' exists, so running it twice cannot
+    overwrite the backup of the original documents.
+
+    Args:
+        client_url (str): The MongoDB connection URL. Defaults to localhost.
+        database (str): The name of the database. Defaults to "AI_MODEL".
+        collection (str): The collection to convert. Defaults to "chat_history".
+        bucket_messages (int): The maximum messages per bucket. Defaults to 100.
+        bucket_bytes (int): The maximum encoded size of a bucket's messages. Defaults to 256 KiB.
+        batch_size (int): Buckets written per insert_many call. Defaults to 500.
+        swap (bool): If True, replace the original collection with the buckets. Defaults to True.
+
+    Returns:
+        dict: 'messages' read and 'buckets' written.
+
+    Raises:
+        ValueError: If the collection is already converted or a backup already exists.
+    """
+    client = MongoClient(client_url)
+    db = client[database]
+    source = db[collection]
+    target = db[f"{collection}_buckets"]
+    backup = f"{collection}_messages"
+
+    if source.find_one({"messages": {"$exists": True}}, {"_id": 1}):
+        raise ValueError(f"'{collection}' already holds bucket documents; nothing to migrate")
+    if swap and backup in db.list_collection_names():
+        raise ValueError(f"'{backup}' already exists; move it away before migrating again")
+    target.drop()
+
+    messages = source.find({"role": {"$exists": True}}, allow_disk_use=True, batch_size=5000).sort(
+        [("model", ASCENDING), ("session", ASCENDING), ("timestamp", ASCENDING), ("_id", ASCENDING)])
+
+    counts = {"messages": 0, "buckets": 0}
+    batch = []
+    for bucket in build_buckets(messages, bucket_messages, bucket_bytes):
+        batch.append(bucket)
+        counts["messages"] += bucket["count"]
+        if len(batch) >= batch_size:
+            target.insert_many(batch, ordered=False)
+            counts["buckets"] += len(batch)
+            batch = []
+    if batch:
+        target.insert_many(batch, ordered=False)
+        counts["buckets"] += len(batch)
+
+    # Create the history index before the collection goes live
+    Mongo(database=database, collection=target.name, client=client)
+
+    if swap:
+        source.rename(backup)
+        target.rename(collection)
+    return counts
+
+
+if __name__ == "__main__":
+    # Demo Usage:
+    # python migrate_history.py --mongo_url mongodb://localhost:27017/ -d AI_MODEL -c chat_history
+    parser = argparse.ArgumentParser(description="Convert chat history to per-session bucket documents")
+    parser.add_argument("--mongo_url", type=str, help="MongoDB connection URL", default="mongodb://localhost:27017/")
+    parser.add_argument("-d", "--database", type=str, help="Database name", default="AI_MODEL")
+    parser.add_argument("-c", "--collection", type=str, help="Collection to convert", default="chat_history")
+    parser.add_argument("--bucket_messages", type=int, help="Maximum messages per bucket", default=DEFAULT_BUCKET_MESSAGES)
+    parser.add_argument("--bucket_bytes", type=int, help="Maximum bytes per bucket", default=DEFAULT_BUCKET_BYTES)
+    parser.add_argument("--no_swap", action="store_true", help="Leave the buckets in <collection>_buckets")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    try:
+        result = migrate(args.mongo_url, args.database, args.collection, args.bucket_messages,
+                         args.bucket_bytes, swap=not args.no_swap)
+    except (PyMongoError, ValueError) as e:
+        print(f"Migration failed: {e}")
+        sys.exit(1)
+    print(f"Converted {result['messages']} messages into {result['buckets']} buckets "
+          f"in {time.perf_counter() - started:.1f}s.")
+    if args.no_swap:
+        print(f"Buckets written to '{args.collection}_buckets'; the original collection is unchanged.")
+    else:
+        print(f"The original documents were kept in '{args.collection}_messages'.")
@@ -0,0 +1,205 @@
+import json
+import os
+import threading
+import time
+import requests
+from pull_manager import resolve_host
+
+REGISTRY_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".ollamagenie", "registry.json")
+DEFAULT_CONTEXT_LENGTH = 4096
+
+
+class ModelRegistry:
+    """
+    Caches metadata about installed models, served from memory.
+
+    The installed-model list comes from `/api/tags` and per-model details
+    (family, parameter count, quantization, context length) from `/api/show`.
+    Both are kept in memory and on disk. Details are keyed by model digest,
+    so they stay valid until the model itself changes; the list is reused
+    until `invalidate` is called (after a pull or delete) or `list_ttl` expires.
+    """
+
+    def __init__(self, host=None, cache_path=REGISTRY_CACHE_PATH, list_ttl=300, session=None):
+        """
+        Initializes the ModelRegistry class and loads the disk cache.
+
+        Args:
+            host (str, optional): The Ollama server URL. Defaults to OLLAMA_HOST or localhost.
+            cache_path (str): Where the registry is cached. Defaults to ~/.ollamagenie/registry.json.
+            list_ttl (int): Seconds the installed-model list is trusted. Defaults to 300.
+            session (requests.Session, optional): The HTTP session to use. Defaults to a new one.
+        """
+        self.host = resolve_host(host)
+        self.cache_path = cache_path
+        self.list_ttl = list_ttl
+        self.session = session or requests.Session()
+        self._models = None
+        self._listed_at = 0.0
+        self._details = {}
+        self._lock = threading.Lock()
+        self._load_cache()
+
+    def list_models(self, refresh=False):
+        """
+        Returns the installed models.
+
+        Args:
+            refresh (bool): If True, query the server even if the cached list is fresh.
+
+        Returns:
+            list: Dictionaries with 'name', 'digest', 'size' and 'details' keys,
+                  as reported by /api/tags. Empty if the server is unreachable
+                  and nothing is cached.
+        """
+        with self._lock:
+            fresh = self._models is not None and time.time() - self._listed_at < self.list_ttl
+            if fresh and not refresh:
+                return self._models
+
+        try:
+            response = self.session.get(f"{self.host}/api/tags", timeout=5)
+            response.raise_for_status()
+            models = response.json().get("models", [])
+        except (requests.exceptions.RequestException, ValueError) as e:
+            print(f"Could not list installed models: {e}")
+            return self._models or []
+
+        with self._lock:
+            self._models = models
+            self._listed_at = time.time()
+        self._save_cache()
+        return models
+
+    def model_names(self):
+        """
+        Returns the names of the installed models.
+
+        Returns:
+            list: Model names, e.g. ["llama3.2:3b", "mistral:latest"].
+        """
+        return [model["name"] for model in self.list_models()]
+
+    def get(self, model):
+        """
+        Returns metadata for an installed model.
+
+        Args:
+            model (str): The model name.
+
+        Returns:
+            dict or None: 'name', 'digest', 'family', 'parameter_size',
+                          'quantization_level' and 'context_length' keys, or
+                          None if the model is not installed.
+        """
+        entry = self._find(model)
+        if entry is None:
+            return None
+
+        digest = entry.get("digest", model)
+        details = self._details.get(digest)
+        if details is None:
+            details = self._show(model, entry)
+            if details is None:
+                return None
+            with self._lock:
+                self._details[digest] = details
+            self._save_cache()
+        return details
+
+    def context_length(self, model, default=DEFAULT_CONTEXT_LENGTH):
+        """
+        Returns the maximum context length of a model.
+
+        Args:
+            model (str): The model name.
+            default (int): Returned when the length is unknown. Defaults to 4096.
+
+        Returns:
+            int: The context length in tokens.
+        """
+        details = self.get(model)
+        return (details or {}).get("context_length") or default
+
+    def invalidate(self):
+        """
+        Forgets the installed-model list, e.g. after a pull or delete.
+        """
+        with self._lock:
+            self._models = None
+            self._listed_at = 0.0
+
+    def delete(self, model):
+        """
+        Deletes an installed model and invalidates the list.
+
+        Args:
+            model (str): The model name.
+
+        Returns:
+            bool: True if the model was deleted.
+        """
+        try:
+            response = self.session.delete(f"{self.host}/api/delete", json={"model": model}, timeout=30)
+            response.raise_for_status()
+            return True
+        except requests.exceptions.RequestException as e:
+            print(f"Could not delete {model}: {e}")
+            return False
+        finally:
+            self.invalidate()
+
+    def _find(self, model):
+        """Return the /api/tags entry for a model, accepting names without a tag."""
+        models = self.list_models()
+        names = (model, f"{model}:latest")
+        for entry in models:
+            if entry["name"] in names:
+                return entry
+        return None
+
+    def _show(self, model, entry):
+        """Fetch and condense /api/show metadata for a model."""
+        try:
+            response = self.session.post(f"{self.host}/api/show", json={"model": model}, timeout=10)
+            response.raise_for_status()
+            info = response.json()
+        except (requests.exceptions.RequestException, ValueError) as e:
+            print(f"Could not read details for {model}: {e}")
+            return None
+
+        details = info.get("details") or entry.get("details") or {}
+        model_info = info.get("model_info") or {}
+        context_length = next((v for k, v in model_info.items() if k.endswith(".context_length")), None)
+        return {
+            "name": entry["name"],
+            "digest": entry.get("digest"),
+            "family": details.get("family"),
+            "parameter_size": details.get("parameter_size"),
+            "quantization_level": details.get("quantization_level"),
+            "context_length": context_length,
+        }
+
+    def _load_cache(self):
+        """Load the list and details saved by a previous run."""
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            return
+        self._models = cache.get("models")
+        self._listed_at = cache.get("listed_at", 0.0)
+        self._details = cache.get("details", {})
+
+    def _save_cache(self):
+        """Write the list and details to disk atomically."""
+        with self._lock:
+            cache = {"models": self._models, "listed_at": self._listed_at, "details": self._details}
+            try:
+                os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+                temp_path = self.cache_path + ".tmp"
+                with open(temp_path, "w", encoding="utf-8") as f:
+                    json.dump(cache, f, separators=(",", ":"))
+                os.replace(temp_path, self.cache_path)
+            except OSError as e:
+                print(f"Could not write the model registry cache: {e}")
@@ -0,0 +1,225 @@
+import heapq
+import re
+from bisect import bisect_left
+from collections import defaultdict
+import numpy as np
+
+_TOKEN_SPLIT = re.compile(r"[\s\-_.:/]+")
+
+
+def trigrams(text):
+    """
+    Returns the set of character trigrams of a lowercased string.
+
+    The text is padded with a leading space so the start of a word has its
+    own trigrams, which weights prefix matches.
+
+    Args:
+        text (str): The text to split.
+
+    Returns:
+        set: The trigrams of the text.
+    """
+    padded = f" {text}"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class _RangeMin:
+    """
+    A sparse table over a list of entry numbers, answering "which positions in
+    values[lo:hi] hold the smallest entries" without scanning the range.
+    """
+
+    def __init__(self, values):
+        self.values = np.asarray(values, dtype=np.int64)
+        size = len(self.values)
+        self.table = [np.arange(size)]
+        width = 1
+        while width * 2 <= size:
+            previous = self.table[-1]
+            left, right = previous[:size - width * 2 + 1], previous[width:size - width + 1]
+            self.table.append(np.where(self.values[left] <= self.values[right], left, right))
+            width *= 2
+
+    def argmin(self, lo, hi):
+        """Return the position of the smallest value in values[lo:hi]; requires lo < hi."""
+        level = (hi - lo).bit_length() - 1
+        a, b = self.table[level][lo], self.table[level][hi - (1 << level)]
+        return int(a if self.values[a] <= self.values[b] else b)
+
+    def smallest(self, lo, hi):
+        """Yield the values in values[lo:hi] from smallest up, doing O(log n) work per value."""
+        if lo >= hi:
+            return
+        position = self.argmin(lo, hi)
+        heap = [(self.values[position], position, lo, hi)]
+        while heap:
+            value, position, lo, hi = heapq.heappop(heap)
+            yield int(value)
+            for start, end in ((lo, position), (position + 1, hi)):
+                if start < end:
+                    best = self.argmin(start, end)
+                    heapq.heappush(heap, (self.values[best], best, start, end))
+
+
+class _PrefixIndex:
+    """Sorted keys with their entries, returning the entries under a prefix in catalog order."""
+
+    def __init__(self, pairs):
+        pairs.sort()
+        self.keys = [key for key, _ in pairs]
+        self.entries = _RangeMin([entry for _, entry in pairs])
+
+    def lookup(self, prefix):
+        """Yield entries whose key starts with `prefix`, lowest (most popular) first."""
+        lo = bisect_left(self.keys, prefix)
+        hi = bisect_left(self.keys, prefix[:-1] + chr(ord(prefix[-1]) + 1))
+        return self.entries.smallest(lo, hi)
+
+
+class ModelSearchIndex:
+    """
+    A prebuilt, typo-tolerant search index over model names and tags.
+
+    Tags are searched as the `name:size` variants the catalog lists, e.g.
+    "qwen2.5:7b". Descriptions are not searched: the catalog parser keeps
+    only names and sizes, so a query matching only a description finds
+    nothing.
+
+    Entries are lowercased once. Results come in tiers: an exact name, names
+    starting with the query, names with a token (split on - . : /) starting
+    with the query, names containing the query, then names sharing most of
+    its trigrams, for typos. Within a tier entries keep catalog order.
+
+    Each tier stops as soon as `limit` results are found, and none of them
+    scans the catalog: prefix tiers binary-search sorted keys and take the
+    first entries of the matching range from a sparse table, the substring
+    tier walks the shortest trigram posting list, and the typo tier counts
+    shared trigrams over the query's posting lists with numpy.
+    """
+
+    def __init__(self):
+        """
+        Initializes an empty ModelSearchIndex.
+
+        Attributes:
+            names (list): The display name of each entry, in catalog order.
+        """
+        self.names = []
+        self._names_lower = []
+        self._exact = {}
+        self._name_pairs = []
+        self._token_pairs = []
+        self._grams = defaultdict(set)
+        self._built = None
+
+    @classmethod
+    def from_catalog(cls, models):
+        """
+        Builds an index from the scraped catalog.
+
+        Each model is indexed under its name, then each of its `name:size`
+        variants, so plain names rank ahead of variants.
+
+        Args:
+            models (dict): Model names mapped to their list of sizes.
+
+        Returns:
+            ModelSearchIndex: The built index.
+        """
+        index = cls()
+        for name in models:
+            index.add(name)
+        for name, sizes in models.items():
+            for size in sizes:
+                index.add(f"{name}:{size}")
+        return index
+
+    def add(self, name):
+        """
+        Adds an entry.
+
+        Args:
+            name (str): The display name, e.g. "llama3.2" or "llama3.2:3b".
+        """
+        entry = len(self.names)
+        name_lower = name.lower()
+        self.names.append(name)
+        self._names_lower.append(name_lower)
+        self._exact.setdefault(name_lower, entry)
+
+        self._name_pairs.append((name_lower, entry))
+        for token in set(_TOKEN_SPLIT.split(name_lower)):
+            if token and token != name_lower:
+                self._token_pairs.append((token, entry))
+        for gram in trigrams(name_lower):
+            self._grams[gram].add(entry)
+        self._built = None
+
+    def search(self, query, limit=5):
+        """
+        Returns the best matching names for a query.
+
+        Args:
+            query (str): The search text; case-insensitive.
+            limit (int): The maximum number of results. Defaults to 5.
+
+        Returns:
+            list: Matching display names, best first.
+        """
+        query = query.lower().strip()
+        if not query:
+            return self.names[:limit]
+        if self._built is None:
+            self._build()
+        names, tokens, postings = self._built
+
+        results = []
+        seen = set()
+
+        def take(entries):
+            for entry in entries:
+                if len(results) == limit:
+                    return
+                if entry not in seen:
+                    seen.add(entry)
+                    results.append(entry)
+
+        if query in self._exact:
+            take([self._exact[query]])
+        take(names.lookup(query))
+        take(tokens.lookup(query))
+        if len(query) >= 3 and len(results) < limit:
+            take(self._substring_matches(query, postings))
+        if len(query) >= 3 and len(results) < limit:
+            take(self._fuzzy_matches(query, postings))
+        return [self.names[entry] for entry in results]
+
+    def _build(self):
+        """Sort the prefix keys and posting lists; done once after entries are added."""
+        postings = {gram: np.array(sorted(entries), dtype=np.int32) for gram, entries in self._grams.items()}
+        self._built = (_PrefixIndex(list(self._name_pairs)), _PrefixIndex(list(self._token_pairs)), postings)
+
+    def _substring_matches(self, query, postings):
+        """Yield entries containing the query, in catalog order, walking the shortest posting list."""
+        inner = {query[i:i + 3] for i in range(len(query) - 2)}
+        if any(gram not in self._grams for gram in inner):
+            return
+        ordered = sorted(inner, key=lambda gram: len(self._grams[gram]))
+        others = [self._grams[gram] for gram in ordered[1:]]
+        for entry in postings[ordered[0]].tolist():
+            if all(entry in entries for entries in others) and query in self._names_lower[entry]:
+                yield entry
+
+    def _fuzzy_matches(self, query, postings):
+        """Yield entries sharing at least half of the query's trigrams, most shared first."""
+        grams = trigrams(query)
+        arrays = [postings[gram] for gram in grams if gram in postings]
+        if not arrays:
+            return
+        # Count, for every entry in any of the posting lists, how many of the query's trigrams it has
+        entries, shared = np.unique(np.concatenate(arrays), return_counts=True)
+        keep = shared >= max(1, len(grams) // 2)
+        entries, shared = entries[keep], shared[keep]
+        for entry in entries[np.lexsort((entries, -shared))]:
+            yield int(entry)
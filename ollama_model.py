@@ -1,28 +1,120 @@
-import subprocess
 import re
+import os
+import json
+import time
 import requests
 import sys
+from contextlib import contextmanager
 import keyboard
-import msvcrt
+from model_search import ModelSearchIndex
+from pull_manager import pull_models
+from model_registry import ModelRegistry
+
+try:
+    import msvcrt
+except ImportError:  # Not on Windows; _getch falls back to termios.
+    msvcrt = None
+
+LIBRARY_URL = 'https://ollama.com/library'
+CATALOG_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".ollamagenie", "catalog.json")
+CATALOG_TTL = 24 * 3600
+
+# One pass over the page: each match is a model link, a link end, a model title or a size label.
+# Alternatives share a leading literal ('<' or 'x-test-') so the scanner rejects most positions fast.
+_CATALOG_TOKENS = re.compile(
+    r'<(?:a\b[^>]*href="/library/|(/a)>)|x-test-(?:model-title[^>]*title="([^"]+)"|size[^>]*>([^<]+))'
+)
+
+
+def parse_catalog(html_content):
+    """
+    Parse model names and sizes from the Ollama library page in a single pass.
+
+    Args:
+        html_content (str): The HTML of the library page.
+
+    Returns:
+        dict: Model names mapped to their list of sizes, in page order.
+    """
+    models = {}
+    name, sizes, in_link = None, [], False
+    for match in _CATALOG_TOKENS.finditer(html_content):
+        link_end, title, size = match.groups()
+        if link_end is None and title is None and size is None:
+            name, sizes, in_link = None, [], True
+        elif not in_link:
+            continue
+        elif link_end:
+            if name:
+                models[name] = sizes
+            in_link = False
+        elif title is not None:
+            if name is None:
+                name = title.strip()
+        elif size.strip():
+            sizes.append(size.strip())
+    return models
+
+
+def parse_catalog_regex(html_content):
+    """
+    Parse the library page with the original multi-pass regex approach.
+
+    Kept as the reference implementation for benchmarks/bench_catalog_parse.py.
+
+    Args:
+        html_content (str): The HTML of the library page.
+
+    Returns:
+        dict: Model names mapped to their list of sizes, in page order.
+    """
+    models = {}
+    model_blocks = re.findall(r'<a[^>]*href="/library/[^"]+"[^>]*>.*?</a>', html_content, re.DOTALL)
+    for block in model_blocks:
+        title_match = re.search(r'x-test-model-title[^>]*title="([^"]+)"', block)
+        if not title_match:
+            continue
+        model_name = title_match.group(1).strip()
+
+        sizes = re.findall(r'x-test-size[^>]*>([^<]+)', block)
+        sizes = [s.strip() for s in sizes if s.strip()]
+        models[model_name] = sizes
+    return models
 
 class OllamaModel:
     """
     A class to manage Ollama models, including scraping model data, installing recommended models,
     searching for specific models, and using existing models.
     """
-    def __init__(self):
+    def __init__(self, cache_path=CATALOG_CACHE_PATH, cache_ttl=CATALOG_TTL, redraw_debounce=0.03, registry=None):
         """
         Initialize the OllamaModel class.
 
+        The model catalog is not fetched here; it is loaded on first use by
+        `load_catalog`, so choosing an installed model needs no network.
+
+        Args:
+            cache_path (str): Where the scraped catalog is cached. Defaults to ~/.ollamagenie/catalog.json.
+            cache_ttl (int): Seconds the cached catalog is used without revalidation. Defaults to one day.
+            redraw_debounce (float): Seconds to wait for the next keypress before redrawing search results.
+            registry (ModelRegistry, optional): The installed-model registry. Defaults to one for the default host.
+
         Attributes:
             models (dict): A dictionary containing model names as keys and their sizes as values.
             model_names (list): A list of all available model names.
             current_suggestions (list): A list of current search suggestions for models.
+            search_index (ModelSearchIndex or None): The search index, built from the catalog on first search.
+            registry (ModelRegistry): Cached metadata about installed models.
         """
         self.models = {}
         self.model_names = []
         self.current_suggestions = []
-        self.scrape()
+        self.cache_path = cache_path
+        self.cache_ttl = cache_ttl
+        self.redraw_debounce = redraw_debounce
+        self.search_index = None
+        self.registry = registry or ModelRegistry()
+        self._catalog_loaded = False
 
     def model_selection(self):
         """
@@ -45,6 +137,7 @@ class OllamaModel:
             choice = input("Select an option (1-3): ").strip()
 
             if choice == "1":
+                self.load_catalog()
                 print("\033[?25l", end="", flush=True)
                 try:
                     selected_model = self.search_and_install()
@@ -60,9 +153,25 @@ class OllamaModel:
             else:
                 print("Invalid choice. Please try again.")
 
-    def scrape(self, url='https://ollama.com/library'):
+    def load_catalog(self):
+        """
+        Load the model catalog once, from the disk cache or the Ollama library.
+
+        Populates:
+            self.models: A dictionary of model names and their sizes.
+            self.model_names: A list of all available model names.
+        """
+        if not self._catalog_loaded:
+            self.scrape()
+            self._catalog_loaded = True
+
+    def scrape(self, url=LIBRARY_URL):
         """
-        Scrape model data from the Ollama library.
+        Scrape model data from the Ollama library, using the on-disk cache when possible.
+
+        A cache younger than `cache_ttl` is used without touching the network.
+        An older cache is revalidated with a conditional request (ETag /
+        Last-Modified); if the library is unreachable the stale cache is used.
 
         Args:
             url (str): The URL of the Ollama library page to scrape. Defaults to 'https://ollama.com/library'.
@@ -71,22 +180,60 @@ class OllamaModel:
             self.models: A dictionary of model names and their sizes.
             self.model_names: A list of all available model names.
         """
-        response = requests.get(url)
-        response.raise_for_status()
-        html_content = response.text
+        cache = self._read_catalog_cache()
 
-        model_blocks = re.findall(r'<a[^>]*href="/library/[^"]+"[^>]*>.*?</a>', html_content, re.DOTALL)
-        for block in model_blocks:
-            title_match = re.search(r'x-test-model-title[^>]*title="([^"]+)"', block)
-            if not title_match:
-                continue
-            model_name = title_match.group(1).strip()
+        if cache and time.time() - cache.get("fetched_at", 0) < self.cache_ttl:
+            self.models = cache["models"]
+        else:
+            headers = {}
+            if cache and cache.get("etag"):
+                headers["If-None-Match"] = cache["etag"]
+            if cache and cache.get("last_modified"):
+                headers["If-Modified-Since"] = cache["last_modified"]
 
-            sizes = re.findall(r'x-test-size[^>]*>([^<]+)', block)
-            sizes = [s.strip() for s in sizes if s.strip()]
-            self.models[model_name] = sizes
+            try:
+                response = requests.get(url, headers=headers, timeout=10)
+                if response.status_code == 304 and cache:
+                    self.models = cache["models"]
+                else:
+                    response.raise_for_status()
+                    self.models = parse_catalog(response.text)
+                cache = {
+                    "etag": response.headers.get("ETag", cache.get("etag") if cache else None),
+                    "last_modified": response.headers.get("Last-Modified", cache.get("last_modified") if cache else None),
+                    "fetched_at": time.time(),
+                    "models": self.models,
+                }
+                self._write_catalog_cache(cache)
+            except requests.exceptions.RequestException as e:
+                if cache:
+                    print(f"Could not reach the Ollama library ({e}); using the cached catalog.")
+                    self.models = cache["models"]
+                else:
+                    print(f"Could not reach the Ollama library: {e}")
+                    self.models = {}
 
         self.model_names = list(self.models.keys())
+        self.search_index = None
+
+    def _read_catalog_cache(self):
+        """Return the cached catalog, or None if missing or unreadable."""
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_catalog_cache(self, cache):
+        """Write the catalog cache atomically in compact JSON."""
+        try:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            temp_path = self.cache_path + ".tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(cache, f, separators=(",", ":"))
+            os.replace(temp_path, self.cache_path)
+        except OSError as e:
+            print(f"Could not write the catalog cache: {e}")
 
     def install_recommended(self):
         """
@@ -95,6 +242,7 @@ class OllamaModel:
         Returns:
             str: The name of the selected and installed model.
         """
+        self.load_catalog()
         print("\nTop 10 Recommended Models:")
         top_models = list(self.models.keys())[:10]
         for idx, name in enumerate(top_models, 1):
@@ -114,30 +262,38 @@ class OllamaModel:
         """
         query = []
         suggestion_lines = 0
+        redraw = True
         print("\033[?25l")  
         print("Start typing your model name (Enter = select, ESC = cancel):")
         
-        while True:
-            # Update suggestions and display them
-            self.current_suggestions = self.get_suggestions(''.join(query))
-            suggestion_lines = self._update_display(query, suggestion_lines)    
-            char = self._getch()
-            
-            if char in ('\r', '\n'):  
-                if self.current_suggestions:
-                    return self._handle_selection(self.current_suggestions)
-                continue
-            
-            elif char == '\x1b': 
-                print("\nSearch cancelled.")
-                return None
-            
-            elif char in ('\x7f', '\x08'):  # Backspace pressed
-                if query:
-                    query.pop()
-            
-            else:  # Add character to query
-                query.append(char)
+        with self._cbreak():
+            while True:
+                # Update suggestions and display them, unless more keys are already on the way
+                if redraw:
+                    self.current_suggestions = self.get_suggestions(''.join(query))
+                    suggestion_lines = self._update_display(query, suggestion_lines)    
+                char = self._getch()
+                redraw = not self._key_pending(self.redraw_debounce)
+                
+                if char in ('\r', '\n'):  
+                    self.current_suggestions = self.get_suggestions(''.join(query))
+                    if self.current_suggestions:
+                        break
+                    redraw = True
+                    continue
+                
+                elif char == '\x1b': 
+                    print("\nSearch cancelled.")
+                    return None
+                
+                elif char in ('\x7f', '\x08'):  # Backspace pressed
+                    if query:
+                        query.pop()
+                
+                else:  # Add character to query
+                    query.append(char)
+
+        return self._handle_selection(self.current_suggestions)
             
     def use_existing(self):
         """
@@ -146,20 +302,13 @@ class OllamaModel:
         Returns:
             str or None: The selected model name or None if ESC is pressed.
         """
-        result = subprocess.run(["ollama", "list"], capture_output=True, text=True)
-
-        if result.returncode != 0:
-            print("No existing models found.")
-            return None
-
-        lines = result.stdout.strip().split("\n")[1:]
+        models = self.registry.model_names()
 
-        if not lines:
+        if not models:
             print("No existing models found.")
             return None
 
         print("\nExisting Models:")
-        models = [line.split()[0] for line in lines]
 
         for idx, model in enumerate(models, 1):
             print(f"{idx}. {model}")
@@ -167,25 +316,26 @@ class OllamaModel:
         print("\nPress ESC to return to the model selection menu or type a number to select a model.")
 
         selected_model = ""
-        while True:
-            if msvcrt.kbhit():  # Check if a key is pressed
-                key = msvcrt.getch()  # Get the pressed key
-                
+        with self._cbreak():
+            while True:
+                key = self._getch()
+
                 # Check if ESC key is pressed
-                if key == b'\x1b':  # ESC key
+                if key == '\x1b':
                     print("\nReturning to the model selection menu...")
                     return None
-                
+
                 # Handle numeric input
                 elif key.isdigit():
-                    selected_model += key.decode()
+                    selected_model += key
                     print(f"\rSelect a model by number: {selected_model}", end="", flush=True)
-                
+
                 # Handle Enter key to confirm selection
-                elif key == b'\r':  # Enter key
+                elif key in ('\r', '\n'):
                     try:
                         choice = int(selected_model) - 1
                         if 0 <= choice < len(models):
+                            print()
                             return models[choice]
                         else:
                             print("\nInvalid choice. Please try again.")
@@ -195,10 +345,12 @@ class OllamaModel:
                         selected_model = ""
 
     def get_suggestions(self, query):
-        """Get search suggestions"""
+        """Get ranked, typo-tolerant search suggestions from the search index"""
+        if self.search_index is None:
+            self.search_index = ModelSearchIndex.from_catalog(self.models)
         if len(query) == 0:
-            return list(self.models.keys())[:10]
-        return [name for name in self.model_names if query.lower() in name.lower()][:5]
+            return self.model_names[:10]
+        return self.search_index.search(query, limit=5)
 
     def _handle_selection(self, suggestions):
         """Handle model selection from current suggestions"""
@@ -213,49 +365,69 @@ class OllamaModel:
             return None
 
     def _update_display(self, query, prev_lines):
-        """Update the terminal display in-place"""
-        # Clear previously printed suggestion lines
-
-        for _ in range(prev_lines):
-            sys.stdout.write('\033[F\033[K')  # Move cursor up and clear line
-        sys.stdout.flush()
-
-        # Now print the updated block
-        current_query = ''.join(query)
-        print(f"Search: {current_query}")
+        """Update the terminal display in-place with a single write"""
+        # Clear previously printed suggestion lines, then print the updated block
+        lines = ['\033[F\033[K' * prev_lines + f"Search: {''.join(query)}"]
 
         if self.current_suggestions:
-            print("Matching models:")
-            for i, name in enumerate(self.current_suggestions, 1):
-                print(f"  {i}. {name}")
-            return len(self.current_suggestions) + 2  # lines printed
-        # elif len(query) == 0:
-        #     print("Suggested models:")
-        #     for i, name in enumerate(list(self.models.keys())[:10], 1):
-        #         print(f"  {i}. {name}")
-        #     return 12  
+            lines.append("Matching models:")
+            lines.extend(f"  {i}. {name}" for i, name in enumerate(self.current_suggestions, 1))
         else:
-            print("No matches found")
-            return 2  # lines printed when no matches
+            lines.append("No matches found")
+
+        sys.stdout.write("\n".join(lines) + "\n")
+        sys.stdout.flush()
+        return len(lines)  # lines printed
+
+    def _key_pending(self, timeout):
+        """Wait up to `timeout` seconds for another keypress; True if one is waiting"""
+        if msvcrt:
+            deadline = time.monotonic() + timeout
+            while not msvcrt.kbhit():
+                if time.monotonic() >= deadline:
+                    return False
+                time.sleep(0.005)
+            return True
+        import select
+        # search_and_install keeps the terminal in cbreak mode, so keys are readable as they are typed
+        return bool(select.select([sys.stdin.fileno()], [], [], timeout)[0])
+
+    @contextmanager
+    def _cbreak(self):
+        """Deliver keys one at a time, without echo, for the duration of a with block (POSIX only)"""
+        if msvcrt or not sys.stdin.isatty():
+            yield
+            return
+        import termios, tty
+        fd = sys.stdin.fileno()
+        old_settings = termios.tcgetattr(fd)
+        try:
+            tty.setcbreak(fd, termios.TCSANOW)
+            yield
+        finally:
+            termios.tcsetattr(fd, termios.TCSADRAIN, old_settings)
 
     def _getch(self):
         """Cross-platform input handling"""
+        if msvcrt:
+            return msvcrt.getch().decode(errors="ignore")
+        import tty, termios
+        fd = sys.stdin.fileno()
+        old_settings = termios.tcgetattr(fd)
         try:
-            import msvcrt
-            return msvcrt.getch().decode()
-        except ImportError:
-            import sys, tty, termios
-            fd = sys.stdin.fileno()
-            old_settings = termios.tcgetattr(fd)
-            try:
-                tty.setraw(fd)
-                ch = sys.stdin.read(1)
-            finally:
-                termios.tcsetattr(fd, termios.TCSADRAIN, old_settings)
-            return ch
+            tty.setraw(fd, termios.TCSANOW)  # TCSAFLUSH would drop keys typed since the last read
+            # Read the byte straight from the descriptor so `_key_pending` sees any that follow
+            ch = os.read(fd, 1).decode(errors="ignore")
+        finally:
+            termios.tcsetattr(fd, termios.TCSADRAIN, old_settings)
+        return ch
 
     def handle_model_installation(self, model):
         """Handle model installation"""
+        if ":" in model:  # A model:tag variant was selected directly
+            self.install(model)
+            return model
+
         sizes = self.models.get(model, [])
         size = None
 
@@ -271,18 +443,10 @@ class OllamaModel:
         return full_model
 
     def install(self, model_name):
-        """Install model using ollama pull"""
-        process = subprocess.Popen(
-            ["ollama", "pull", model_name],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            text=True,
-            encoding="utf-8",
-            errors="replace"
-        )
-
-        for line in iter(process.stdout.readline, ''):
-            print(line.strip())
+        """Install model through the Ollama pull API with live progress"""
+        success = pull_models([model_name], max_concurrent=1)[model_name]
+        self.registry.invalidate()
+        return success
 
 
 if __name__ == "__main__":
@@ -0,0 +1,221 @@
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import requests
+
+DEFAULT_OLLAMA_HOST = "http://localhost:11434"
+
+PullEvent = namedtuple("PullEvent", ["model", "status", "digest", "completed", "total"])
+PullEvent.__doc__ = """
+A progress update from a model pull.
+
+Attributes:
+    model (str): The model being pulled.
+    status (str): The status reported by Ollama, e.g. "pulling manifest", "success" or "error".
+    digest (str or None): The layer the update refers to, if any.
+    completed (int): Bytes of the layer downloaded so far.
+    total (int): Total bytes of the layer.
+"""
+
+
+def resolve_host(host=None):
+    """
+    Returns the base URL of the Ollama server.
+
+    Args:
+        host (str, optional): An explicit host. Defaults to the OLLAMA_HOST environment
+                              variable, then http://localhost:11434.
+
+    Returns:
+        str: The base URL, with a scheme and without a trailing slash.
+    """
+    host = host or os.environ.get("OLLAMA_HOST") or DEFAULT_OLLAMA_HOST
+    if "://" not in host:
+        host = "http://" + host
+    return host.rstrip("/")
+
+
+class PullManager:
+    """
+    Pulls models through the Ollama HTTP API, several at a time.
+
+    Each pull streams `/api/pull`; its per-layer progress is parsed into
+    PullEvent updates passed to `on_event`. Progress across every pull is
+    aggregated so throughput and ETA can be reported for a whole batch.
+    """
+
+    def __init__(self, host=None, max_concurrent=3, on_event=None, session=None, window=5.0):
+        """
+        Initializes the PullManager class.
+
+        Args:
+            host (str, optional): The Ollama server URL. Defaults to OLLAMA_HOST or localhost.
+            max_concurrent (int): The maximum number of simultaneous pulls. Defaults to 3.
+            on_event (callable, optional): Called with each PullEvent, from worker threads.
+            session (requests.Session, optional): The HTTP session to use. Defaults to a new one.
+            window (float): Seconds of history used to compute throughput. Defaults to 5.0.
+        """
+        self.host = resolve_host(host)
+        self.max_concurrent = max_concurrent
+        self.on_event = on_event
+        self.session = session or requests.Session()
+        self.window = window
+        self._layers = {}
+        self._samples = deque()
+        self._lock = threading.Lock()
+
+    def pull(self, model):
+        """
+        Pulls one model, blocking until it completes.
+
+        Args:
+            model (str): The model to pull, e.g. "llama3.2:3b".
+
+        Returns:
+            bool: True if the pull succeeded.
+        """
+        try:
+            with self.session.post(f"{self.host}/api/pull", json={"model": model, "stream": True},
+                                   stream=True, timeout=(10, None)) as response:
+                response.raise_for_status()
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    update = json.loads(line)
+                    if "error" in update:
+                        self._emit(PullEvent(model, "error", None, 0, 0), error=update["error"])
+                        return False
+                    event = PullEvent(model, update.get("status", ""), update.get("digest"),
+                                      update.get("completed", 0), update.get("total", 0))
+                    if event.digest and event.total:
+                        self._record(model, event)
+                    self._emit(event)
+                    if event.status == "success":
+                        return True
+            return False
+        except (requests.exceptions.RequestException, ValueError) as e:
+            self._emit(PullEvent(model, "error", None, 0, 0), error=str(e))
+            return False
+
+    def pull_all(self, models):
+        """
+        Pulls several models concurrently, at most `max_concurrent` at a time.
+
+        Args:
+            models (list): The models to pull.
+
+        Returns:
+            dict: Each model mapped to True if its pull succeeded.
+        """
+        with ThreadPoolExecutor(max_workers=self.max_concurrent) as executor:
+            results = executor.map(self.pull, models)
+            return dict(zip(models, results))
+
+    def stats(self):
+        """
+        Returns aggregate progress across every pull.
+
+        Returns:
+            dict: 'completed' and 'total' bytes, 'bytes_per_second' over the
+                  recent window, and 'eta_seconds' (None while unknown).
+        """
+        with self._lock:
+            completed = sum(c for c, _ in self._layers.values())
+            total = sum(t for _, t in self._layers.values())
+            rate = 0.0
+            if len(self._samples) >= 2:
+                (t0, c0), (t1, c1) = self._samples[0], self._samples[-1]
+                rate = (c1 - c0) / (t1 - t0) if t1 > t0 else 0.0
+        eta = (total - completed) / rate if rate > 0 else None
+        return {"completed": completed, "total": total, "bytes_per_second": rate, "eta_seconds": eta}
+
+    def _record(self, model, event):
+        """Update the layer's progress and the throughput samples."""
+        now = time.monotonic()
+        with self._lock:
+            self._layers[(model, event.digest)] = (event.completed, event.total)
+            self._samples.append((now, sum(c for c, _ in self._layers.values())))
+            while len(self._samples) > 2 and now - self._samples[0][0] > self.window:
+                self._samples.popleft()
+
+    def _emit(self, event, error=None):
+        """Pass an event to the callback, reporting errors on stdout."""
+        if error:
+            print(f"Error pulling {event.model}: {error}")
+        if self.on_event:
+            self.on_event(event)
+
+
+class PullProgressPrinter:
+    """
+    Prints a single, throttled progress line for a PullManager.
+    """
+
+    def __init__(self, interval=0.25, stream=None):
+        """
+        Initializes the PullProgressPrinter class.
+
+        Args:
+            interval (float): The minimum seconds between redraws. Defaults to 0.25.
+            stream (file, optional): The stream to write to. Defaults to sys.stdout.
+        """
+        self.manager = None
+        self.interval = interval
+        self.stream = stream or sys.stdout
+        self._last = 0.0
+        self._lock = threading.Lock()
+
+    def __call__(self, event):
+        with self._lock:
+            now = time.monotonic()
+            if event.status == "success":
+                self.stream.write(f"\r\033[K{event.model}: success\n")
+            elif event.status != "error" and now - self._last >= self.interval and self.manager:
+                self._last = now
+                stats = self.manager.stats()
+                eta = f"{stats['eta_seconds']:.0f}s" if stats["eta_seconds"] is not None else "--"
+                self.stream.write(
+                    f"\r\033[K{event.model}: {event.status} | "
+                    f"{stats['completed'] / 1e6:.0f}/{stats['total'] / 1e6:.0f} MB "
+                    f"@ {stats['bytes_per_second'] / 1e6:.1f} MB/s, ETA {eta}"
+                )
+            self.stream.flush()
+
+
+def pull_models(models, host=None, max_concurrent=3):
+    """
+    Pulls models concurrently while printing aggregate progress.
+
+    Args:
+        models (list): The models to pull.
+        host (str, optional): The Ollama server URL.
+        max_concurrent (int): The maximum number of simultaneous pulls. Defaults to 3.
+
+    Returns:
+        dict: Each model mapped to True if its pull succeeded.
+    """
+    printer = PullProgressPrinter()
+    manager = PullManager(host, max_concurrent, on_event=printer)
+    printer.manager = manager
+    return manager.pull_all(models)
+
+
+if __name__ == "__main__":
+    # Demo Usage:
+    # python pull_manager.py llama3.2:3b mistral nomic-embed-text -c 3
+    parser = argparse.ArgumentParser(description="Pull Ollama models concurrently")
+    parser.add_argument("models", nargs="+", help="Models to pull")
+    parser.add_argument("-c", "--concurrency", type=int, default=3, help="Maximum simultaneous pulls")
+    parser.add_argument("--host", type=str, default=None, help="Ollama server URL")
+    args = parser.parse_args()
+
+    results = pull_models(args.models, args.host, args.concurrency)
+    failed = [model for model, ok in results.items() if not ok]
+    if failed:
+        print(f"Failed: {', '.join(failed)}")
+        sys.exit(1)
@@ -0,0 +1,269 @@
+import asyncio
+import heapq
+import itertools
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+
+class SchedulerOverloaded(Exception):
+    """
+    Raised when a request is rejected or shed because the scheduler's queue is full.
+
+    Callers should back off and retry, e.g. by answering HTTP 503.
+    """
+
+
+class _Waiter:
+    """A queued request: called back with `grant()` or `reject(error)`."""
+
+    __slots__ = ("model", "priority", "seq", "grant", "reject", "granted")
+
+    def __init__(self, model, priority, seq, grant, reject):
+        self.model = model
+        self.priority = priority
+        self.seq = seq
+        self.grant = grant
+        self.reject = reject
+        self.granted = False
+
+    def __lt__(self, other):
+        return (-self.priority, self.seq) < (-other.priority, other.seq)
+
+
+class ModelScheduler:
+    """
+    Admits generation requests so that models are swapped as rarely as possible.
+
+    Requests wait in one priority queue per model. When a slot frees up, the
+    scheduler keeps serving the model that is already running, up to
+    `max_batch` requests in a row, before switching to the model whose
+    waiting request has the highest priority (then the oldest). At most
+    `max_models` distinct models run at once, so a different model only
+    starts once the running one has drained. Concurrency is capped per model
+    and overall.
+
+    When `max_queue` requests are waiting, a new request is rejected with
+    SchedulerOverloaded, unless it outranks the lowest-priority waiting
+    request, which is shed in its place.
+    """
+
+    def __init__(self, max_concurrent=4, max_per_model=2, max_models=1, max_queue=64, max_batch=8):
+        """
+        Initializes the ModelScheduler class.
+
+        Args:
+            max_concurrent (int): The maximum requests generating at once. Defaults to 4.
+            max_per_model (int): The maximum requests per model generating at once. Defaults to 2.
+            max_models (int): The maximum distinct models generating at once. Match Ollama's
+                              OLLAMA_MAX_LOADED_MODELS. Defaults to 1.
+            max_queue (int): The maximum requests waiting. Defaults to 64.
+            max_batch (int): Requests served from one model before others get a turn. Defaults to 8.
+        """
+        self.max_concurrent = max_concurrent
+        self.max_per_model = max_per_model
+        self.max_models = max_models
+        self.max_queue = max_queue
+        self.max_batch = max_batch
+        self._queues = {}
+        self._queued = 0
+        self._running = Counter()
+        self._batch_model = None
+        self._batch_count = 0
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self.rejected = 0
+        self.shed = 0
+        self.swaps = 0
+
+    def acquire(self, model, priority=0, timeout=None):
+        """
+        Blocks until a request for a model may start generating.
+
+        Every successful call must be paired with `release`.
+
+        Args:
+            model (str): The model the request will use.
+            priority (int): Higher values are served first. Defaults to 0.
+            timeout (float, optional): The maximum seconds to wait in the queue.
+
+        Raises:
+            SchedulerOverloaded: If the queue is full, the request was shed, or the timeout expired.
+        """
+        granted = threading.Event()
+        errors = []
+
+        def reject(error):
+            errors.append(error)
+            granted.set()
+
+        waiter = self._enqueue(model, priority, granted.set, reject)
+        if not granted.wait(timeout) and self._withdraw(waiter):
+            self._reject_counted()
+            raise SchedulerOverloaded(f"Timed out after {timeout}s waiting for {model}")
+        if errors:
+            raise errors[0]
+
+    async def acquire_async(self, model, priority=0, timeout=None):
+        """
+        Waits, without blocking the event loop, until a request for a model may start generating.
+
+        Every successful call must be paired with `release`.
+
+        Args:
+            model (str): The model the request will use.
+            priority (int): Higher values are served first. Defaults to 0.
+            timeout (float, optional): The maximum seconds to wait in the queue.
+
+        Raises:
+            SchedulerOverloaded: If the queue is full, the request was shed, or the timeout expired.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def settle(error=None):
+            if future.done():
+                return
+            if error:
+                future.set_exception(error)
+            else:
+                future.set_result(None)
+
+        waiter = self._enqueue(model, priority,
+                               lambda: loop.call_soon_threadsafe(settle),
+                               lambda error: loop.call_soon_threadsafe(settle, error))
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            if self._withdraw(waiter):
+                self._reject_counted()
+                raise SchedulerOverloaded(f"Timed out after {timeout}s waiting for {model}")
+            await future
+        except asyncio.CancelledError:
+            # The client went away: give up the place in the queue, or the slot if already granted
+            if not self._withdraw(waiter) and waiter.granted:
+                self.release(model)
+            raise
+
+    def release(self, model):
+        """
+        Marks a request for a model as finished and admits the next ones.
+
+        Args:
+            model (str): The model passed to `acquire`.
+        """
+        with self._lock:
+            self._running[model] -= 1
+            if self._running[model] <= 0:
+                del self._running[model]
+            self._dispatch()
+
+    @contextmanager
+    def slot(self, model, priority=0, timeout=None):
+        """
+        Holds a generation slot for a model for the duration of a `with` block.
+
+        Args:
+            model (str): The model the request will use.
+            priority (int): Higher values are served first. Defaults to 0.
+            timeout (float, optional): The maximum seconds to wait in the queue.
+
+        Raises:
+            SchedulerOverloaded: If the request was not admitted.
+        """
+        self.acquire(model, priority, timeout)
+        try:
+            yield
+        finally:
+            self.release(model)
+
+    def stats(self):
+        """
+        Returns the scheduler's current load.
+
+        Returns:
+            dict: 'queued' and 'running' counts per model, plus total 'rejected',
+                  'shed' and model 'swaps' since start.
+        """
+        with self._lock:
+            return {
+                "queued": {model: len(queue) for model, queue in self._queues.items() if queue},
+                "running": dict(self._running),
+                "rejected": self.rejected,
+                "shed": self.shed,
+                "swaps": self.swaps,
+            }
+
+    def _enqueue(self, model, priority, grant, reject):
+        """Queue a waiter, applying admission control, and admit what can run."""
+        with self._lock:
+            waiter = _Waiter(model, priority, next(self._seq), grant, reject)
+            if self._queued >= self.max_queue:
+                victim = max((w for queue in self._queues.values() for w in queue), default=None)
+                if victim is None or victim.priority >= priority:
+                    self.rejected += 1
+                    raise SchedulerOverloaded(f"Scheduler queue is full ({self.max_queue} waiting)")
+                self._remove(victim)
+                self.shed += 1
+                victim.reject(SchedulerOverloaded("Request shed for a higher-priority request"))
+            heapq.heappush(self._queues.setdefault(model, []), waiter)
+            self._queued += 1
+            self._dispatch()
+            return waiter
+
+    def _withdraw(self, waiter):
+        """Remove a waiter that gave up; False if it had already been admitted or rejected."""
+        with self._lock:
+            if waiter in self._queues.get(waiter.model, ()):
+                self._remove(waiter)
+                return True
+            return False
+
+    def _reject_counted(self):
+        with self._lock:
+            self.rejected += 1
+
+    def _remove(self, waiter):
+        """Take a waiter out of its queue. Call with the lock held."""
+        queue = self._queues[waiter.model]
+        queue.remove(waiter)
+        heapq.heapify(queue)
+        self._queued -= 1
+
+    def _dispatch(self):
+        """Admit waiting requests while limits allow. Call with the lock held."""
+        while self._queued and sum(self._running.values()) < self.max_concurrent:
+            model = self._next_model()
+            if model is None:
+                return
+            if model != self._batch_model:
+                if self._batch_model is not None:
+                    self.swaps += 1
+                self._batch_model, self._batch_count = model, 0
+            self._batch_count += 1
+            waiter = heapq.heappop(self._queues[model])
+            self._queued -= 1
+            self._running[model] += 1
+            waiter.granted = True
+            waiter.grant()
+
+    def _next_model(self):
+        """Pick the model to admit next, or None if every waiting model is blocked."""
+        eligible = [
+            model for model, queue in self._queues.items()
+            if queue and self._running[model] < self.max_per_model
+            and (model in self._running or len(self._running) < self.max_models)
+        ]
+        if not eligible:
+            return None
+        current = self._batch_model
+        others_waiting = any(queue for model, queue in self._queues.items() if model != current)
+        if current in eligible and (self._batch_count < self.max_batch or not others_waiting):
+            if self._batch_count >= self.max_batch:
+                self._batch_count = 0
+            return current
+        # The batch is used up: let the current model drain so a waiting model can take over
+        others = [model for model in eligible if model != current]
+        if not others:
+            return None
+        return min(others, key=lambda model: self._queues[model][0])
@@ -0,0 +1,96 @@
+import threading
+from vector_store import VectorIndex, embed
+
+
+class SemanticCache:
+    """
+    Answers paraphrased questions from previously generated responses.
+
+    Each question is embedded with an Ollama embedding model and compared
+    against the cached questions with one vectorized similarity search. A
+    cached response is returned when the best cosine similarity reaches
+    `threshold` and it was generated by the same model. Only the question is
+    compared, not the rest of the conversation, so this is best suited to
+    self-contained questions and is opt-in.
+
+    Attributes:
+        hits (int): The number of questions answered from the cache.
+        misses (int): The number of questions that required a generation.
+    """
+
+    def __init__(self, embedding_model="nomic-embed-text", threshold=0.92, capacity=10000, path=None, client=None):
+        """
+        Initializes the SemanticCache class.
+
+        Args:
+            embedding_model (str): The Ollama embedding model. Defaults to "nomic-embed-text".
+            threshold (float): The minimum cosine similarity for a hit. Defaults to 0.92.
+            capacity (int): The maximum number of cached questions. Defaults to 10000.
+            path (str, optional): The file prefix used to persist the cache.
+            client (ollama.Client, optional): The client used for embeddings.
+        """
+        self.embedding_model = embedding_model
+        self.threshold = threshold
+        self.client = client
+        self.index = VectorIndex(capacity, path)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def lookup(self, model, vector):
+        """
+        Returns the cached response for the closest question, if close enough.
+
+        Args:
+            model (str): The model the response must have been generated by.
+            vector (array-like): The embedding of the question.
+
+        Returns:
+            str or None: The cached response.
+        """
+        for row, score, payload in self.index.search(vector, k=1, group=model):
+            if score >= self.threshold:
+                self.index.touch(row)
+                return payload["response"]
+        return None
+
+    def stream(self, model, question, produce):
+        """
+        Streams a cached response for a similar question, or generates and caches one.
+
+        Args:
+            model (str): The name of the AI model.
+            question (str): The user's question.
+            produce (callable): Returns an iterable of response chunks on a miss.
+
+        Yields:
+            str: The response chunks. A cached response is replayed as one chunk.
+        """
+        try:
+            vector = embed([question], self.embedding_model, self.client)[0]
+        except Exception as e:
+            print(f"Error embedding question, skipping semantic cache: {e}")
+            yield from produce()
+            return
+
+        response = self.lookup(model, vector)
+        if response is not None:
+            with self._lock:
+                self.hits += 1
+            yield response
+            return
+
+        with self._lock:
+            self.misses += 1
+        parts = []
+        for chunk in produce():
+            parts.append(chunk)
+            yield chunk
+        if parts:
+            self.index.add(vector, {"model": model, "question": question, "response": "".join(parts)}, group=model)
+
+    def save(self):
+        """
+        Persists the cache to disk when a path was given.
+        """
+        self.index.save()
@@ -0,0 +1,247 @@
+import argparse
+import asyncio
+import json
+from collections import OrderedDict
+import httpx
+from aiohttp import web, WSMsgType
+from ollama import AsyncClient
+from pymongo import MongoClient
+from async_chat import AsyncChat
+from db import Mongo
+from scheduler import ModelScheduler, SchedulerOverloaded
+
+
+def parse_priority(body):
+    """
+    Returns a request's priority.
+
+    Args:
+        body (dict): The request body.
+
+    Returns:
+        int: The "priority" field, or 0 if it is missing.
+
+    Raises:
+        ValueError: If the priority is not an integer or an integer string.
+    """
+    priority = body.get("priority", 0)
+    if isinstance(priority, str):
+        try:
+            priority = int(priority)
+        except ValueError:
+            pass
+    if isinstance(priority, bool) or not isinstance(priority, int):
+        raise ValueError(f'"priority" must be an integer, got {priority!r}.')
+    return priority
+
+
+class ChatServer:
+    """
+    Serves streaming chat over HTTP (Server-Sent Events) and WebSocket.
+
+    All sessions in the process share one pooled MongoClient, one Mongo
+    write-behind queue and one keep-alive Ollama client. Each session keeps
+    its own AsyncChat, created on first use and evicted least-recently-used
+    once `max_sessions` are open. Generation is admitted by a ModelScheduler,
+    which groups requests by model and answers 503 when its queue is full.
+
+    Endpoints:
+        POST /chat/{session}   Body {"question": "...", "model": "...", "priority": 0}; streams SSE events.
+        GET  /ws/{session}     WebSocket; send {"question": "...", "priority": 0}, receive chunk and done messages.
+        GET  /health           Liveness check.
+    """
+
+    def __init__(self, model, mongo_client_url="mongodb://localhost:27017/", database="AI_MODEL",
+                 collection="chat_history", ollama_host=None, mongo_pool_size=100, ollama_pool_size=100,
+                 max_sessions=10000, scheduler=None, queue_timeout=30.0):
+        """
+        Initializes the ChatServer class and its shared connection pools.
+
+        Args:
+            model (str): The default model for sessions that do not name one.
+            mongo_client_url (str): The MongoDB connection URL. Defaults to localhost.
+            database (str): The name of the MongoDB database. Defaults to "AI_MODEL".
+            collection (str): The name of the MongoDB collection. Defaults to "chat_history".
+            ollama_host (str, optional): The Ollama server URL. Defaults to OLLAMA_HOST or localhost.
+            mongo_pool_size (int): The maximum MongoDB connections. Defaults to 100.
+            ollama_pool_size (int): The maximum Ollama HTTP connections. Defaults to 100.
+            max_sessions (int): The maximum sessions held in memory. Defaults to 10000.
+            scheduler (ModelScheduler, optional): Admits generation requests. Defaults to a ModelScheduler
+                                                  with its default limits.
+            queue_timeout (float): The maximum seconds a request waits for admission. Defaults to 30.
+        """
+        self.model = model
+        self.max_sessions = max_sessions
+        self.mongo = Mongo(database=database, collection=collection, write_behind=True,
+                           client=MongoClient(mongo_client_url, maxPoolSize=mongo_pool_size))
+        limits = httpx.Limits(max_connections=ollama_pool_size, max_keepalive_connections=ollama_pool_size)
+        self.ollama_client = AsyncClient(host=ollama_host, limits=limits)
+        self.sessions = OrderedDict()
+        self._creating = {}
+        self.scheduler = scheduler or ModelScheduler()
+        self.queue_timeout = queue_timeout
+
+        self.app = web.Application()
+        self.app.add_routes([
+            web.post("/chat/{session}", self.handle_chat),
+            web.get("/ws/{session}", self.handle_websocket),
+            web.get("/health", self.handle_health),
+        ])
+        self.app.on_cleanup.append(self._close)
+
+    async def get_session(self, session, model=None):
+        """
+        Returns the chat for a session, creating it on first use.
+
+        Concurrent first requests for the same session share one creation,
+        so they all get the same chat and history is loaded once.
+
+        Args:
+            session (str): The session key.
+            model (str, optional): The model for the session. Defaults to the server's model.
+
+        Returns:
+            AsyncChat: The session's chat.
+        """
+        key = (model or self.model, session)
+        chat = self.sessions.get(key)
+        if chat is not None:
+            self.sessions.move_to_end(key)
+            return chat
+
+        creating = self._creating.get(key)
+        if creating is None:
+            creating = asyncio.ensure_future(
+                AsyncChat.create(key[0], self.mongo, session=session, client=self.ollama_client))
+            self._creating[key] = creating
+            creating.add_done_callback(lambda _: self._creating.pop(key, None))
+        # Shielded so a cancelled request does not cancel the creation other requests wait on
+        chat = await asyncio.shield(creating)
+        if key not in self.sessions:
+            self.sessions[key] = chat
+            while len(self.sessions) > self.max_sessions:
+                self.sessions.popitem(last=False)
+        return chat
+
+    async def handle_chat(self, request):
+        """Stream a response as Server-Sent Events."""
+        try:
+            body = await request.json()
+            question = body["question"]
+        except (ValueError, KeyError, TypeError):
+            raise web.HTTPBadRequest(text='Expected a JSON body with a "question" field.')
+        try:
+            priority = parse_priority(body)
+        except ValueError as e:
+            raise web.HTTPBadRequest(text=str(e))
+
+        chat = await self.get_session(request.match_info["session"], body.get("model"))
+        try:
+            await self.scheduler.acquire_async(chat.model, priority, self.queue_timeout)
+        except SchedulerOverloaded as e:
+            raise web.HTTPServiceUnavailable(text=str(e), headers={"Retry-After": "1"})
+
+        try:
+            response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+            await response.prepare(request)
+
+            parts = []
+            chunks = chat.process_question(question)
+            try:
+                async for chunk in chunks:
+                    parts.append(chunk)
+                    await response.write(f"data: {json.dumps({'chunk': chunk})}\n\n".encode())
+                done = {"response": "".join(parts).strip()}
+                await response.write(f"event: done\ndata: {json.dumps(done)}\n\n".encode())
+            except Exception as e:
+                await response.write(f"event: error\ndata: {json.dumps({'error': str(e)})}\n\n".encode())
+            finally:
+                # Also when the client went away mid-stream, so the session's turn lock is released
+                await chunks.aclose()
+            await response.write_eof()
+            return response
+        finally:
+            self.scheduler.release(chat.model)
+
+    async def handle_websocket(self, request):
+        """Stream responses over a WebSocket, one question per message."""
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        session = request.match_info["session"]
+
+        async for msg in ws:
+            if msg.type != WSMsgType.TEXT:
+                continue
+            try:
+                body = json.loads(msg.data)
+                if not isinstance(body, dict) or "question" not in body:
+                    raise ValueError('Expected a JSON object with a "question" field.')
+                priority = parse_priority(body)
+            except ValueError as e:
+                await ws.send_json({"error": f"Bad request: {e}", "bad_request": True})
+                continue
+            try:
+                chat = await self.get_session(session, body.get("model"))
+                await self.scheduler.acquire_async(chat.model, priority, self.queue_timeout)
+                chunks = chat.process_question(body["question"])
+                try:
+                    parts = []
+                    async for chunk in chunks:
+                        parts.append(chunk)
+                        await ws.send_json({"chunk": chunk})
+                    await ws.send_json({"done": True, "response": "".join(parts).strip()})
+                finally:
+                    await chunks.aclose()
+                    self.scheduler.release(chat.model)
+            except SchedulerOverloaded as e:
+                await ws.send_json({"error": str(e), "overloaded": True})
+            except Exception as e:
+                await ws.send_json({"error": str(e)})
+        return ws
+
+    async def handle_health(self, request):
+        """Report liveness, the number of open sessions and the scheduler's load."""
+        return web.json_response({"status": "ok", "sessions": len(self.sessions), "scheduler": self.scheduler.stats()})
+
+    async def _close(self, app):
+        """Flush pending messages and close the shared clients."""
+        # The flush blocks on MongoDB, so keep it off the event loop
+        await asyncio.get_running_loop().run_in_executor(None, self.mongo.flush)
+        await self.ollama_client.close()
+        self.mongo.client.close()
+
+    def run(self, host="0.0.0.0", port=8080):
+        """
+        Runs the server until interrupted.
+
+        Args:
+            host (str): The interface to bind. Defaults to all interfaces.
+            port (int): The port to listen on. Defaults to 8080.
+        """
+        web.run_app(self.app, host=host, port=port)
+
+
+if __name__ == "__main__":
+    # Demo Usage:
+    # python server.py -m llama3.2 -p 8080
+    # curl -N -X POST localhost:8080/chat/alice -d '{"question": "Hello"}'
+    parser = argparse.ArgumentParser(description="Ollama Chat Server")
+    parser.add_argument("-m", "--model", type=str, help="Default model for new sessions", required=True)
+    parser.add_argument("-H", "--host", type=str, help="Interface to bind", default="0.0.0.0")
+    parser.add_argument("-p", "--port", type=int, help="Port to listen on", default=8080)
+    parser.add_argument("--mongo_url", type=str, help="MongoDB connection URL", default="mongodb://localhost:27017/")
+    parser.add_argument("--ollama_host", type=str, help="Ollama server URL", default=None)
+    parser.add_argument("--mongo_pool_size", type=int, help="Maximum MongoDB connections", default=100)
+    parser.add_argument("--ollama_pool_size", type=int, help="Maximum Ollama HTTP connections", default=100)
+    parser.add_argument("--max_concurrent", type=int, help="Maximum requests generating at once", default=4)
+    parser.add_argument("--max_per_model", type=int, help="Maximum requests per model generating at once", default=2)
+    parser.add_argument("--max_models", type=int, help="Maximum models generating at once", default=1)
+    parser.add_argument("--max_queue", type=int, help="Maximum requests waiting before new ones get 503", default=64)
+
+    args = parser.parse_args()
+
+    server = ChatServer(args.model, args.mongo_url, ollama_host=args.ollama_host,
+                        mongo_pool_size=args.mongo_pool_size, ollama_pool_size=args.ollama_pool_size,
+                        scheduler=ModelScheduler(args.max_concurrent, args.max_per_model, args.max_models,
+                                                 args.max_queue))
+    server.run(args.host, args.port)
@@ -0,0 +1,252 @@
+import sys
+import threading
+import time
+
+
+class StreamSink:
+    """
+    Receives the chunks of a streamed model response.
+
+    Subclasses override the hooks they need. Sinks are registered on a
+    StreamPipeline, which calls them in registration order for every chunk.
+    """
+
+    def on_start(self):
+        """Called before the first chunk of a response."""
+
+    def on_chunk(self, chunk):
+        """
+        Called for every non-empty chunk.
+
+        Args:
+            chunk (str): The text of the chunk.
+        """
+
+    def on_end(self, text):
+        """
+        Called once the response is complete.
+
+        Args:
+            text (str): The full response text.
+        """
+
+
+class TerminalSink(StreamSink):
+    """
+    Writes chunks to a terminal, coalescing writes to a fixed frame rate.
+
+    Rather than flushing after every token, chunks are buffered and written
+    together at most `frame_rate` times per second. Text held back by the
+    frame rate is written by a timer at the end of the frame, so it does not
+    stay hidden while the model pauses between chunks.
+    """
+
+    def __init__(self, stream=None, frame_rate=30):
+        """
+        Initializes the TerminalSink class.
+
+        Args:
+            stream (file, optional): The stream to write to. Defaults to sys.stdout.
+            frame_rate (int): The maximum number of writes per second. Defaults to 30.
+        """
+        self.stream = stream or sys.stdout
+        self.interval = 1.0 / frame_rate
+        self._buffer = []
+        self._last_write = 0.0
+        self._timer = None
+        self._lock = threading.Lock()
+
+    def on_chunk(self, chunk):
+        with self._lock:
+            self._buffer.append(chunk)
+            wait = self._last_write + self.interval - time.monotonic()
+            if wait <= 0:
+                self._write()
+            elif self._timer is None:
+                self._timer = threading.Timer(wait, self._write_pending)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def on_end(self, text):
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            self._write()
+
+    def _write_pending(self):
+        """Timer callback: write what the frame rate held back."""
+        with self._lock:
+            self._timer = None
+            self._write()
+
+    def _write(self):
+        """Write and flush everything buffered since the last frame. Call with the lock held."""
+        if self._buffer:
+            self.stream.write("".join(self._buffer))
+            self._buffer.clear()
+            self.stream.flush()
+            self._last_write = time.monotonic()
+
+
+class FileSink(StreamSink):
+    """
+    Appends each response to a file, one response per line.
+    """
+
+    def __init__(self, path, encoding="utf-8"):
+        """
+        Initializes the FileSink class.
+
+        Args:
+            path (str): The file to append to.
+            encoding (str): The file encoding. Defaults to "utf-8".
+        """
+        self.path = path
+        self.encoding = encoding
+        self._file = None
+
+    def on_start(self):
+        self._file = open(self.path, "a", encoding=self.encoding)
+
+    def on_chunk(self, chunk):
+        self._file.write(chunk)
+
+    def on_end(self, text):
+        self._file.write("\n")
+        self._file.close()
+        self._file = None
+
+
+class CallbackSink(StreamSink):
+    """
+    Forwards chunks to a callable, e.g. a TTS engine or a websocket send.
+    """
+
+    def __init__(self, on_chunk, on_end=None):
+        """
+        Initializes the CallbackSink class.
+
+        Args:
+            on_chunk (callable): Called with each chunk.
+            on_end (callable, optional): Called with the full response text.
+        """
+        self._on_chunk = on_chunk
+        self._on_end = on_end
+
+    def on_chunk(self, chunk):
+        self._on_chunk(chunk)
+
+    def on_end(self, text):
+        if self._on_end:
+            self._on_end(text)
+
+
+class StreamPipeline:
+    """
+    Fans a stream of response chunks out to registered sinks.
+
+    Chunks are accumulated in a list and joined once at the end, so
+    building the full response is linear in its length.
+    """
+
+    def __init__(self, sinks=None):
+        """
+        Initializes the StreamPipeline class.
+
+        Args:
+            sinks (list, optional): The sinks to register. Defaults to none.
+
+        Attributes:
+            sinks (list): The registered StreamSink instances.
+        """
+        self.sinks = list(sinks or [])
+
+    def add_sink(self, sink):
+        """
+        Registers a sink.
+
+        Args:
+            sink (StreamSink): The sink to register.
+        """
+        self.sinks.append(sink)
+
+    def remove_sink(self, sink):
+        """
+        Unregisters a sink.
+
+        Args:
+            sink (StreamSink): The sink to remove.
+        """
+        self.sinks.remove(sink)
+
+    def start(self):
+        """
+        Notifies every sink that a response is starting.
+        """
+        for sink in self.sinks:
+            sink.on_start()
+
+    def send(self, chunk):
+        """
+        Passes a chunk to every sink.
+
+        Args:
+            chunk (str): The text of the chunk.
+        """
+        for sink in self.sinks:
+            sink.on_chunk(chunk)
+
+    def end(self, text):
+        """
+        Notifies every sink that the response is complete.
+
+        Args:
+            text (str): The full response text.
+        """
+        for sink in self.sinks:
+            sink.on_end(text)
+
+    def stream(self, chunks):
+        """
+        Feeds chunks to every sink and yields them to the caller.
+
+        Args:
+            chunks (iterable): The response chunks, as strings.
+
+        Yields:
+            str: Each non-empty chunk, after the sinks have received it.
+
+        Returns:
+            str: The full response text, as the generator's return value.
+        """
+        parts = []
+        self.start()
+        try:
+            for chunk in chunks:
+                if not chunk:
+                    continue
+                parts.append(chunk)
+                self.send(chunk)
+                yield chunk
+        finally:
+            text = "".join(parts)
+            self.end(text)
+        return text
+
+    def run(self, chunks):
+        """
+        Feeds every chunk to the sinks and returns the full response.
+
+        Args:
+            chunks (iterable): The response chunks, as strings.
+
+        Returns:
+            str: The full response text.
+        """
+        stream = self.stream(chunks)
+        while True:
+            try:
+                next(stream)
+            except StopIteration as stop:
+                return stop.value
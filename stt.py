@@ -0,0 +1,214 @@
+import argparse
+import json
+import sys
+import wave
+from microphone import Endpointer
+
+
+class SpeechRecognizer:
+    """
+    Converts a stream of 16-bit mono PCM frames to text.
+
+    A recognizer receives an utterance frame by frame through `accept`, which
+    may return a partial hypothesis while audio is still arriving, and
+    produces the final transcript from `finish`. Subclasses implement
+    `reset`, `accept` and `finish`.
+    """
+
+    def __init__(self, samplerate=16000):
+        """
+        Initializes the SpeechRecognizer class.
+
+        Args:
+            samplerate (int): The sample rate of the audio. Defaults to 16000.
+        """
+        self.samplerate = samplerate
+
+    def reset(self):
+        """Prepares for a new utterance."""
+
+    def accept(self, frame):
+        """
+        Feeds the next frame of the utterance.
+
+        Args:
+            frame (bytes): 16-bit mono PCM samples.
+
+        Returns:
+            str or None: The current partial transcript, if the backend produces one.
+        """
+        raise NotImplementedError
+
+    def finish(self):
+        """
+        Ends the utterance.
+
+        Returns:
+            str or None: The final transcript, or None if nothing was understood.
+        """
+        raise NotImplementedError
+
+    def transcribe(self, frames, on_partial=None):
+        """
+        Recognizes a whole utterance.
+
+        Args:
+            frames (iterable): The utterance's frames, e.g. from MicrophoneStream.utterance.
+            on_partial (callable, optional): Called with each new partial transcript.
+
+        Returns:
+            str or None: The final transcript, or None if nothing was understood.
+        """
+        self.reset()
+        last = None
+        for frame in frames:
+            partial = self.accept(frame)
+            if partial and partial != last and on_partial:
+                on_partial(partial)
+            last = partial or last
+        return self.finish()
+
+
+class GoogleRecognizer(SpeechRecognizer):
+    """
+    Recognizes speech with the Google Web Speech API once the utterance has ended.
+    """
+
+    def __init__(self, samplerate=16000):
+        import speech_recognition as sr
+
+        super().__init__(samplerate)
+        self._sr = sr
+        self.recognizer = sr.Recognizer()
+        self._frames = []
+
+    def reset(self):
+        self._frames = []
+
+    def accept(self, frame):
+        self._frames.append(frame)
+        return None
+
+    def finish(self):
+        audio = self._sr.AudioData(b"".join(self._frames), self.samplerate, 2)
+        self._frames = []
+        try:
+            return self.recognizer.recognize_google(audio).lower().strip() or None
+        except self._sr.UnknownValueError:
+            return None
+        except self._sr.RequestError as e:
+            print(f"Speech recognition service error: {e}")
+            return None
+
+
+class VoskRecognizer(SpeechRecognizer):
+    """
+    Recognizes speech offline with Vosk, producing partial results while audio arrives.
+    """
+
+    def __init__(self, model_path, samplerate=16000):
+        """
+        Initializes the VoskRecognizer class and loads the model.
+
+        Args:
+            model_path (str): The directory of a Vosk model, e.g. "vosk-model-small-en-us-0.15".
+            samplerate (int): The sample rate of the audio. Defaults to 16000.
+        """
+        import vosk
+
+        super().__init__(samplerate)
+        vosk.SetLogLevel(-1)
+        self._vosk = vosk
+        self.model = vosk.Model(model_path)
+        self.reset()
+
+    def reset(self):
+        self.recognizer = self._vosk.KaldiRecognizer(self.model, self.samplerate)
+        self._segments = []
+
+    def accept(self, frame):
+        # Vosk finalizes a segment at each pause; later segments continue the same utterance.
+        if self.recognizer.AcceptWaveform(frame):
+            text = json.loads(self.recognizer.Result()).get("text", "")
+            if text:
+                self._segments.append(text)
+            partial = ""
+        else:
+            partial = json.loads(self.recognizer.PartialResult()).get("partial", "")
+        return " ".join(self._segments + [partial]).strip() or None
+
+    def finish(self):
+        text = json.loads(self.recognizer.FinalResult()).get("text", "")
+        if text:
+            self._segments.append(text)
+        transcript = " ".join(self._segments).strip()
+        self.reset()
+        return transcript or None
+
+
+def read_wav_frames(path, frame_ms=30):
+    """
+    Reads a WAV file as fixed-size frames.
+
+    Args:
+        path (str): A 16-bit mono WAV file.
+        frame_ms (int): The duration of each frame in milliseconds. Defaults to 30.
+
+    Returns:
+        tuple: (frames, samplerate), where frames is a list of bytes.
+
+    Raises:
+        ValueError: If the file is not 16-bit mono.
+    """
+    with wave.open(path, "rb") as wav:
+        if wav.getsampwidth() != 2 or wav.getnchannels() != 1:
+            raise ValueError(f"{path} must be 16-bit mono PCM")
+        samplerate = wav.getframerate()
+        frame_bytes = samplerate * frame_ms // 1000 * 2
+        audio = wav.readframes(wav.getnframes())
+    return [audio[i:i + frame_bytes] for i in range(0, len(audio), frame_bytes)], samplerate
+
+
+def transcribe_file(path, recognizer, endpoint=False, on_partial=None):
+    """
+    Recognizes the speech in a WAV file, as if it were captured live.
+
+    Args:
+        path (str): A 16-bit mono WAV file at the recognizer's sample rate.
+        recognizer (SpeechRecognizer): The recognizer to use.
+        endpoint (bool): If True, stop at the end of the first utterance, as
+                         SpeechHandler.listen does. Defaults to False.
+        on_partial (callable, optional): Called with each new partial transcript.
+
+    Returns:
+        str or None: The final transcript.
+    """
+    frames, _ = read_wav_frames(path)
+    if endpoint:
+        source = iter(frames)
+        frames = Endpointer().utterance(lambda timeout: next(source, None))
+    return recognizer.transcribe(frames, on_partial)
+
+
+if __name__ == "__main__":
+    # Demo Usage:
+    # python stt.py question.wav --engine vosk --model vosk-model-small-en-us-0.15
+    parser = argparse.ArgumentParser(description="Transcribe a WAV file")
+    parser.add_argument("wav", help="16-bit mono WAV file")
+    parser.add_argument("-e", "--engine", choices=["google", "vosk"], default="vosk", help="Recognition engine")
+    parser.add_argument("-m", "--model", type=str, default=None, help="Vosk model directory")
+    parser.add_argument("--endpoint", action="store_true", help="Stop at the end of the first utterance")
+    args = parser.parse_args()
+
+    _, rate = read_wav_frames(args.wav)
+    if args.engine == "vosk":
+        if not args.model:
+            parser.error("--model is required for the vosk engine")
+        engine = VoskRecognizer(args.model, rate)
+    else:
+        engine = GoogleRecognizer(rate)
+
+    result = transcribe_file(args.wav, engine, args.endpoint,
+                             on_partial=lambda text: print(f"\r\033[K... {text}", end="", flush=True))
+    print(f"\r\033[K{result or ''}")
+    sys.exit(0 if result else 1)
@@ -0,0 +1,42 @@
+"""
+Regenerates the WAV fixtures used by the tests.
+
+Every file is 8 kHz 16-bit mono. Background noise is low-level random noise
+(RMS about 30) from a fixed seed, and "speech" is a 220 Hz tone at an RMS
+of about 2800, so the files are small and the expected frames are exact.
+
+    python tests/fixtures/make_fixtures.py
+"""
+import os
+import wave
+import numpy as np
+
+SAMPLERATE = 8000
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def noise(seconds, rng):
+    return rng.normal(0, 30, int(SAMPLERATE * seconds))
+
+
+def tone(seconds):
+    t = np.arange(int(SAMPLERATE * seconds)) / SAMPLERATE
+    return 4000 * np.sin(2 * np.pi * 220 * t)
+
+
+def write(name, *parts):
+    samples = np.clip(np.concatenate(parts), -32768, 32767).astype("<i2")
+    with wave.open(os.path.join(HERE, name), "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(SAMPLERATE)
+        wav.writeframes(samples.tobytes())
+
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    # 0.6 s of noise, then 0.6 s of speech, a 0.3 s pause, 0.3 s of speech and 0.9 s of noise
+    write("speech.wav", noise(0.6, rng), tone(0.6), noise(0.3, rng), tone(0.3), noise(0.9, rng))
+    write("silence.wav", noise(1.2, rng))
+    # A single 60 ms click: shorter than the 90 ms needed to start an utterance
+    write("click.wav", noise(0.6, rng), tone(0.06), noise(0.6, rng))
@@ -0,0 +1,106 @@
+import asyncio
+import json
+import aiohttp
+import mongomock
+import pytest
+from aiohttp.test_utils import TestServer
+import server as server_module
+from async_chat import AsyncChat
+from db import Mongo
+
+MODEL = "llama3.2"
+
+
+class StubAsyncClient:
+    """Streams `tokens` chunks, pausing `delay` seconds before each one."""
+
+    def __init__(self, tokens=5, delay=0.0):
+        self.tokens = tokens
+        self.delay = delay
+        self.requests = []
+
+    async def chat(self, model, messages, stream=False, **kwargs):
+        self.requests.append(messages)
+
+        async def parts():
+            for number in range(self.tokens):
+                await asyncio.sleep(self.delay)
+                yield {"message": {"role": "assistant", "content": f"tok{number} "}, "done": False}
+            yield {"message": {"role": "assistant", "content": ""}, "done": True}
+
+        return parts()
+
+    async def close(self):
+        pass
+
+
+@pytest.fixture
+def mongo():
+    return Mongo(client=mongomock.MongoClient())
+
+
+def test_closing_a_turn_early_releases_the_session(mongo):
+    async def scenario():
+        chat = AsyncChat(MODEL, mongo, session="alice", client=StubAsyncClient())
+        chunks = chat.process_question("First?")
+        assert await chunks.__anext__() == "tok0 "
+        assert chat._turn_lock.locked()
+
+        await chunks.aclose()
+
+        assert not chat._turn_lock.locked()
+        assert await asyncio.wait_for(chat.ask("Second?"), 5) == "tok0 tok1 tok2 tok3 tok4"
+        return chat
+
+    chat = asyncio.run(scenario())
+    assert [m["content"] for m in mongo.get_history(MODEL, "alice")] == ["Second?", "tok0 tok1 tok2 tok3 tok4"]
+    assert [m["role"] for m in chat.history] == ["user", "user", "assistant"]
+
+
+def test_turns_in_one_session_are_serialized(mongo):
+    async def scenario():
+        chat = AsyncChat(MODEL, mongo, session="alice", client=StubAsyncClient(tokens=3, delay=0.01))
+        return await asyncio.gather(chat.ask("First?"), chat.ask("Second?")), chat
+
+    answers, chat = asyncio.run(scenario())
+    assert answers == ["tok0 tok1 tok2", "tok0 tok1 tok2"]
+    assert [m["content"] for m in chat.history] == ["First?", "tok0 tok1 tok2", "Second?", "tok0 tok1 tok2"]
+
+
+def test_server_releases_the_session_when_the_client_disconnects(monkeypatch):
+    client = mongomock.MongoClient()
+    monkeypatch.setattr(server_module, "MongoClient", lambda *args, **kwargs: client)
+    chat_server = server_module.ChatServer(MODEL)
+    chat_server.ollama_client = StubAsyncClient()
+    # Keep every stream referenced, as a traceback or a log record might, so only an explicit close frees the turn
+    streams = []
+    process_question = AsyncChat.process_question
+    monkeypatch.setattr(AsyncChat, "process_question",
+                        lambda self, question: streams.append(process_question(self, question)) or streams[-1])
+    # The client goes away after the first chunk: the next write fails while the stream waits at a chunk
+    writes = []
+    write = server_module.web.StreamResponse.write
+
+    async def write_until_disconnected(self, data):
+        writes.append(data)
+        if len(writes) == 2:
+            raise ConnectionResetError("Cannot write to closing transport")
+        await write(self, data)
+
+    monkeypatch.setattr(server_module.web.StreamResponse, "write", write_until_disconnected)
+
+    async def scenario():
+        async with TestServer(chat_server.app) as test_server, aiohttp.ClientSession() as session:
+            async with session.post(test_server.make_url("/chat/alice"), json={"question": "First?"}) as response:
+                await response.read()
+
+            chat = await chat_server.get_session("alice")
+            assert not chat._turn_lock.locked()
+            assert chat_server.scheduler.stats()["running"] == {}
+
+            # The session takes new questions again
+            async with session.post(test_server.make_url("/chat/alice"), json={"question": "Again?"}) as response:
+                events = (await asyncio.wait_for(response.text(), 5)).split("\n\n")
+            assert json.loads(events[-2].split("data: ", 1)[1]) == {"response": "tok0 tok1 tok2 tok3 tok4"}
+
+    asyncio.run(scenario())
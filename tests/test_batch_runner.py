@@ -0,0 +1,86 @@
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+import ollama
+import pytest
+from batch_runner import BatchRunner, _ends_with_newline, completed_ids, read_prompts
+from benchmarks.fake_ollama import FakeOllamaServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ITEMS = 40
+
+
+@pytest.fixture
+def server():
+    server = FakeOllamaServer(tokens_per_second=100, tokens=5)
+    server.start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def prompts(tmp_path):
+    path = tmp_path / "prompts.jsonl"
+    path.write_text("".join(json.dumps({"id": f"q{n}", "prompt": f"Question {n}?"}) + "\n" for n in range(ITEMS)))
+    return str(path)
+
+
+def lines_of(path):
+    with open(path, encoding="utf-8") as f:
+        return f.read().splitlines()
+
+
+@pytest.mark.parametrize("content, expected", [(b"", True), (b'{"id": "1"}\n', True), (b'{"id": "1"', False)])
+def test_ends_with_newline(tmp_path, content, expected):
+    path = tmp_path / "results.jsonl"
+    path.write_bytes(content)
+    assert _ends_with_newline(str(path)) is expected
+
+
+def test_read_prompts_numbers_items_without_ids(tmp_path):
+    path = tmp_path / "prompts.csv"
+    path.write_text("id,prompt\n,First?\nx,Second?\n")
+
+    assert list(read_prompts(str(path))) == [{"id": "1", "prompt": "First?"}, {"id": "x", "prompt": "Second?"}]
+
+
+def test_completed_ids_skip_failures_and_a_cut_off_line(tmp_path):
+    path = tmp_path / "results.jsonl"
+    path.write_text('{"id": "a", "error": null}\n{"id": "b", "error": "boom"}\n{"id": "c", "err')
+
+    assert completed_ids(str(path)) == {"a"}
+
+
+def test_killed_run_resumes_without_duplicate_or_lost_rows(tmp_path, server, prompts):
+    output = str(tmp_path / "results.jsonl")
+    env = {**os.environ, "OLLAMA_HOST": server.url}
+    process = subprocess.Popen([sys.executable, "batch_runner.py", prompts, "-m", "llama3.2", "-o", output, "-c", "2"],
+                               cwd=ROOT, env=env, stdout=subprocess.DEVNULL)
+    try:
+        deadline = time.monotonic() + 30
+        while not (os.path.exists(output) and len(lines_of(output)) >= 5):
+            assert process.poll() is None, "the run finished before it could be killed"
+            assert time.monotonic() < deadline, "the run produced no results"
+            time.sleep(0.01)
+    finally:
+        process.send_signal(signal.SIGKILL)
+        process.wait()
+    # Cut the last result in half, as if the process died while writing it
+    with open(output, "rb+") as f:
+        f.seek(-20, os.SEEK_END)
+        f.truncate()
+    before = lines_of(output)
+    assert 0 < len(before) < ITEMS
+
+    summary = BatchRunner("llama3.2", client=ollama.Client(host=server.url), concurrency=4).run(prompts, output)
+
+    results = [json.loads(line) for line in lines_of(output)[len(before):]]
+    kept = [json.loads(line) for line in before[:-1]]
+    assert summary["skipped"] == len(kept)
+    assert summary["completed"] == ITEMS - len(kept)
+    assert all(result["error"] is None and result["response"] for result in kept + results)
+    ids = [result["id"] for result in kept + results]
+    assert sorted(ids) == sorted(f"q{n}" for n in range(ITEMS))
@@ -0,0 +1,135 @@
+import threading
+import time
+from datetime import timedelta
+import mongomock
+import pytest
+from cache import LRUCache, MongoCacheStore, ResponseCache, cache_key
+from db import utc_now
+
+
+class Producer:
+    """Produces a response in chunks, pausing after the first until released."""
+
+    def __init__(self, chunks=("Hello", " there."), error=None):
+        self.chunks = chunks
+        self.error = error
+        self.calls = 0
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def __call__(self):
+        self.calls += 1
+        for number, chunk in enumerate(self.chunks):
+            yield chunk
+            if number == 0:
+                self.started.set()
+                assert self.release.wait(5)
+        if self.error is not None:
+            raise self.error
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+def stream_in_threads(cache, key, produce, followers=4):
+    """Start a leader, join `followers` to its generation, then let it finish."""
+    results, errors = {}, {}
+
+    def consume(name):
+        chunks = []
+        try:
+            for chunk in cache.stream(key, produce):
+                chunks.append(chunk)
+        except Exception as e:
+            errors[name] = e
+        results[name] = chunks
+
+    threads = [threading.Thread(target=consume, args=("leader",))]
+    threads[0].start()
+    assert produce.started.wait(5)
+    threads += [threading.Thread(target=consume, args=(f"follower-{n}",)) for n in range(followers)]
+    for thread in threads[1:]:
+        thread.start()
+    wait_for(lambda: cache.hits == followers)
+    produce.release.set()
+    for thread in threads:
+        thread.join(5)
+    return results, errors
+
+
+def test_cache_key_ignores_message_metadata_but_not_options():
+    messages = [{"role": "user", "content": "Hi", "timestamp": 1}]
+    assert cache_key("llama3.2", messages) == cache_key("llama3.2", [{"role": "user", "content": "Hi"}])
+    assert cache_key("llama3.2", messages) != cache_key("llama3.2", messages, {"temperature": 0})
+    assert cache_key("llama3.2", messages) != cache_key("mistral", messages)
+
+
+def test_concurrent_identical_prompts_share_one_generation():
+    cache = ResponseCache()
+    produce = Producer()
+
+    results, errors = stream_in_threads(cache, "key", produce)
+
+    assert produce.calls == 1
+    assert errors == {}
+    assert all("".join(chunks) == "Hello there." for chunks in results.values())
+    assert list(cache.stream("key", produce)) == ["Hello there."]
+    assert (cache.hits, cache.misses) == (5, 1)
+
+
+def test_leader_error_reaches_followers_and_is_not_cached():
+    cache = ResponseCache()
+    produce = Producer(error=RuntimeError("model crashed"))
+
+    results, errors = stream_in_threads(cache, "key", produce)
+
+    assert set(errors) == set(results)
+    assert all(str(error) == "model crashed" for error in errors.values())
+    assert len(cache.memory) == 0
+    retry = Producer(chunks=("Fine.",))
+    retry.release.set()
+    assert list(cache.stream("key", retry)) == ["Fine."]
+    assert retry.calls == 1
+
+
+def test_abandoned_leader_fails_its_followers():
+    cache = ResponseCache()
+    produce = Producer()
+    leader = cache.stream("key", produce)
+    assert next(leader) == "Hello"
+    follower = cache.stream("key", produce)
+    assert next(follower) == "Hello"
+
+    leader.close()
+
+    with pytest.raises(RuntimeError, match="cancelled"):
+        next(follower)
+    assert len(cache.memory) == 0
+
+
+def test_lru_evicts_the_least_recently_used_entry():
+    cache = LRUCache(max_entries=2)
+    cache.set("a", "1")
+    cache.set("b", "2")
+    cache.get("a")
+
+    cache.set("c", "3")
+
+    assert (cache.get("a"), cache.get("b"), cache.get("c")) == ("1", None, "3")
+    assert len(cache) == 2
+
+
+def test_persistent_tier_expires_entries_and_promotes_hits():
+    collection = mongomock.MongoClient()["AI_MODEL"]["response_cache"]
+    store = MongoCacheStore(collection, ttl_seconds=60)
+    cache = ResponseCache(max_entries=2, persistent=store)
+    store.set("fresh", "still good")
+    collection.insert_one({"_id": "stale", "response": "too old", "created_at": utc_now() - timedelta(seconds=61)})
+
+    assert cache.get("stale") is None
+    assert cache.get("fresh") == "still good"
+    assert cache.memory.get("fresh") == "still good"
@@ -0,0 +1,144 @@
+import mongomock
+import pytest
+import db
+from chat import Chat, ContextWindow
+
+MODEL = "llama3.2"
+
+
+class StubClient:
+    """Streams a fixed answer, reporting the given prompt_eval_count on the final chunk."""
+
+    def __init__(self, answer="Hello there.", evaluated=None):
+        self.answer = answer
+        self.evaluated = evaluated
+        self.requests = []
+
+    def chat(self, model, messages, stream=False, **kwargs):
+        self.requests.append(messages)
+        yield {"message": {"role": "assistant", "content": self.answer}, "done": False}
+        done = {"message": {"role": "assistant", "content": ""}, "done": True}
+        if self.evaluated is not None:
+            done["prompt_eval_count"] = self.evaluated
+        yield done
+
+
+@pytest.fixture
+def mongo_client(monkeypatch):
+    client = mongomock.MongoClient()
+    monkeypatch.setattr(db, "MongoClient", lambda url: client)
+    return client
+
+
+def make_chat(client, **kwargs):
+    return Chat(MODEL, "mongodb://localhost:27017/", "AI_MODEL", "chat_history", write_behind=False, sinks=[],
+                client=client, **kwargs)
+
+
+def test_reused_tokens_come_from_the_servers_prompt_eval_count(mongo_client):
+    client = StubClient(evaluated=5)
+    chat = make_chat(client)
+
+    chat.process_question("What is the capital of France?")
+
+    prompt_tokens = sum(ContextWindow.count_tokens(message) for message in client.requests[0])
+    assert chat.prompt_stats["prompt_eval_count"] == 5
+    assert chat.prompt_stats["reused_tokens"] == prompt_tokens - 5
+
+
+def test_reused_tokens_are_estimated_when_the_server_omits_the_count(mongo_client):
+    client = StubClient()
+    chat = make_chat(client)
+
+    chat.process_question("What is the capital of France?")
+    assert chat.prompt_stats == {"prompt_eval_count": None, "reused_messages": 0, "reused_tokens": 0}
+
+    chat.process_question("And of Spain?")
+    # The system prompt, the first question and its answer are still in the server's cache
+    shared = client.requests[1][:3]
+    assert chat.prompt_stats["reused_messages"] == 3
+    assert chat.prompt_stats["reused_tokens"] == sum(ContextWindow.count_tokens(message) for message in shared)
+
+
+def fill(window, turns, words=20):
+    for turn in range(turns):
+        window.append({"role": "user", "content": f"question {turn} " + "word " * words})
+        window.append({"role": "assistant", "content": f"answer {turn} " + "word " * words})
+
+
+def history_tokens(selected):
+    return sum(ContextWindow.count_tokens(message) for message in selected[1:])
+
+
+def test_context_window_always_keeps_the_system_prompt():
+    window = ContextWindow("Be brief.", context_length=300, reserve_tokens=100)
+    assert window.select() == [{"role": "system", "content": "Be brief."}]
+
+    fill(window, 20)
+    selected = window.select()
+
+    assert selected[0] == {"role": "system", "content": "Be brief."}
+    assert selected[-1] is window.messages[-1]
+    assert history_tokens(selected) <= window.budget
+
+
+def test_context_window_truncates_an_oversized_latest_message_keeping_its_end():
+    window = ContextWindow(context_length=200, reserve_tokens=50)
+    fill(window, 2)
+    window.append({"role": "user", "content": "pasted document " * 100 + "so what is the summary?"})
+
+    selected = window.select()
+
+    assert len(selected) == 2
+    assert selected[1]["content"].startswith("[...] ")
+    assert selected[1]["content"].endswith("so what is the summary?")
+    assert ContextWindow.count_tokens(selected[1]) <= window.budget
+    assert window.messages[-1]["content"].startswith("pasted document")
+
+
+def test_context_window_prefix_is_stable_between_trims():
+    window = ContextWindow(context_length=600, reserve_tokens=100)
+    previous = None
+    trims = 0
+    for turn in range(40):
+        window.append({"role": "user", "content": f"question {turn} " + "word " * 20})
+        selected = window.select()
+        assert selected[0] == window.system_message
+        assert history_tokens(selected) <= window.budget
+        if previous is not None and selected[:len(previous)] != previous:
+            trims += 1
+            # A trim drops a chunk of the oldest messages, not just the one that no longer fits
+            assert history_tokens(selected) <= window.budget - int(window.budget * window.trim_fraction) + \
+                ContextWindow.count_tokens(selected[-1])
+        window.append({"role": "assistant", "content": f"answer {turn} " + "word " * 20})
+        previous = selected
+
+    # Sliding by one exchange at a time would change the prefix on nearly every turn
+    assert 0 < trims <= 40 // 3
+
+
+def test_context_window_places_recalled_messages_before_the_latest():
+    window = ContextWindow(context_length=600, reserve_tokens=100)
+    fill(window, 2)
+    window.append({"role": "user", "content": "What did I say about cats?"})
+
+    selected = window.select([{"role": "user", "content": "I like cats."}])
+    oversized = window.select([{"role": "user", "content": "cats " * 500}])
+
+    assert selected[-2] == {"role": "system", "content": "Relevant earlier conversation:\nuser: I like cats."}
+    assert selected[-1]["content"] == "What did I say about cats?"
+    assert oversized[-2]["content"].startswith("[...] ")
+    assert ContextWindow.count_tokens(oversized[-2]) <= int(window.budget * window.memory_fraction)
+
+
+def test_loaded_history_is_sent_as_role_and_content_only(mongo_client):
+    make_chat(StubClient()).process_question("What is the capital of France?")
+    client = StubClient()
+    chat = make_chat(client)
+
+    chat.process_question("And of Spain?")
+
+    assert chat.oldest_timestamp is not None
+    assert [m["content"] for m in client.requests[0]][1:] == \
+        ["What is the capital of France?", "Hello there.", "And of Spain?"]
+    assert all(set(message) == {"role", "content"} for message in client.requests[0])
@@ -0,0 +1,130 @@
+import os
+import threading
+from datetime import timedelta
+import mongomock
+import pytest
+from bson import json_util
+from pymongo.errors import AutoReconnect
+from db import Mongo, WriteBehindQueue, journal_path_for, utc_now
+
+MODEL = "llama3.2"
+
+
+def exchange(number, session="alice", start=None):
+    start = start or utc_now()
+    at = start + timedelta(seconds=number)
+    return ({"role": "user", "content": f"question {number}", "model": MODEL, "session": session, "timestamp": at},
+            {"role": "assistant", "content": f"answer {number}", "model": MODEL, "session": session,
+             "timestamp": at + timedelta(milliseconds=500)})
+
+
+def contents(mongo, session="alice"):
+    return [message["content"] for message in mongo.get_history(MODEL, session)]
+
+
+@pytest.fixture
+def mongo(tmp_path):
+    mongo = Mongo(client=mongomock.MongoClient(), write_behind=True, journal_path=str(tmp_path / "test.journal"))
+    yield mongo
+    mongo.writer.close()
+
+
+def test_flush_writes_queued_messages(mongo):
+    start = utc_now()
+    for number in range(3):
+        mongo.save_into_db(*exchange(number, start=start))
+    mongo.flush()
+    assert contents(mongo) == ["question 0", "answer 0", "question 1", "answer 1", "question 2", "answer 2"]
+
+
+def test_outage_is_journaled_and_replayed_once(mongo, monkeypatch):
+    start = utc_now()
+    mongo.save_into_db(*exchange(0, start=start))
+    mongo.flush()
+
+    push = mongo._push
+    calls = []
+
+    def flaky_push(model, session, documents):
+        # The first write lands but its reply is lost, so it is journaled although stored;
+        # after that the server is down
+        calls.append(len(documents))
+        if len(calls) == 1:
+            push(model, session, documents)
+        raise AutoReconnect("connection refused")
+
+    monkeypatch.setattr(mongo, "_push", flaky_push)
+    mongo.save_into_db(*exchange(1, start=start))
+    mongo.flush()
+    # Replaying finds the first exchange already stored, so only the second stays journaled
+    mongo.save_into_db(*exchange(2, start=start))
+    mongo.flush()
+    with open(mongo.writer.journal_path, encoding="utf-8") as f:
+        assert [json_util.loads(line)["content"] for line in f] == ["question 2", "answer 2"]
+
+    monkeypatch.setattr(mongo, "_push", push)
+    mongo.save_into_db(*exchange(3, start=start))
+    mongo.flush()
+
+    assert contents(mongo) == [f"{role} {number}" for number in range(4) for role in ("question", "answer")]
+    assert not os.path.exists(mongo.writer.journal_path)
+
+
+def test_unreadable_journal_lines_are_skipped(mongo):
+    user, assistant = exchange(0)
+    with open(mongo.writer.journal_path, "w", encoding="utf-8") as f:
+        f.write(json_util.dumps(dict(user, _id=json_util.ObjectId())) + "\n")
+        f.write('{"role": "assistant", "content": \n')
+    mongo.save_into_db(*exchange(1, start=user["timestamp"]))
+    mongo.flush()
+
+    assert contents(mongo) == ["question 0", "question 1", "answer 1"]
+    assert not os.path.exists(mongo.writer.journal_path)
+
+
+def test_writer_survives_unexpected_errors(tmp_path):
+    stored = []
+    failures = iter([RuntimeError("boom")])
+
+    def write(documents, skip_existing=False):
+        error = next(failures, None)
+        if error:
+            raise error
+        stored.extend(documents)
+
+    writer = WriteBehindQueue(write, str(tmp_path / "test.journal"), flush_interval=60)
+    try:
+        writer.put({"n": 1})
+        flushed = threading.Thread(target=writer.flush)
+        flushed.start()
+        flushed.join(5)
+        assert not flushed.is_alive()
+
+        writer.put({"n": 2})
+        writer.flush()
+        assert stored == [{"n": 2}]
+    finally:
+        writer.close()
+
+
+def test_close_flushes_and_stops_the_writer(tmp_path):
+    stored = []
+    writer = WriteBehindQueue(lambda documents, skip_existing=False: stored.extend(documents),
+                              str(tmp_path / "test.journal"), flush_interval=60)
+    writer.put({"n": 1}, {"n": 2})
+    writer.close()
+    assert stored == [{"n": 1}, {"n": 2}]
+    assert not writer._thread.is_alive()
+    writer.flush()
+
+
+def test_each_collection_has_its_own_journal():
+    client = mongomock.MongoClient()
+    first = Mongo(client=client, database="AI_MODEL", collection="chat_history", write_behind=True)
+    second = Mongo(client=client, database="AI_MODEL", collection="other_history", write_behind=True)
+    try:
+        assert first.writer.journal_path == journal_path_for("AI_MODEL", "chat_history")
+        assert first.writer.journal_path != second.writer.journal_path
+    finally:
+        first.writer.close()
+        second.writer.close()
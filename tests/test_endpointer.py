@@ -0,0 +1,171 @@
+import os
+import wave
+import numpy as np
+import pytest
+import microphone
+from microphone import EnergyVAD, Endpointer, frame_energy
+from stt import SpeechRecognizer, read_wav_frames, transcribe_file
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+# speech.wav in 30 ms frames: noise 0-19, speech 20-39, a pause 40-49, speech 50-59, noise 60-89
+SPEECH_START, SPEECH_END = 20, 60
+
+
+def fixture(name):
+    return os.path.join(FIXTURES, name)
+
+
+def frames_of(name):
+    frames, _ = read_wav_frames(fixture(name))
+    return frames
+
+
+class FakeClock:
+    """Stands in for time.monotonic; each frame read advances it by one frame."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def reader(frames, clock=None, frame_seconds=0.03):
+    """Returns a read(timeout) callable over a list of frames, like FrameRingBuffer.get."""
+    source = iter(frames)
+    timeouts = []
+
+    def read(timeout):
+        timeouts.append(timeout)
+        if clock is not None:
+            clock.now += frame_seconds
+        return next(source, None)
+
+    read.timeouts = timeouts
+    return read
+
+
+def test_read_wav_frames_splits_into_fixed_frames():
+    frames, samplerate = read_wav_frames(fixture("speech.wav"))
+    assert samplerate == 8000
+    assert len(frames) == 90
+    assert {len(frame) for frame in frames} == {8000 * 30 // 1000 * 2}
+
+
+def test_read_wav_frames_rejects_stereo(tmp_path):
+    path = str(tmp_path / "stereo.wav")
+    with wave.open(path, "wb") as wav:
+        wav.setnchannels(2)
+        wav.setsampwidth(2)
+        wav.setframerate(8000)
+        wav.writeframes(b"\0" * 960)
+    with pytest.raises(ValueError):
+        read_wav_frames(path)
+
+
+def test_vad_separates_speech_from_noise():
+    frames = frames_of("speech.wav")
+    vad = EnergyVAD()
+    vad.calibrate(frames[:10])
+    assert frame_energy(frames[0]) < 100
+    assert [vad.is_speech(frame) for frame in frames[18:23]] == [False, False, True, True, True]
+    assert not vad.is_speech(frames[45])
+
+
+def test_vad_noise_floor_follows_silence_only():
+    vad = EnergyVAD(adapt_rate=0.5)
+    vad.noise_floor = 10.0
+    loud_noise = (np.full(240, 60, dtype=np.int16)).tobytes()
+    assert not vad.is_speech(loud_noise)
+    assert vad.noise_floor == pytest.approx(35.0)
+    floor = vad.noise_floor
+    assert vad.is_speech(frames_of("speech.wav")[SPEECH_START])
+    assert vad.noise_floor == floor
+
+
+def test_utterance_starts_with_preroll_and_ends_after_trailing_silence():
+    frames = frames_of("speech.wav")
+    endpointer = Endpointer()
+    utterance = list(endpointer.utterance(reader(frames)))
+
+    # Speech is confirmed on its third frame; the pre-roll reaches back 300 ms from there
+    first = SPEECH_START + endpointer.start_frames - endpointer.preroll_frames
+    # The 300 ms pause does not end it; 600 ms of trailing silence does
+    last = SPEECH_END + endpointer.silence_frames - 1
+    assert utterance == frames[first:last + 1]
+
+
+def test_short_click_does_not_start_an_utterance():
+    assert list(Endpointer().utterance(reader(frames_of("click.wav")))) == []
+
+
+def test_utterance_times_out_without_speech(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(microphone.time, "monotonic", clock)
+    endless_silence = frames_of("silence.wav") * 100
+    read = reader(endless_silence, clock)
+
+    assert list(Endpointer().utterance(read, timeout=0.3)) == []
+    # Each read is given the time left, and reading stops at the deadline
+    assert len(read.timeouts) == 10
+    assert read.timeouts[0] == pytest.approx(0.3)
+    assert all(earlier > later for earlier, later in zip(read.timeouts, read.timeouts[1:]))
+
+
+def test_utterance_stops_when_the_source_runs_dry():
+    frames = frames_of("speech.wav")[:SPEECH_START + 5]
+    utterance = list(Endpointer().utterance(reader(frames)))
+    assert utterance[-1] == frames[-1]
+
+
+def test_utterance_is_cut_at_max_phrase_length():
+    speech = frames_of("speech.wav")[SPEECH_START:SPEECH_START + 20] * 10
+    endpointer = Endpointer(max_phrase_seconds=1.5)
+    assert len(list(endpointer.utterance(reader(speech)))) == endpointer.max_frames == 50
+
+
+class CountingRecognizer(SpeechRecognizer):
+    def reset(self):
+        self.frames = 0
+
+    def accept(self, frame):
+        self.frames += 1
+        return f"{self.frames} frames"
+
+    def finish(self):
+        return f"heard {self.frames} frames"
+
+
+def test_transcribe_file_with_endpointing_feeds_only_the_utterance():
+    recognizer = CountingRecognizer(8000)
+    partials = []
+    assert transcribe_file(fixture("speech.wav"), recognizer, endpoint=False) == "heard 90 frames"
+    assert transcribe_file(fixture("speech.wav"), recognizer, endpoint=True, on_partial=partials.append) == \
+        "heard 67 frames"
+    assert partials[-1] == "67 frames"
+
+
+@pytest.fixture
+def vosk_recognizer():
+    pytest.importorskip("vosk")
+    model = os.environ.get("VOSK_MODEL")
+    if not model or not os.path.isdir(model):
+        pytest.skip("set VOSK_MODEL to a Vosk model directory to run the Vosk tests")
+    from stt import VoskRecognizer
+    return VoskRecognizer(model, samplerate=8000)
+
+
+def test_vosk_hears_no_words_in_silence(vosk_recognizer):
+    partials = []
+    assert transcribe_file(fixture("silence.wav"), vosk_recognizer, on_partial=partials.append) is None
+    assert partials == []
+
+
+def test_vosk_resets_between_utterances(vosk_recognizer):
+    partials = []
+    first = transcribe_file(fixture("speech.wav"), vosk_recognizer, endpoint=True, on_partial=partials.append)
+    second = transcribe_file(fixture("speech.wav"), vosk_recognizer, endpoint=True)
+
+    # The fixture's tones may or may not be heard as a word, but never as the previous utterance too
+    assert first == second
+    assert all(isinstance(partial, str) and partial for partial in partials)
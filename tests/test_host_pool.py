@@ -0,0 +1,126 @@
+import socket
+import pytest
+from benchmarks.fake_ollama import FakeOllamaServer
+from host_pool import OllamaHostPool
+
+MESSAGES = [{"role": "system", "content": "Be brief."}, {"role": "user", "content": "Hello"}]
+
+
+def dead_host():
+    """Returns the URL of a local port with nothing listening on it."""
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    return f"http://127.0.0.1:{port}"
+
+
+@pytest.fixture
+def server():
+    server = FakeOllamaServer(tokens_per_second=0, tokens=5)
+    server.start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def make_pool():
+    pools = []
+
+    def make(hosts):
+        pool = OllamaHostPool(hosts, health_interval=3600)
+        pools.append(pool)
+        return pool
+
+    yield make
+    for pool in pools:
+        pool.close()
+
+
+def test_health_check_routes_around_a_down_host(server, make_pool):
+    pool = make_pool([dead_host(), server.url])
+    down, up = pool.endpoints
+    assert not down.healthy and up.healthy
+    assert pool.candidates("fake") == [up, down]
+
+    response = pool.chat("fake", MESSAGES)
+    assert response["message"]["content"] == "tok0 tok1 tok2 tok3 tok4 "
+    assert "fake" in up.resident
+
+
+def test_request_fails_over_when_a_host_goes_down(server, make_pool, capsys):
+    pool = make_pool([dead_host(), server.url])
+    down, up = pool.endpoints
+    # The host was up at the last health check, so it is tried first
+    down.healthy = True
+
+    assert pool.generate("fake", "Hi")["response"] == "tok0 tok1 tok2 tok3 tok4 "
+    assert not down.healthy and up.healthy
+    assert down.in_flight == up.in_flight == 0
+    assert f"Ollama host {down.host} failed" in capsys.readouterr().out
+
+
+def test_stream_continues_on_the_next_host(server, make_pool):
+    failing = FakeOllamaServer(tokens_per_second=0, tokens=5)
+    failing.fail_after = 2
+    failing.start()
+    try:
+        pool = make_pool([failing.url, server.url])
+        first, second = pool.endpoints
+        second.in_flight = 1  # Prefer the failing host
+
+        parts = [part["message"]["content"] for part in pool.chat("fake", MESSAGES, stream=True)]
+        # The second host writes the answer from the start; the part already streamed is not repeated
+        assert "".join(parts) == "tok0 tok1 tok2 tok3 tok4 "
+        assert not first.healthy
+        # The second host was asked to continue the partial answer
+        assert server.cached["fake"][-2] == ("assistant", "tok0 tok1")
+    finally:
+        failing.stop()
+
+
+def test_every_host_down_raises_connection_error(make_pool):
+    pool = make_pool([dead_host(), dead_host()])
+    with pytest.raises(ConnectionError, match="No Ollama host could serve the request"):
+        pool.chat("fake", MESSAGES)
+
+
+class StubClient:
+    """Streams fixed chunks, optionally dropping the connection after some of them."""
+
+    def __init__(self, chunks, fail_after=None):
+        self.chunks = chunks
+        self.fail_after = fail_after
+        self.requests = []
+
+    def chat(self, model, messages, stream=True, **kwargs):
+        self.requests.append(messages)
+        for i, chunk in enumerate(self.chunks):
+            yield {"message": {"role": "assistant", "content": chunk}, "done": False}
+            if i + 1 == self.fail_after:
+                raise ConnectionError("connection dropped")
+        yield {"message": {"role": "assistant", "content": ""}, "done": True}
+
+
+def test_stream_keeps_the_text_of_a_host_that_continues_the_answer(make_pool, capsys):
+    pool = make_pool([dead_host(), dead_host()])
+    first, second = pool.endpoints
+    first.client = StubClient(["The sky ", "is "], fail_after=2)
+    second.client = StubClient(["blue", "."])
+    first.healthy = second.healthy = True
+    second.in_flight = 1
+
+    parts = [part["message"]["content"] for part in pool.chat("fake", MESSAGES, stream=True)]
+    assert "".join(parts) == "The sky is blue."
+    assert second.client.requests[0][-1] == {"role": "assistant", "content": "The sky is "}
+
+
+def test_stream_drops_a_repeat_split_across_chunks(make_pool, capsys):
+    pool = make_pool([dead_host(), dead_host()])
+    first, second = pool.endpoints
+    first.client = StubClient(["The sky ", "is "], fail_after=2)
+    second.client = StubClient(["The", " sky i", "s blue", "."])
+    first.healthy = second.healthy = True
+    second.in_flight = 1
+
+    parts = [part["message"]["content"] for part in pool.chat("fake", MESSAGES, stream=True)]
+    assert "".join(parts) == "The sky is blue."
@@ -0,0 +1,75 @@
+import math
+import threading
+import pytest
+from keep_alive import ModelKeepAlive, parse_keep_alive
+
+
+class StubClient:
+    def __init__(self):
+        self.calls = []
+        self.called = threading.Event()
+
+    def generate(self, model, prompt="", **kwargs):
+        self.calls.append(kwargs)
+        self.called.set()
+        return {"response": ""}
+
+
+@pytest.mark.parametrize("value, seconds", [
+    (600, 600), (2.5, 2.5), ("300", 300), ("5m", 300), ("1h30m", 5400), ("1.5s", 1.5), ("250ms", 0.25),
+    ("0", 0), (0, 0), (-1, math.inf), ("-1", math.inf), ("-5m", math.inf),
+])
+def test_parse_keep_alive(value, seconds):
+    assert parse_keep_alive(value) == seconds
+
+
+@pytest.mark.parametrize("value", ["high", "5x", "m", "", None, True, "1h-5m"])
+def test_parse_keep_alive_rejects_other_values(value):
+    with pytest.raises(ValueError):
+        parse_keep_alive(value)
+
+
+def test_invalid_keep_alive_is_rejected_up_front():
+    with pytest.raises(ValueError):
+        ModelKeepAlive("llama3.2", keep_alive="soon", client=StubClient())
+
+
+def test_warm_up_looks_up_options_in_the_background():
+    client = StubClient()
+    keep_alive = ModelKeepAlive("llama3.2", keep_alive="10m", client=client)
+    looked_up = threading.Event()
+
+    def options():
+        looked_up.set()
+        return {"num_ctx": 8192}
+
+    keep_alive.warm_up(options=options)
+    assert keep_alive.wait_until_ready(5)
+    assert looked_up.is_set()
+    assert client.calls == [{"keep_alive": "10m", "options": {"num_ctx": 8192}}]
+
+    keep_alive.release()
+    assert client.calls[-1] == {"keep_alive": 0, "options": {"num_ctx": 8192}}
+
+
+def test_active_session_is_refreshed():
+    client = StubClient()
+    keep_alive = ModelKeepAlive("llama3.2", keep_alive=2, idle_timeout=60, client=client)
+    keep_alive.start()
+    try:
+        assert client.called.wait(5)
+        assert client.calls[0]["keep_alive"] == 2
+    finally:
+        keep_alive.stop(release=False)
+
+
+def test_indefinite_keep_alive_is_not_refreshed_but_released_when_idle():
+    client = StubClient()
+    keep_alive = ModelKeepAlive("llama3.2", keep_alive=-1, idle_timeout=0, client=client)
+    keep_alive._resident = True
+    keep_alive.start()
+    try:
+        assert client.called.wait(5)
+        assert client.calls == [{"keep_alive": 0, "options": None}]
+    finally:
+        keep_alive.stop(release=False)
@@ -0,0 +1,167 @@
+import threading
+import numpy as np
+import pytest
+from memory import LongTermMemory
+from semantic_cache import SemanticCache
+from vector_store import VectorIndex
+
+# Orthogonal directions, so each topic matches only itself
+TOPICS = {name: np.eye(8, dtype=np.float32)[i] for i, name in enumerate(["cats", "tea", "rust", "chess", "rain"])}
+
+
+def vector_for(text):
+    """Embed a text as the topics it mentions; an unknown text cannot be embedded."""
+    topics = [vector for name, vector in TOPICS.items() if name in text]
+    if not topics:
+        raise KeyError(text)
+    return sum(topics)
+
+
+class StubEmbedder:
+    def __init__(self):
+        self.batches = []
+
+    def embed(self, model, input):
+        self.batches.append(list(input))
+        return {"embeddings": [vector_for(text).tolist() for text in input]}
+
+
+def message(content, model="llama3.2", session="default", role="user"):
+    return {"role": role, "content": content, "model": model, "session": session}
+
+
+@pytest.fixture
+def memory():
+    return LongTermMemory(client=StubEmbedder(), k=2, min_score=0.5)
+
+
+def test_recall_only_sees_the_same_model_and_session(memory):
+    memory.add_messages([message("cats are great", session="alice"), message("cats sleep a lot", session="bob"),
+                         message("cats purr", model="mistral", session="alice")])
+    memory.flush()
+
+    assert memory.recall("llama3.2", "cats?", session="alice") == [{"role": "user", "content": "cats are great"}]
+    assert memory.recall("llama3.2", "cats?", session="bob") == [{"role": "user", "content": "cats sleep a lot"}]
+    assert memory.recall("mistral", "cats?", session="alice") == [{"role": "user", "content": "cats purr"}]
+    assert memory.recall("llama3.2", "cats?") == []
+
+
+def test_recall_drops_messages_below_the_threshold(memory):
+    memory.add_messages([message("tea is hot"), message("rust and tea")])
+    memory.flush()
+
+    # "rust and tea" scores cos 45° ≈ 0.71 against tea and rust, "tea is hot" 0 against rust
+    assert [m["content"] for m in memory.recall("llama3.2", "tea")] == ["tea is hot", "rust and tea"]
+    assert [m["content"] for m in memory.recall("llama3.2", "rust")] == ["rust and tea"]
+    memory.min_score = 0.9
+    assert [m["content"] for m in memory.recall("llama3.2", "rust")] == []
+
+
+def test_recall_returns_k_messages_after_skipping_excluded_ones(memory):
+    memory.add_messages([message("chess openings"), message("chess and rain"), message("chess and tea"),
+                         message("chess endgames")])
+    memory.flush()
+
+    recalled = [m["content"] for m in memory.recall("llama3.2", "chess", exclude=["chess openings", "chess endgames"])]
+
+    assert sorted(recalled) == ["chess and rain", "chess and tea"]
+
+
+def test_indexer_embeds_queued_messages_in_batches():
+    embedder = StubEmbedder()
+    entered, release = threading.Event(), threading.Event()
+    embed = embedder.embed
+
+    def blocking_embed(model, input):
+        entered.set()
+        release.wait(5)
+        return embed(model, input)
+
+    embedder.embed = blocking_embed
+    memory = LongTermMemory(client=embedder, batch_size=3)
+
+    memory.add_messages([message("cats")])
+    assert entered.wait(5)
+    # The indexer is now blocked on the first batch while the rest queue up
+    memory.add_messages([message(content) for content in ["", "tea", "rust", "chess", "rain"]])
+    release.set()
+    memory.flush()
+
+    assert len(memory.index) == 5
+    assert [len(batch) for batch in embedder.batches] == [1, 3, 1]
+
+
+def test_indexer_survives_an_embedding_error(memory):
+    memory.add_messages([message("unknown topic")])
+    memory.flush()
+    memory.add_messages([message("cats are great")])
+    memory.flush()
+
+    assert len(memory.index) == 1
+    assert memory.recall("llama3.2", "cats") == [{"role": "user", "content": "cats are great"}]
+
+
+def test_groups_survive_save_and_load(tmp_path):
+    path = str(tmp_path / "memory")
+    memory = LongTermMemory(client=StubEmbedder(), path=path, capacity=16)
+    memory.add_messages([message("cats are great"), message("cats sleep a lot", session="bob")])
+    memory.flush()
+    memory.save()
+
+    reloaded = LongTermMemory(client=StubEmbedder(), path=path, capacity=16)
+
+    assert len(reloaded.index) == 2
+    assert reloaded.recall("llama3.2", "cats", session="bob") == [{"role": "user", "content": "cats sleep a lot"}]
+
+
+def test_grouped_search_matches_a_full_scan():
+    rng = np.random.default_rng(0)
+    index = VectorIndex(capacity=500, dtype=np.float16)
+    for row in range(500):
+        index.add(rng.standard_normal(16), row, group=f"session-{row % 7}")
+    query = rng.standard_normal(16)
+
+    grouped = index.search(query, k=5, block_size=16, group="session-3")
+    everything = [match for match in index.search(query, k=500) if match[2] % 7 == 3][:5]
+
+    assert [row for row, _, _ in grouped] == [row for row, _, _ in everything]
+    assert index.search(query, group="session-9") == []
+
+
+def test_full_index_evicts_the_least_recently_used_entry():
+    index = VectorIndex(capacity=2)
+    first = index.add(TOPICS["cats"], "cats", group="a")
+    index.add(TOPICS["tea"], "tea", group="b")
+    index.touch(first)
+
+    index.add(TOPICS["rust"], "rust", group="c")
+
+    assert sorted(index.payloads) == ["cats", "rust"]
+    assert index.search(TOPICS["tea"], group="b") == []
+
+
+def test_semantic_cache_answers_paraphrases_of_the_same_model_only():
+    cache = SemanticCache(client=StubEmbedder(), threshold=0.9)
+    calls = []
+
+    def produce(answer):
+        def chunks():
+            calls.append(answer)
+            yield from answer
+        return chunks
+
+    assert list(cache.stream("llama3.2", "cats?", produce(["they ", "purr"]))) == ["they ", "purr"]
+    assert list(cache.stream("llama3.2", "cats, really?", produce(["unused"]))) == ["they purr"]
+    assert list(cache.stream("mistral", "cats?", produce(["meow"]))) == ["meow"]
+    # cos 45° is below the threshold
+    assert list(cache.stream("llama3.2", "cats and tea", produce(["both"]))) == ["both"]
+
+    assert calls == [["they ", "purr"], ["meow"], ["both"]]
+    assert (cache.hits, cache.misses) == (1, 3)
+
+
+def test_semantic_cache_falls_back_when_embedding_fails():
+    cache = SemanticCache(client=StubEmbedder())
+
+    assert list(cache.stream("llama3.2", "unknown topic", lambda: iter(["fresh"]))) == ["fresh"]
+    assert len(cache.index) == 0
@@ -0,0 +1,110 @@
+from datetime import datetime, timedelta, timezone
+import mongomock
+import pytest
+from bson import ObjectId
+import migrate_history
+from db import Mongo
+from migrate_history import build_buckets, migrate
+
+MODEL = "llama3.2"
+START = datetime(2024, 5, 1, tzinfo=timezone.utc)
+
+
+def message(number, session="alice", model=MODEL, timestamp=True, **fields):
+    document = {"role": "user" if number % 2 == 0 else "assistant", "content": f"message {number}",
+                "model": model, "session": session, **fields}
+    if timestamp:
+        document["timestamp"] = START + timedelta(seconds=number)
+    return document
+
+
+@pytest.fixture
+def client(monkeypatch):
+    client = mongomock.MongoClient()
+    monkeypatch.setattr(migrate_history, "MongoClient", lambda url: client)
+    return client
+
+
+def history(client, session="alice", limit=1000):
+    mongo = Mongo(client=client)
+    return [m["content"] for m in mongo.get_history(MODEL, session, limit=limit)]
+
+
+def test_buckets_close_at_the_message_limit_and_leave_the_last_open(client):
+    client.AI_MODEL.chat_history.insert_many([message(n) for n in range(250)])
+
+    counts = migrate(bucket_messages=100)
+
+    buckets = list(client.AI_MODEL.chat_history.find().sort("first", 1))
+    assert counts == {"messages": 250, "buckets": 3}
+    assert [b["count"] for b in buckets] == [100, 100, 50]
+    assert [b["full"] for b in buckets] == [True, True, False]
+    assert [b["first"] for b in buckets] == [b["messages"][0]["timestamp"] for b in buckets]
+
+
+def test_buckets_close_at_the_byte_limit():
+    messages = [{**message(n), "_id": ObjectId()} for n in range(10)]
+
+    buckets = list(build_buckets(messages, bucket_messages=100, bucket_bytes=200))
+
+    assert all(b["bytes"] <= 200 for b in buckets)
+    assert sum(b["count"] for b in buckets) == 10
+    assert [b["full"] for b in buckets] == [True] * (len(buckets) - 1) + [False]
+
+
+def test_sessions_and_models_get_their_own_buckets_in_order(client):
+    documents = [message(n, session="bob") for n in range(3)] + [message(n) for n in range(5, 0, -1)]
+    documents.append(message(9, model="mistral"))
+    client.AI_MODEL.chat_history.insert_many(documents)
+
+    migrate()
+
+    buckets = client.AI_MODEL.chat_history
+    assert buckets.count_documents({}) == 3
+    assert history(client) == [f"message {n}" for n in range(1, 6)]
+    assert history(client, session="bob") == ["message 0", "message 1", "message 2"]
+    assert buckets.find_one({"model": "mistral"})["count"] == 1
+
+
+def test_legacy_messages_without_timestamps_keep_their_insertion_order(client):
+    # Inserted within the same second, so their ObjectIds share a generation time and differ only in the counter
+    second = int(START.timestamp())
+    documents = [message(n, timestamp=False, _id=ObjectId(f"{second:08x}{n:016x}")) for n in range(3)]
+    documents.append(message(3))
+    documents[-1]["timestamp"] = START + timedelta(seconds=5)
+    client.AI_MODEL.chat_history.insert_many(documents)
+
+    migrate()
+
+    entries = client.AI_MODEL.chat_history.find_one()["messages"]
+    timestamps = [entry["timestamp"] for entry in entries]
+    assert [entry["content"] for entry in entries] == ["message 0", "message 1", "message 2", "message 3"]
+    assert timestamps == sorted(timestamps) and len(set(timestamps)) == 4
+    assert history(client) == ["message 0", "message 1", "message 2", "message 3"]
+
+
+def test_original_documents_are_kept_as_a_backup(client):
+    client.AI_MODEL.chat_history.insert_many([message(n) for n in range(4)])
+
+    migrate()
+
+    assert client.AI_MODEL.chat_history_messages.count_documents({}) == 4
+    assert "chat_history_buckets" not in client.AI_MODEL.list_collection_names()
+
+
+def test_migration_refuses_to_run_twice(client):
+    client.AI_MODEL.chat_history.insert_many([message(n) for n in range(4)])
+    migrate()
+
+    with pytest.raises(ValueError, match="already holds bucket documents"):
+        migrate()
+    assert client.AI_MODEL.chat_history_messages.count_documents({}) == 4
+
+
+def test_migration_refuses_to_overwrite_an_existing_backup(client):
+    client.AI_MODEL.chat_history.insert_many([message(n) for n in range(4)])
+    client.AI_MODEL.chat_history_messages.insert_one({"role": "user", "content": "older backup"})
+
+    with pytest.raises(ValueError, match="already exists"):
+        migrate()
+    assert client.AI_MODEL.chat_history.count_documents({}) == 4
@@ -0,0 +1,86 @@
+import random
+import pytest
+from model_search import ModelSearchIndex, _RangeMin, trigrams
+
+CATALOG = {
+    "llama3.2": ["1b", "3b"],
+    "qwen2.5": ["0.5b", "7b", "72b"],
+    "deepseek-r1": ["7b", "70b"],
+    "nomic-embed-text": [],
+    "llama3.1": ["8b", "405b"],
+    "mistral": ["7b"],
+}
+
+
+@pytest.fixture
+def index():
+    return ModelSearchIndex.from_catalog(CATALOG)
+
+
+def test_trigrams_weight_the_start_of_the_text():
+    assert trigrams("qwen") == {" qw", "qwe", "wen"}
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 8, 33])
+def test_range_min_finds_the_smallest_value_of_every_range(size):
+    values = random.Random(size).sample(range(1000), size)
+    table = _RangeMin(values)
+
+    for lo in range(size):
+        for hi in range(lo + 1, size + 1):
+            assert values[table.argmin(lo, hi)] == min(values[lo:hi])
+
+
+def test_range_min_yields_a_range_in_ascending_order():
+    values = random.Random(0).sample(range(1000), 50)
+    table = _RangeMin(values)
+
+    assert list(table.smallest(10, 40)) == sorted(values[10:40])
+    assert list(table.smallest(5, 5)) == []
+
+
+def test_range_min_stops_early_without_sorting_the_range():
+    table = _RangeMin(list(range(10000, 0, -1)))
+    smallest = table.smallest(0, 10000)
+
+    assert [next(smallest) for _ in range(3)] == [1, 2, 3]
+
+
+def test_exact_name_comes_before_prefix_matches_and_variants(index):
+    assert index.search("llama3.2")[:3] == ["llama3.2", "llama3.2:1b", "llama3.2:3b"]
+    assert index.search("llama", limit=3) == ["llama3.2", "llama3.1", "llama3.2:1b"]
+
+
+def test_tags_are_searchable_as_variants(index):
+    assert index.search("qwen2.5:7")[:2] == ["qwen2.5:7b", "qwen2.5:72b"]
+    assert index.search("70b") == ["deepseek-r1:70b"]
+
+
+def test_token_prefix_and_substring_tiers(index):
+    assert index.search("r1") == ["deepseek-r1", "deepseek-r1:7b", "deepseek-r1:70b"]
+    assert index.search("embed") == ["nomic-embed-text"]
+    assert index.search("seek")[:1] == ["deepseek-r1"]
+
+
+def test_typos_fall_back_to_shared_trigrams(index):
+    assert index.search("mistrl")[:1] == ["mistral"]
+    assert index.search("deepsek")[:1] == ["deepseek-r1"]
+    assert index.search("lama3.2")[:1] == ["llama3.2"]
+
+
+def test_short_or_unmatched_queries_find_nothing_fuzzy(index):
+    assert index.search("zz") == []
+    assert index.search("xyzzy") == []
+
+
+def test_empty_query_lists_the_catalog_in_order(index):
+    assert index.search("", limit=2) == ["llama3.2", "qwen2.5"]
+
+
+def test_entries_added_after_a_search_are_found():
+    index = ModelSearchIndex.from_catalog({"llama3.2": []})
+    assert index.search("phi") == []
+
+    index.add("phi4")
+
+    assert index.search("phi") == ["phi4"]
@@ -0,0 +1,161 @@
+import asyncio
+import pytest
+from scheduler import ModelScheduler, SchedulerOverloaded
+
+
+async def admit_in_turn(scheduler, held, requests):
+    """
+    Queue (name, model, priority) requests behind one held slot, then free it.
+
+    Each request releases its slot as soon as it is admitted, so with
+    max_concurrent=1 the returned names are the order of admission.
+    """
+    order = []
+
+    async def request(name, model, priority):
+        await scheduler.acquire_async(model, priority)
+        order.append(name)
+        scheduler.release(model)
+
+    tasks = [asyncio.create_task(request(*r)) for r in requests]
+    await asyncio.sleep(0)  # every request is queued, in order
+    scheduler.release(held)
+    await asyncio.gather(*tasks)
+    return order
+
+
+def test_higher_priority_is_admitted_first_then_oldest():
+    scheduler = ModelScheduler(max_concurrent=1)
+    scheduler.acquire("llama3.2")
+
+    order = asyncio.run(admit_in_turn(scheduler, "llama3.2", [
+        ("low", "llama3.2", 0), ("high", "llama3.2", 5), ("mid", "llama3.2", 1), ("low-later", "llama3.2", 0),
+    ]))
+
+    assert order == ["high", "mid", "low", "low-later"]
+
+
+def test_running_model_is_served_in_batches_before_swapping():
+    scheduler = ModelScheduler(max_concurrent=1, max_batch=2)
+    scheduler.acquire("a")
+
+    order = asyncio.run(admit_in_turn(scheduler, "a", [
+        ("b1", "b", 0), ("a1", "a", 0), ("a2", "a", 0), ("a3", "a", 0), ("b2", "b", 0),
+    ]))
+
+    # The held request and a1 make up a's batch, then b drains before a gets its turn again
+    assert order == ["a1", "b1", "b2", "a2", "a3"]
+    assert scheduler.stats()["swaps"] == 2
+
+
+def test_running_model_keeps_going_when_nothing_else_waits():
+    scheduler = ModelScheduler(max_concurrent=1, max_batch=1)
+    scheduler.acquire("a")
+
+    order = asyncio.run(admit_in_turn(scheduler, "a", [("a1", "a", 0), ("a2", "a", 0)]))
+
+    assert order == ["a1", "a2"]
+    assert scheduler.stats()["swaps"] == 0
+
+
+def test_per_model_cap_leaves_room_for_other_models():
+    scheduler = ModelScheduler(max_concurrent=4, max_per_model=2, max_models=2)
+    scheduler.acquire("a")
+    scheduler.acquire("a")
+
+    with pytest.raises(SchedulerOverloaded):
+        scheduler.acquire("a", timeout=0.05)
+    scheduler.acquire("b", timeout=0.05)
+
+    assert scheduler.stats()["running"] == {"a": 2, "b": 1}
+    assert scheduler.stats()["queued"] == {}
+
+
+def test_another_model_waits_until_the_loaded_one_drains():
+    scheduler = ModelScheduler(max_concurrent=4, max_per_model=4, max_models=1)
+    scheduler.acquire("a")
+
+    with pytest.raises(SchedulerOverloaded):
+        scheduler.acquire("b", timeout=0.05)
+    scheduler.release("a")
+    scheduler.acquire("b", timeout=0.05)
+
+    assert scheduler.stats()["running"] == {"b": 1}
+    assert scheduler.stats()["swaps"] == 1
+
+
+def test_full_queue_rejects_equal_priority_and_sheds_for_higher():
+    scheduler = ModelScheduler(max_concurrent=1, max_queue=2)
+    scheduler.acquire("a")
+
+    async def scenario():
+        first = asyncio.create_task(scheduler.acquire_async("a", 0))
+        second = asyncio.create_task(scheduler.acquire_async("a", 0))
+        await asyncio.sleep(0)
+        with pytest.raises(SchedulerOverloaded):
+            await scheduler.acquire_async("a", 0)
+        urgent = asyncio.create_task(scheduler.acquire_async("a", 1))
+        await asyncio.sleep(0)
+        # The newest of the lowest-priority requests makes room
+        with pytest.raises(SchedulerOverloaded):
+            await second
+        scheduler.release("a")
+        await urgent
+        assert not first.done()
+        scheduler.release("a")
+        await first
+        scheduler.release("a")
+
+    asyncio.run(scenario())
+    assert scheduler.stats() == {"queued": {}, "running": {}, "rejected": 1, "shed": 1, "swaps": 0}
+
+
+def test_timed_out_request_leaves_the_queue():
+    scheduler = ModelScheduler(max_concurrent=1)
+    scheduler.acquire("a")
+
+    with pytest.raises(SchedulerOverloaded):
+        scheduler.acquire("a", timeout=0.01)
+
+    async def wait_async():
+        with pytest.raises(SchedulerOverloaded):
+            await scheduler.acquire_async("a", timeout=0.01)
+
+    asyncio.run(wait_async())
+    assert scheduler.stats()["queued"] == {}
+    assert scheduler.stats()["rejected"] == 2
+
+
+def test_cancelled_request_gives_up_its_place_in_the_queue():
+    scheduler = ModelScheduler(max_concurrent=1)
+    scheduler.acquire("a")
+
+    async def scenario():
+        waiting = asyncio.create_task(scheduler.acquire_async("a"))
+        await asyncio.sleep(0)
+        waiting.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+
+    asyncio.run(scenario())
+    assert scheduler.stats()["queued"] == {}
+    scheduler.release("a")
+    assert scheduler.stats()["running"] == {}
+
+
+def test_request_cancelled_after_its_grant_releases_the_slot():
+    scheduler = ModelScheduler(max_concurrent=1)
+    scheduler.acquire("a")
+
+    async def scenario():
+        waiting = asyncio.create_task(scheduler.acquire_async("a"))
+        await asyncio.sleep(0)
+        # Granted, but the client goes away before the task resumes
+        scheduler.release("a")
+        waiting.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+
+    asyncio.run(scenario())
+    assert scheduler.stats()["running"] == {}
+    scheduler.acquire("a", timeout=0.05)
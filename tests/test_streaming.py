@@ -0,0 +1,77 @@
+import io
+import time
+from streaming import CallbackSink, StreamPipeline, TerminalSink
+
+
+class RecordingStream(io.StringIO):
+    """Records the text of each flush, i.e. each frame the terminal would show."""
+
+    def __init__(self):
+        super().__init__()
+        self.frames = []
+        self._flushed = 0
+
+    def flush(self):
+        text = self.getvalue()
+        if len(text) > self._flushed:
+            self.frames.append(text[self._flushed:])
+            self._flushed = len(text)
+
+
+def test_terminal_sink_coalesces_a_burst_of_chunks():
+    stream = RecordingStream()
+    sink = TerminalSink(stream, frame_rate=10)
+
+    StreamPipeline([sink]).run(f"token{n} " for n in range(50))
+
+    assert stream.getvalue() == "".join(f"token{n} " for n in range(50))
+    assert len(stream.frames) <= 3
+
+
+def test_terminal_sink_shows_held_text_while_the_model_pauses():
+    stream = RecordingStream()
+    sink = TerminalSink(stream, frame_rate=20)
+    sink.on_start()
+    sink.on_chunk("Hello")
+    sink.on_chunk(", world")
+    assert stream.frames == ["Hello"]
+
+    # No further chunk arrives, as when the model stalls mid-answer
+    deadline = time.monotonic() + 2
+    while len(stream.frames) < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert stream.frames == ["Hello", ", world"]
+
+
+def test_terminal_sink_writes_nothing_after_the_response_ends():
+    stream = RecordingStream()
+    sink = TerminalSink(stream, frame_rate=20)
+    sink.on_chunk("Hello")
+    sink.on_chunk(" there")
+    sink.on_end("Hello there")
+
+    time.sleep(0.1)
+
+    assert stream.frames == ["Hello", " there"]
+    assert sink._timer is None
+
+
+def test_pipeline_skips_empty_chunks_and_returns_the_full_text():
+    received, ended = [], []
+    pipeline = StreamPipeline([CallbackSink(received.append, ended.append)])
+
+    assert pipeline.run(["Hel", "", "lo"]) == "Hello"
+    assert received == ["Hel", "lo"]
+    assert ended == ["Hello"]
+
+
+def test_pipeline_ends_the_sinks_when_the_consumer_stops_early():
+    ended = []
+    pipeline = StreamPipeline([CallbackSink(lambda chunk: None, ended.append)])
+    stream = pipeline.stream(iter(["one ", "two ", "three"]))
+
+    next(stream)
+    stream.close()
+
+    assert ended == ["one "]
@@ -0,0 +1,110 @@
+import threading
+import pytest
+from tts import FakeTTSBackend, NullPlayer, SentenceSegmenter, SpeechPipeline
+
+FIRST = "The first sentence is here."
+SECOND = "Then comes a second one!"
+THIRD = "Is this the third sentence?"
+
+
+class BlockingPlayer(NullPlayer):
+    """Holds each segment 'playing' until stop is called, like a real output stream."""
+
+    def __init__(self):
+        super().__init__()
+        self.playing = threading.Event()
+        self._stopped = threading.Event()
+
+    def play(self, data, samplerate):
+        super().play(data, samplerate)
+        self.playing.set()
+        self._stopped.wait(5)
+        self._stopped.clear()
+
+    def stop(self):
+        self._stopped.set()
+
+
+def stream(pipeline, chunks):
+    pipeline.on_start()
+    for chunk in chunks:
+        pipeline.on_chunk(chunk)
+    pipeline.on_end("".join(chunks))
+
+
+def test_segmenter_splits_sentences_across_chunks():
+    segmenter = SentenceSegmenter(min_chars=5)
+    assert segmenter.feed("The first sen") == []
+    assert segmenter.feed("tence is here. Then comes") == [FIRST]
+    assert segmenter.feed(" a second one! Is this") == [SECOND]
+    assert segmenter.feed(" the third sentence?") == []
+    assert segmenter.flush() == [THIRD]
+    assert segmenter.flush() == []
+
+
+def test_segmenter_splits_on_newlines_and_merges_short_fragments():
+    segmenter = SentenceSegmenter(min_chars=20)
+    assert segmenter.feed("Okay. Sure. That sounds like a plan.\nNext line\n") == \
+        ["Okay. Sure. That sounds like a plan."]
+    assert segmenter.flush() == ["Next line"]
+
+
+def test_segmenter_does_not_split_inside_numbers():
+    segmenter = SentenceSegmenter(min_chars=5)
+    assert segmenter.feed("Pi is about 3.14 and e is 2.72. ") == ["Pi is about 3.14 and e is 2.72."]
+
+
+def test_pipeline_speaks_streamed_sentences_in_order():
+    backend, player = FakeTTSBackend(samplerate=1000, seconds_per_char=0.01), NullPlayer()
+    pipeline = SpeechPipeline(backend, player, min_chars=5)
+    stream(pipeline, ["The first sen", "tence is here. Then comes a ", "second one! Is this the third sentence?"])
+    pipeline.wait()
+
+    assert backend.spoken == [FIRST, SECOND, THIRD]
+    assert player.played == pytest.approx([len(text) * 0.01 for text in (FIRST, SECOND, THIRD)])
+    assert not pipeline.is_speaking()
+
+
+def test_say_speaks_a_whole_text():
+    backend = FakeTTSBackend()
+    pipeline = SpeechPipeline(backend, NullPlayer(), min_chars=5)
+    pipeline.say(f"{FIRST} {SECOND}")
+    pipeline.wait()
+    assert backend.spoken == [FIRST, SECOND]
+
+
+def test_stop_interrupts_playback_and_drops_queued_speech():
+    backend, player = FakeTTSBackend(), BlockingPlayer()
+    pipeline = SpeechPipeline(backend, player, min_chars=5)
+    pipeline.on_start()
+    pipeline.on_chunk(f"{FIRST} {SECOND} {THIRD} ")
+    assert player.playing.wait(5)
+    assert pipeline.is_speaking()
+
+    pipeline.stop()
+    pipeline.wait()
+    assert len(player.played) == 1
+    assert not pipeline.is_speaking()
+
+
+def test_stop_mutes_the_rest_of_the_response_until_the_next_one():
+    backend, player = FakeTTSBackend(), BlockingPlayer()
+    pipeline = SpeechPipeline(backend, player, min_chars=5)
+    pipeline.on_start()
+    pipeline.on_chunk(f"{FIRST} ")
+    assert player.playing.wait(5)
+    pipeline.stop()
+
+    # The model keeps streaming after the interrupt; none of it is spoken
+    pipeline.on_chunk(f"{SECOND} ")
+    pipeline.on_end(f"{FIRST} {SECOND} {THIRD}")
+    pipeline.wait()
+    assert backend.spoken == [FIRST]
+
+    # The next response is spoken again
+    player.playing.clear()
+    stream(pipeline, [THIRD])
+    assert player.playing.wait(5)
+    player.stop()
+    pipeline.wait()
+    assert backend.spoken == [FIRST, THIRD]
@@ -0,0 +1,417 @@
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Upper bounds, in seconds, of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Upper bounds of the tokens-per-second histogram buckets
+RATE_BUCKETS = (1, 2, 5, 10, 20, 30, 50, 75, 100, 150, 200, 500)
+
+
+class Histogram:
+    """
+    A cumulative histogram in the Prometheus style.
+    """
+
+    def __init__(self, buckets):
+        """
+        Initializes the Histogram class.
+
+        Args:
+            buckets (tuple): The sorted upper bounds of the buckets, excluding +Inf.
+        """
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        """
+        Records a value.
+
+        Args:
+            value (float): The observed value.
+        """
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """
+    Holds histograms and counters and renders them in the Prometheus text format.
+    """
+
+    def __init__(self):
+        self._histograms = {}
+        self._counters = {}
+        self._help = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS, description="", **labels):
+        """
+        Records a value in a histogram, creating it on first use.
+
+        Args:
+            name (str): The metric name.
+            value (float): The observed value.
+            buckets (tuple): The bucket bounds used if the histogram is new.
+            description (str): The HELP text of the metric.
+            **labels: Label names and values.
+        """
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(buckets)
+                self._help.setdefault(name, description)
+            histogram.observe(value)
+
+    def inc(self, name, amount=1, description="", **labels):
+        """
+        Increments a counter, creating it on first use.
+
+        Args:
+            name (str): The metric name.
+            amount (float): The increment. Defaults to 1.
+            description (str): The HELP text of the metric.
+            **labels: Label names and values.
+        """
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+            self._help.setdefault(name, description)
+
+    def counter(self, name, **labels):
+        """
+        Returns the current value of a counter.
+
+        Args:
+            name (str): The metric name.
+            **labels: Label names and values.
+
+        Returns:
+            float: The counter value, 0 if it was never incremented.
+        """
+        return self._counters.get((name, tuple(sorted(labels.items()))), 0)
+
+    def render(self):
+        """
+        Renders every metric in the Prometheus text exposition format.
+
+        Returns:
+            str: The metrics page.
+        """
+        lines = []
+        with self._lock:
+            declared = set()
+            for (name, labels), value in sorted(self._counters.items()):
+                if name not in declared:
+                    declared.add(name)
+                    lines += [f"# HELP {name} {self._help.get(name, '')}", f"# TYPE {name} counter"]
+                lines.append(f"{name}{_labels(labels)} {value}")
+            for (name, labels), histogram in sorted(self._histograms.items(), key=lambda item: item[0]):
+                if name not in declared:
+                    declared.add(name)
+                    lines += [f"# HELP {name} {self._help.get(name, '')}", f"# TYPE {name} histogram"]
+                cumulative = 0
+                for bound, count in zip(histogram.buckets + ("+Inf",), histogram.counts):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_labels(labels + (('le', str(bound)),))} {cumulative}")
+                lines.append(f"{name}_sum{_labels(labels)} {histogram.sum}")
+                lines.append(f"{name}_count{_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(labels):
+    """Format label pairs as {a="1",b="2"}, or nothing if there are none."""
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+
+class Span:
+    """
+    A timed stage of a turn. Use as a context manager obtained from `Tracer.span`.
+    """
+
+    def __init__(self, tracer, name, attributes):
+        self.tracer = tracer
+        self.name = name
+        self.attributes = attributes
+        self.span_id = uuid.uuid4().hex[:16]
+        self.trace_id = None
+        self.parent_id = None
+        self.start = 0.0
+
+    def set(self, **attributes):
+        """
+        Adds attributes to the span.
+
+        Args:
+            **attributes: Attribute names and JSON-serializable values.
+        """
+        self.attributes.update(attributes)
+
+    def elapsed(self):
+        """
+        Returns the seconds since the span started.
+
+        Returns:
+            float: The elapsed time.
+        """
+        return time.perf_counter() - self.start
+
+    def __enter__(self):
+        stack = self.tracer._stack()
+        parent = stack[-1] if stack else None
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex
+        self.parent_id = parent.span_id if parent else None
+        stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        duration = time.perf_counter() - self.start
+        stack = self.tracer._stack()
+        if self in stack:
+            stack.remove(self)
+        if exc_type is not None:
+            self.attributes["error"] = exc_type.__name__
+        self.tracer._finish(self, duration)
+        return False
+
+
+class _NoopSpan:
+    """The span handed out while tracing is disabled; every method does nothing."""
+
+    def set(self, **attributes):
+        pass
+
+    def elapsed(self):
+        return 0.0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class Tracer:
+    """
+    Times the stages of each turn and exports them as JSON logs and Prometheus metrics.
+
+    Each finished span is written as one JSON line (with its trace, parent and
+    duration) and observed in the `ollamagenie_stage_duration_seconds`
+    histogram under its name. While disabled, `span` returns a shared no-op
+    span and every other method returns immediately.
+    """
+
+    def __init__(self, enabled=False, log_stream=None):
+        """
+        Initializes the Tracer class.
+
+        Args:
+            enabled (bool): Whether spans are recorded. Defaults to False.
+            log_stream (file, optional): Where JSON span logs are written. Defaults to none.
+
+        Attributes:
+            metrics (MetricsRegistry): The collected metrics.
+        """
+        self.enabled = enabled
+        self.log_stream = log_stream
+        self.metrics = MetricsRegistry()
+        self._local = threading.local()
+        self._log_lock = threading.Lock()
+        self._server = None
+
+    def enable(self, log_path=None, metrics_port=None):
+        """
+        Turns tracing on.
+
+        Args:
+            log_path (str, optional): A file to append JSON span logs to; "-" for stderr.
+            metrics_port (int, optional): If given, serve /metrics on this port.
+        """
+        if log_path == "-":
+            self.log_stream = sys.stderr
+        elif log_path:
+            self.log_stream = open(log_path, "a", encoding="utf-8", buffering=1)
+        if metrics_port is not None:
+            self.serve_metrics(metrics_port)
+        self.enabled = True
+
+    def span(self, name, **attributes):
+        """
+        Starts a span, nested under the current span of this thread if there is one.
+
+        Args:
+            name (str): The stage name, e.g. "generation".
+            **attributes: Attributes recorded with the span.
+
+        Returns:
+            Span: A context manager timing the stage.
+        """
+        if not self.enabled:
+            return _NOOP_SPAN
+        return Span(self, name, attributes)
+
+    def record(self, name, seconds, **attributes):
+        """
+        Records a stage that was timed elsewhere, e.g. time to first token.
+
+        Args:
+            name (str): The stage name.
+            seconds (float): The stage duration.
+            **attributes: Attributes recorded with the stage.
+        """
+        if not self.enabled:
+            return
+        span = Span(self, name, attributes)
+        stack = self._stack()
+        if stack:
+            span.trace_id, span.parent_id = stack[-1].trace_id, stack[-1].span_id
+        else:
+            span.trace_id = uuid.uuid4().hex
+        self._finish(span, seconds)
+
+    def observe_rate(self, tokens, seconds, model=None):
+        """
+        Records the generation speed of a response.
+
+        Args:
+            tokens (int): The number of tokens generated.
+            seconds (float): The time spent generating them.
+            model (str, optional): The model that generated them.
+        """
+        if not self.enabled or tokens <= 0 or seconds <= 0:
+            return
+        self.metrics.observe("ollamagenie_tokens_per_second", tokens / seconds, buckets=RATE_BUCKETS,
+                             description="Generation speed of each response", model=model or "")
+        self.metrics.inc("ollamagenie_generated_tokens_total", tokens,
+                         description="Tokens generated", model=model or "")
+
+    def prompt_reuse(self, evaluated, reused_tokens, model=None):
+        """
+        Counts the prompt tokens the server evaluated and those expected to come from its KV cache.
+
+        Args:
+            evaluated (int or None): The server's prompt_eval_count, if it reported one.
+            reused_tokens (int): The estimated prompt tokens served from the KV cache.
+            model (str, optional): The model that served the prompt.
+        """
+        if not self.enabled:
+            return
+        if evaluated is not None:
+            self.metrics.inc("ollamagenie_prompt_eval_tokens_total", evaluated,
+                             description="Prompt tokens evaluated by the server", model=model or "")
+        self.metrics.inc("ollamagenie_prompt_tokens_reused_total", reused_tokens,
+                         description="Estimated prompt tokens served from the server's KV cache",
+                         model=model or "")
+
+    def cache_result(self, cache, hit):
+        """
+        Counts a cache lookup.
+
+        Args:
+            cache (str): The cache name, e.g. "exact" or "semantic".
+            hit (bool): Whether the lookup was a hit.
+        """
+        if not self.enabled:
+            return
+        self.metrics.inc("ollamagenie_cache_requests_total", description="Response cache lookups",
+                         cache=cache, result="hit" if hit else "miss")
+
+    def render_metrics(self):
+        """
+        Renders the metrics page, including cache hit ratios.
+
+        Returns:
+            str: The metrics in the Prometheus text format.
+        """
+        text = self.metrics.render()
+        ratios = []
+        for cache in ("exact", "semantic"):
+            hits = self.metrics.counter("ollamagenie_cache_requests_total", cache=cache, result="hit")
+            misses = self.metrics.counter("ollamagenie_cache_requests_total", cache=cache, result="miss")
+            if hits + misses:
+                ratios.append(f'ollamagenie_cache_hit_ratio{{cache="{cache}"}} {hits / (hits + misses)}')
+        if ratios:
+            text += "# HELP ollamagenie_cache_hit_ratio Fraction of cache lookups that hit\n"
+            text += "# TYPE ollamagenie_cache_hit_ratio gauge\n" + "\n".join(ratios) + "\n"
+        return text
+
+    def serve_metrics(self, port, host="0.0.0.0"):
+        """
+        Serves the metrics page on /metrics from a background thread.
+
+        Args:
+            port (int): The port to listen on.
+            host (str): The interface to bind. Defaults to all interfaces.
+        """
+        if self._server is not None:
+            return
+        tracer = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = tracer.render_metrics().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), MetricsHandler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="metrics", daemon=True).start()
+
+    def _stack(self):
+        """Return this thread's stack of open spans."""
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _finish(self, span, duration):
+        """Export a finished span to the metrics and the JSON log."""
+        self.metrics.observe("ollamagenie_stage_duration_seconds", duration,
+                             description="Duration of each stage of a turn", stage=span.name)
+        if self.log_stream is None:
+            return
+        record = {
+            "ts": datetime.now(timezone.utc).isoformat(),
+            "trace_id": span.trace_id,
+            "span_id": span.span_id,
+            "parent_id": span.parent_id,
+            "name": span.name,
+            "duration_ms": round(duration * 1000, 3),
+            **span.attributes,
+        }
+        line = json.dumps(record, default=str)
+        with self._log_lock:
+            self.log_stream.write(line + "\n")
+
+
+# The process-wide tracer. Disabled unless enabled here or via OLLAMAGENIE_TRACE=1.
+tracer = Tracer()
+if os.environ.get("OLLAMAGENIE_TRACE") == "1":
+    tracer.enable(log_path=os.environ.get("OLLAMAGENIE_TRACE_LOG", "-"),
+                  metrics_port=int(os.environ["OLLAMAGENIE_METRICS_PORT"])
+                  if os.environ.get("OLLAMAGENIE_METRICS_PORT") else None)
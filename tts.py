@@ -0,0 +1,381 @@
+import io
+import os
+import queue
+import re
+import tempfile
+import threading
+import numpy as np
+from streaming import StreamSink
+
+# A sentence ends at ., ! or ? followed by whitespace, or at a line break.
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+|\n+")
+
+
+class TTSBackend:
+    """
+    Converts text to audio samples.
+
+    Subclasses implement `synthesize`.
+    """
+
+    def synthesize(self, text):
+        """
+        Synthesizes speech for a piece of text.
+
+        Args:
+            text (str): The text to speak.
+
+        Returns:
+            tuple: (samples, samplerate), where samples is a float32 NumPy array.
+        """
+        raise NotImplementedError
+
+
+class GTTSBackend(TTSBackend):
+    """
+    Synthesizes speech with Google Text-to-Speech, decoded in memory.
+    """
+
+    def __init__(self, lang="en"):
+        """
+        Initializes the GTTSBackend class.
+
+        Args:
+            lang (str): The language code. Defaults to "en".
+        """
+        self.lang = lang
+
+    def synthesize(self, text):
+        from gtts import gTTS
+        import soundfile as sf
+
+        buffer = io.BytesIO()
+        gTTS(text=text, lang=self.lang).write_to_fp(buffer)
+        buffer.seek(0)
+        data, samplerate = sf.read(buffer, dtype="float32")
+        return data, samplerate
+
+
+class Pyttsx3Backend(TTSBackend):
+    """
+    Synthesizes speech offline with the system engine through pyttsx3.
+    """
+
+    def __init__(self, rate=None):
+        """
+        Initializes the Pyttsx3Backend class.
+
+        Args:
+            rate (int, optional): Speaking rate in words per minute. Defaults to the engine's rate.
+        """
+        import pyttsx3
+
+        self.engine = pyttsx3.init()
+        if rate:
+            self.engine.setProperty("rate", rate)
+        self._lock = threading.Lock()
+
+    def synthesize(self, text):
+        import soundfile as sf
+
+        # pyttsx3 can only render to a file; it is removed as soon as it is read.
+        fd, path = tempfile.mkstemp(suffix=".wav")
+        os.close(fd)
+        try:
+            with self._lock:
+                self.engine.save_to_file(text, path)
+                self.engine.runAndWait()
+            data, samplerate = sf.read(path, dtype="float32")
+        finally:
+            os.remove(path)
+        return data, samplerate
+
+
+class FakeTTSBackend(TTSBackend):
+    """
+    Produces silence proportional to the text length and records what was spoken.
+
+    Useful for exercising the speech pipeline without audio hardware or network.
+    """
+
+    def __init__(self, samplerate=16000, seconds_per_char=0.01):
+        """
+        Initializes the FakeTTSBackend class.
+
+        Args:
+            samplerate (int): The sample rate of the generated audio. Defaults to 16000.
+            seconds_per_char (float): Audio length per character of text. Defaults to 0.01.
+
+        Attributes:
+            spoken (list): Every text passed to `synthesize`, in order.
+        """
+        self.samplerate = samplerate
+        self.seconds_per_char = seconds_per_char
+        self.spoken = []
+
+    def synthesize(self, text):
+        self.spoken.append(text)
+        frames = int(len(text) * self.seconds_per_char * self.samplerate)
+        return np.zeros(frames, dtype=np.float32), self.samplerate
+
+
+class OutputStreamPlayer:
+    """
+    Plays audio segments through one persistent sounddevice output stream.
+
+    The stream is opened once and fed from memory by its callback, which
+    copies the current segment into each output block and writes silence
+    when there is nothing to play. `play` blocks on an event that the
+    callback sets when the segment has been consumed, so waiting costs no
+    CPU. The stream is reopened only if a segment's sample rate differs.
+    """
+
+    def __init__(self, blocksize=1024):
+        """
+        Initializes the OutputStreamPlayer class.
+
+        Args:
+            blocksize (int): Frames per callback. Defaults to 1024.
+        """
+        self.blocksize = blocksize
+        self._stream = None
+        self._samplerate = None
+        self._data = None
+        self._position = 0
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+
+    def play(self, data, samplerate):
+        """
+        Plays a segment and waits for it to finish or be stopped.
+
+        Args:
+            data (numpy.ndarray): The samples, mono or with one column per channel.
+            samplerate (int): The sample rate.
+        """
+        if data.ndim > 1:
+            data = data.mean(axis=1)
+        done = threading.Event()
+        with self._lock:
+            self._data = np.ascontiguousarray(data, dtype=np.float32)
+            self._position = 0
+            self._done = done
+        self._open(samplerate)
+        done.wait()
+
+    def stop(self):
+        """
+        Stops the current segment immediately.
+        """
+        with self._lock:
+            self._data = None
+            self._done.set()
+
+    def close(self):
+        """
+        Stops playback and closes the output stream.
+        """
+        self.stop()
+        if self._stream is not None:
+            self._stream.close()
+            self._stream = None
+
+    def _open(self, samplerate):
+        """Open and start the output stream, unless one is open at this rate."""
+        if self._stream is not None and self._samplerate == samplerate:
+            return
+        import sounddevice as sd
+
+        if self._stream is not None:
+            self._stream.close()
+        self._stream = sd.OutputStream(samplerate=samplerate, channels=1, dtype="float32",
+                                       blocksize=self.blocksize, callback=self._callback)
+        self._samplerate = samplerate
+        self._stream.start()
+
+    def _callback(self, outdata, frames, time_info, status):
+        """Copy the next block of the current segment, padding with silence."""
+        with self._lock:
+            written = 0
+            if self._data is not None:
+                block = self._data[self._position:self._position + frames]
+                written = len(block)
+                outdata[:written, 0] = block
+                self._position += written
+                if self._position >= len(self._data):
+                    self._data = None
+                    self._done.set()
+            outdata[written:] = 0
+
+
+class NullPlayer:
+    """
+    Discards audio; records segment lengths for inspection.
+    """
+
+    def __init__(self):
+        self.played = []
+
+    def play(self, data, samplerate):
+        self.played.append(len(data) / samplerate)
+
+    def stop(self):
+        pass
+
+
+class SentenceSegmenter:
+    """
+    Splits a stream of text chunks into complete sentences.
+    """
+
+    def __init__(self, min_chars=20):
+        """
+        Initializes the SentenceSegmenter class.
+
+        Args:
+            min_chars (int): Sentences shorter than this are merged with the next one,
+                             so very short fragments are not synthesized alone. Defaults to 20.
+        """
+        self.min_chars = min_chars
+        self._buffer = ""
+
+    def feed(self, chunk):
+        """
+        Adds a chunk and returns the sentences it completes.
+
+        Args:
+            chunk (str): The next piece of text.
+
+        Returns:
+            list: The complete sentences, in order.
+        """
+        self._buffer += chunk
+        sentences = []
+        start = 0
+        for match in _SENTENCE_END.finditer(self._buffer):
+            sentence = self._buffer[start:match.start()].strip()
+            if len(sentence) >= self.min_chars:
+                sentences.append(sentence)
+                start = match.end()
+        self._buffer = self._buffer[start:]
+        return sentences
+
+    def flush(self):
+        """
+        Returns whatever text remains, ending the stream.
+
+        Returns:
+            list: The remaining text as a single sentence, or an empty list.
+        """
+        remainder, self._buffer = self._buffer.strip(), ""
+        return [remainder] if remainder else []
+
+
+class SpeechPipeline(StreamSink):
+    """
+    Speaks a streamed response sentence by sentence while it is still being generated.
+
+    As a StreamSink it receives response chunks, segments them into
+    sentences and queues them for synthesis on a worker thread. A second
+    worker plays synthesized segments back-to-back, so the first sentence is
+    heard while the model keeps generating the rest.
+
+    `stop` silences the pipeline until the next response starts, so chunks
+    still streaming from the model after an interrupt are not spoken.
+    """
+
+    def __init__(self, backend=None, player=None, min_chars=20):
+        """
+        Initializes the SpeechPipeline class and starts its worker threads.
+
+        Args:
+            backend (TTSBackend, optional): The speech synthesizer. Defaults to GTTSBackend.
+            player (optional): The audio player. Defaults to OutputStreamPlayer.
+            min_chars (int): The minimum sentence length synthesized alone. Defaults to 20.
+        """
+        self.backend = backend or GTTSBackend()
+        self.player = player or OutputStreamPlayer()
+        self.segmenter = SentenceSegmenter(min_chars)
+        self._sentences = queue.Queue()
+        self._segments = queue.Queue()
+        self._generation = 0
+        self._muted = False
+        threading.Thread(target=self._synthesize_loop, name="tts-synthesize", daemon=True).start()
+        threading.Thread(target=self._play_loop, name="tts-play", daemon=True).start()
+
+    def on_start(self):
+        self._muted = False
+        self.segmenter.flush()
+
+    def on_chunk(self, chunk):
+        if self._muted:
+            return
+        for sentence in self.segmenter.feed(chunk):
+            self._sentences.put((self._generation, sentence))
+
+    def on_end(self, text):
+        if self._muted:
+            return
+        for sentence in self.segmenter.flush():
+            self._sentences.put((self._generation, sentence))
+
+    def say(self, text):
+        """
+        Queues a complete text for speaking.
+
+        Args:
+            text (str): The text to speak.
+        """
+        self.on_start()
+        self.on_chunk(text)
+        self.on_end(text)
+
+    def is_speaking(self):
+        """
+        Returns True while queued speech has not finished playing.
+
+        Returns:
+            bool: Whether sentences are pending synthesis or playback.
+        """
+        return self._sentences.unfinished_tasks > 0 or self._segments.unfinished_tasks > 0
+
+    def wait(self):
+        """
+        Blocks until all queued speech has played or been stopped.
+        """
+        self._sentences.join()
+        self._segments.join()
+
+    def stop(self):
+        """
+        Stops playback, discards all queued speech and ignores the rest of the current response.
+        """
+        self._muted = True
+        self._generation += 1
+        self.segmenter.flush()
+        self.player.stop()
+
+    def _synthesize_loop(self):
+        """Worker: synthesize queued sentences, skipping stopped ones."""
+        while True:
+            generation, sentence = self._sentences.get()
+            try:
+                if generation == self._generation:
+                    data, samplerate = self.backend.synthesize(sentence)
+                    self._segments.put((generation, data, samplerate))
+            except Exception as e:
+                print(f"Speech generation error: {e}")
+            finally:
+                self._sentences.task_done()
+
+    def _play_loop(self):
+        """Worker: play synthesized segments back-to-back, skipping stopped ones."""
+        while True:
+            generation, data, samplerate = self._segments.get()
+            try:
+                if generation == self._generation:
+                    self.player.play(data, samplerate)
+            except Exception as e:
+                print(f"Audio playback error: {e}")
+            finally:
+                self._segments.task_done()
@@ -0,0 +1,210 @@
+import atexit
+import json
+import os
+import threading
+import numpy as np
+import ollama
+
+
+def embed(texts, model="nomic-embed-text", client=None):
+    """
+    Embeds texts with the Ollama embeddings API.
+
+    Args:
+        texts (list): The texts to embed.
+        model (str): The embedding model. Defaults to "nomic-embed-text".
+        client (ollama.Client, optional): The client to use. Defaults to the module-level client.
+
+    Returns:
+        numpy.ndarray: A (len(texts), dim) float32 matrix of embeddings.
+    """
+    response = (client or ollama).embed(model=model, input=list(texts))
+    return np.asarray(response["embeddings"], dtype=np.float32)
+
+
+class VectorIndex:
+    """
+    A fixed-capacity vector index searched with a single matrix-vector product.
+
+    Vectors are L2-normalized and stored as rows of one contiguous matrix, so
+    cosine similarity against every entry is `vectors @ query`. When a path is
+    given the matrix is memory-mapped from disk and the payloads are saved
+    next to it. When the index is full the least recently used entry is
+    replaced.
+
+    Each entry may belong to a group, e.g. one conversation. Group ids are
+    kept in an integer array beside the matrix, so a search restricted to a
+    group selects its rows with one NumPy comparison and scores only those.
+    """
+
+    def __init__(self, capacity=10000, path=None, dtype=np.float32):
+        """
+        Initializes the VectorIndex class.
+
+        The matrix is allocated on the first `add`, once the embedding size is known.
+
+        Args:
+            capacity (int): The maximum number of entries. Defaults to 10000.
+            path (str, optional): The file prefix for the memory-mapped matrix
+                                  ('<path>.npy') and payloads ('<path>.json').
+            dtype (numpy.dtype): The storage type of the vectors. Defaults to float32.
+
+        Attributes:
+            count (int): The number of entries in use.
+            payloads (list): The payload stored with each entry, by row.
+            groups (dict): Group keys mapped to the integer ids stored per row.
+        """
+        self.capacity = capacity
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.vectors = None
+        self.count = 0
+        self.payloads = []
+        self.groups = {}
+        self._group_of = np.full(capacity, -1, dtype=np.int32)
+        self._last_used = np.zeros(capacity, dtype=np.int64)
+        self._clock = 0
+        self._lock = threading.RLock()
+
+        if path and os.path.exists(path + ".npy") and os.path.exists(path + ".json"):
+            self._load()
+        if path:
+            atexit.register(self.save)
+
+    def add(self, vector, payload, group=None):
+        """
+        Adds an entry, replacing the least recently used one when full.
+
+        Args:
+            vector (array-like): The embedding.
+            payload: A JSON-serializable value stored with the entry.
+            group (str, optional): The group the entry belongs to, for `search(group=...)`.
+
+        Returns:
+            int: The row the entry was stored in.
+        """
+        vector = self._normalize(vector)
+        with self._lock:
+            if self.vectors is None:
+                self._allocate(vector.shape[0])
+            if self.count < self.capacity:
+                row = self.count
+                self.count += 1
+                self.payloads.append(payload)
+            else:
+                row = int(np.argmin(self._last_used))
+                self.payloads[row] = payload
+            self.vectors[row] = vector
+            self._group_of[row] = -1 if group is None else self.groups.setdefault(group, len(self.groups))
+            self.touch(row)
+            return row
+
+    def search(self, vector, k=1, block_size=4096, group=None):
+        """
+        Finds the entries most similar to a vector.
+
+        Rows are scored in blocks of `block_size`, so vectors stored at reduced
+        precision are widened to float32 one block at a time, into one buffer
+        small enough to stay in cache. With a group, only that group's rows
+        are gathered and scored.
+
+        Args:
+            vector (array-like): The query embedding.
+            k (int): The number of results. Defaults to 1.
+            block_size (int): The number of rows scored per matrix-vector product.
+            group (str, optional): Only entries added with this group are considered.
+
+        Returns:
+            list: (row, cosine similarity, payload) tuples, most similar first.
+        """
+        with self._lock:
+            if group is None:
+                candidates = None
+                size = self.count
+            else:
+                if group not in self.groups:
+                    return []
+                candidates = np.flatnonzero(self._group_of[:self.count] == self.groups[group])
+                size = len(candidates)
+            if not size:
+                return []
+            query = self._normalize(vector)
+            k = min(k, size)
+            widen = self.dtype != np.float32
+            buffer = np.empty((min(block_size, size), self.vectors.shape[1]), dtype=np.float32) if widen else None
+            best_rows, best_scores = [], []
+            for start in range(0, size, block_size):
+                if candidates is None:
+                    rows = np.arange(start, min(start + block_size, size))
+                    block = self.vectors[start:start + len(rows)]
+                else:
+                    rows = candidates[start:start + block_size]
+                    block = self.vectors[rows]
+                if widen:
+                    np.copyto(buffer[:len(rows)], block)
+                    block = buffer[:len(rows)]
+                scores = block @ query
+                top = np.argpartition(scores, -k)[-k:] if k < len(scores) else np.arange(len(scores))
+                best_rows.append(rows[top])
+                best_scores.append(scores[top])
+            rows, scores = np.concatenate(best_rows), np.concatenate(best_scores)
+            order = np.argsort(scores)[::-1][:k]
+            return [(int(rows[i]), float(scores[i]), self.payloads[rows[i]]) for i in order]
+
+    def save(self):
+        """
+        Flushes the memory-mapped matrix and writes the payloads.
+        """
+        if not self.path or self.vectors is None:
+            return
+        with self._lock:
+            self.vectors.flush()
+            state = {"count": self.count, "payloads": self.payloads, "last_used": self._last_used[:self.count].tolist(),
+                     "groups": list(self.groups), "group_of": self._group_of[:self.count].tolist()}
+            with open(self.path + ".json", "w", encoding="utf-8") as f:
+                json.dump(state, f)
+
+    def __len__(self):
+        return self.count
+
+    def touch(self, row):
+        """
+        Marks an entry as most recently used, protecting it from eviction.
+
+        Args:
+            row (int): The row of the entry.
+        """
+        with self._lock:
+            self._clock += 1
+            self._last_used[row] = self._clock
+
+    def _normalize(self, vector):
+        """Return the vector as a unit-length float32 array."""
+        vector = np.asarray(vector, dtype=np.float32).ravel()
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _allocate(self, dim):
+        """Create the vector matrix, memory-mapped when a path is set."""
+        shape = (self.capacity, dim)
+        if self.path:
+            self.vectors = np.lib.format.open_memmap(self.path + ".npy", mode="w+", dtype=self.dtype, shape=shape)
+        else:
+            self.vectors = np.zeros(shape, dtype=self.dtype)
+
+    def _load(self):
+        """Reopen a saved matrix and its payloads."""
+        vectors = np.lib.format.open_memmap(self.path + ".npy", mode="r+")
+        with open(self.path + ".json", "r", encoding="utf-8") as f:
+            state = json.load(f)
+        if vectors.shape[0] != self.capacity or vectors.dtype != self.dtype:
+            print(f"Ignoring saved index at {self.path}: capacity or dtype changed.")
+            return
+        self.vectors = vectors
+        self.count = state["count"]
+        self.payloads = state["payloads"]
+        self._last_used[:self.count] = state["last_used"]
+        # Indexes saved before groups existed have every entry ungrouped
+        self.groups = {key: number for number, key in enumerate(state.get("groups", []))}
+        self._group_of[:self.count] = state.get("group_of", [-1] * self.count)
+        self._clock = int(self._last_used.max(initial=0))